@@ -6,6 +6,7 @@ LOCATOR_LEN_BYTES = LOCATOR_LEN_HEX // 2
 HTTP_OK = 200
 HTTP_BAD_REQUEST = 400
 HTTP_NOT_FOUND = 404
+HTTP_INTERNAL_SERVER_ERROR = 500
 HTTP_SERVICE_UNAVAILABLE = 503
 
 # Bitcoin
@@ -10,6 +10,8 @@ from common.tools import is_256b_hex_str
 from common.exceptions import InvalidKey, InvalidParameter, SignatureError, EncryptionError
 
 LN_MESSAGE_PREFIX = b"Lightning Signed Message:"
+# The nonce is always 0 (12-byte) since every key is only used to encrypt a single message
+CHACHA20_NONCE = bytes(12)
 
 
 def sha256d(message):
@@ -27,7 +29,7 @@ def sha256d(message):
 
 
 def hash_160(message):
-    """ Calculates the RIPEMD-160 hash of a given message.
+    """Calculates the RIPEMD-160 hash of a given message.
 
     Args:
         message (:obj:`str`) the message to be hashed.
@@ -112,6 +114,66 @@ class Cryptographer:
         if not is_256b_hex_str(secret):
             raise InvalidParameter("Secret must be a 32-byte hex value (64 hex chars)", secret=secret)
 
+    @staticmethod
+    def encrypt_bytes(message, secret):
+        """
+        Encrypts a given message using ``CHACHA20POLY1305``. Works the same as ``encrypt`` but with raw bytes.
+
+        No format checks are performed (the caller is responsible for them), so this should be preferred over
+        ``encrypt`` on hot paths where the data is known to be well formatted.
+
+        Args:
+              message (:obj:`bytes`): a message to be encrypted (any bytes-like object). Should be the serialized
+                commitment_tx.
+              secret (:obj:`bytes`): a value to used to derive the encryption key. Should be the dispute txid.
+
+        Returns:
+              :obj:`bytes`: The encrypted data.
+        """
+
+        # sk is the H(txid) (32-byte) and nonce is set to 0 (12-byte)
+        cipher = ChaCha20Poly1305(sha256(secret).digest())
+
+        # The cipher only takes bytes, other bytes-like objects (e.g. memoryview) need to be converted
+        if not isinstance(message, bytes):
+            message = bytes(message)
+
+        return cipher.encrypt(nonce=CHACHA20_NONCE, data=message, associated_data=None)
+
+    @staticmethod
+    def decrypt_bytes(encrypted_blob, secret):
+        """
+        Decrypts a given encrypted_blob using ``CHACHA20POLY1305``. Works the same as ``decrypt`` but with raw bytes.
+
+        No format checks are performed (the caller is responsible for them), so this should be preferred over
+        ``decrypt`` on hot paths where the data is known to be well formatted.
+
+        Args:
+            encrypted_blob(:obj:`bytes`): an encrypted blob of data potentially containing a penalty transaction (any
+                bytes-like object).
+            secret (:obj:`bytes`): a value used to derive the decryption key. Should be the dispute txid.
+
+        Returns:
+              :obj:`bytes`: The decrypted data.
+
+        Raises:
+              :obj:`EncryptionError`: if the data cannot be decrypted with the given key.
+        """
+
+        # sk is the H(txid) (32-byte) and nonce is set to 0 (12-byte)
+        cipher = ChaCha20Poly1305(sha256(secret).digest())
+
+        if not isinstance(encrypted_blob, bytes):
+            encrypted_blob = bytes(encrypted_blob)
+
+        try:
+            return cipher.decrypt(nonce=CHACHA20_NONCE, data=encrypted_blob, associated_data=None)
+
+        except InvalidTag:
+            raise EncryptionError(
+                "Cannot decrypt blob with the provided key", blob=encrypted_blob.hex(), key=bytes(secret).hex()
+            )
+
     @staticmethod
     def encrypt(message, secret):
         """
@@ -132,16 +194,7 @@ class Cryptographer:
 
         Cryptographer.check_data_key_format(message, secret)
 
-        # sk is the H(txid) (32-byte) and nonce is set to 0 (12-byte)
-        sk = sha256(unhexlify(secret)).digest()
-        nonce = bytearray(12)
-
-        # Encrypt the data
-        cipher = ChaCha20Poly1305(sk)
-        encrypted_blob = cipher.encrypt(nonce=nonce, data=unhexlify(message), associated_data=None)
-        encrypted_blob = hexlify(encrypted_blob).decode("utf8")
-
-        return encrypted_blob
+        return Cryptographer.encrypt_bytes(unhexlify(message), unhexlify(secret)).hex()
 
     @staticmethod
     # ToDo: #20-test-tx-decrypting-edge-cases
@@ -165,22 +218,7 @@ class Cryptographer:
 
         Cryptographer.check_data_key_format(encrypted_blob, secret)
 
-        # sk is the H(txid) (32-byte) and nonce is set to 0 (12-byte)
-        sk = sha256(unhexlify(secret)).digest()
-        nonce = bytearray(12)
-
-        # Decrypt
-        cipher = ChaCha20Poly1305(sk)
-        data = unhexlify(encrypted_blob)
-
-        try:
-            blob = cipher.decrypt(nonce=nonce, data=data, associated_data=None)
-            blob = hexlify(blob).decode("utf8")
-
-        except InvalidTag:
-            raise EncryptionError("Cannot decrypt blob with the provided key", blob=encrypted_blob, key=secret)
-
-        return blob
+        return Cryptographer.decrypt_bytes(unhexlify(encrypted_blob), unhexlify(secret)).hex()
 
     @staticmethod
     def load_key_file(file_path):
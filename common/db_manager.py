@@ -1,4 +1,87 @@
 import plyvel
+from threading import local
+from contextlib import contextmanager
+
+
+class UnitOfWork:
+    """
+    The :class:`UnitOfWork` collects the writes of a logical operation so they can be applied to the database at once,
+    in a single (atomic) ``LevelDB`` write batch. It offers the same ``put``, ``delete``, ``get``, ``iterator`` and
+    ``write_batch`` methods as a ``plyvel`` database, so the managers can write through it transparently.
+
+    Reads (``get`` and ``iterator``) see the pending writes of the unit, so read-modify-write operations can be chained
+    within the same unit of work. Snapshots are taken from the database, so they do not.
+
+    Args:
+        db (:obj:`plyvel.DB` or :obj:`UnitOfWork`): where the writes are applied to. Write batches created within a
+            unit of work are units of work themselves, whose writes are applied to the parent unit when exited.
+        sync (:obj:`bool`): whether the write batch is synced to disk before being considered complete.
+        transaction (:obj:`bool`): whether the writes are discarded if the ``with`` block of a write batch raises
+            (as with ``plyvel`` transactional write batches).
+
+    Attributes:
+        writes (:obj:`dict`): the pending writes (``key:value``). Deleted keys have ``None`` as value.
+    """
+
+    def __init__(self, db, sync=False, transaction=True):
+        self.db = db
+        self.sync = sync
+        self.transaction = transaction
+        self.writes = dict()
+
+    def put(self, key, value):
+        if not isinstance(key, bytes) or not isinstance(value, bytes):
+            raise TypeError("Keys and values must be bytes")
+
+        self.writes[key] = value
+
+    def delete(self, key):
+        if not isinstance(key, bytes):
+            raise TypeError("Keys must be bytes")
+
+        self.writes[key] = None
+
+    def get(self, key):
+        if key in self.writes:
+            return self.writes[key]
+
+        return self.db.get(key)
+
+    def iterator(self, prefix=None, include_value=True):
+        """Iterates over the entries (in key order) as ``plyvel`` does, including the pending writes of the unit."""
+
+        entries = dict(self.db.iterator(prefix=prefix))
+        entries.update({key: value for key, value in self.writes.items() if prefix is None or key.startswith(prefix)})
+
+        for key in sorted(entries):
+            if entries[key] is not None:
+                yield (key, entries[key]) if include_value else key
+
+    def write_batch(self, transaction=False, **kwargs):
+        """Write batches are nested units of work, so their writes end up in this one."""
+
+        return UnitOfWork(self, transaction=transaction)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None or not self.transaction:
+            self.db.writes.update(self.writes)
+
+        return False
+
+    def commit(self):
+        """Applies all the pending writes in a single write batch."""
+
+        with self.db.write_batch(transaction=True, sync=self.sync) as b:
+            for key, value in self.writes.items():
+                if value is None:
+                    b.delete(key)
+                else:
+                    b.put(key, value)
+
+        self.writes = dict()
 
 
 class DBManager:
@@ -9,17 +92,64 @@ class DBManager:
     Args:
         db_path (:obj:`str`): the path (relative or absolute) to the system folder containing the database. A fresh
             database will be create if the specified path does not contain one.
+        bloom_filter_bits (:obj:`int`): the number of bits per key of the ``LevelDB`` bloom filter. Bloom filters
+            allow lookups of non-existing keys to be answered without reading from disk. Disabled if ``None``.
+
+    Attributes:
+        db (:obj:`plyvel.DB`): the database handler.
+        writer (:obj:`plyvel.DB` or :obj:`UnitOfWork`): where writes are sent to. It is the ``UnitOfWork`` of the
+            current thread if there is one (see :meth:`unit_of_work`), or ``db`` otherwise.
 
     Raises:
         ValueError: If the provided ``db_path`` is not a string.
         plyvel.Error: If the db is currently unavailable (being used by another process).
     """
 
-    def __init__(self, db_path):
+    def __init__(self, db_path, bloom_filter_bits=None):
         if not isinstance(db_path, str):
             raise ValueError("db_path must be a valid path/name")
 
-        self.db = plyvel.DB(db_path, create_if_missing=True)
+        if bloom_filter_bits is not None:
+            self.db = plyvel.DB(db_path, create_if_missing=True, bloom_filter_bits=bloom_filter_bits)
+        else:
+            self.db = plyvel.DB(db_path, create_if_missing=True)
+
+        # Units of work are kept per thread, so concurrent operations do not get mixed up
+        self.units_of_work = local()
+
+    @property
+    def writer(self):
+        return getattr(self.units_of_work, "current", None) or self.db
+
+    @contextmanager
+    def unit_of_work(self, sync=False):
+        """
+        Groups all the writes done through the manager (by the current thread) within the ``with`` block into a single
+        atomic write, applied when the block is exited. Nothing is written if the block raises.
+
+        Nested units of work are merged into the outermost one.
+
+        Args:
+            sync (:obj:`bool`): whether the write is synced to disk before the block is exited.
+
+        Yields:
+            :obj:`UnitOfWork`: The unit of work the writes are collected in.
+        """
+
+        current = getattr(self.units_of_work, "current", None)
+        if current is not None:
+            yield current
+            return
+
+        unit = UnitOfWork(self.db, sync)
+        self.units_of_work.current = unit
+
+        try:
+            yield unit
+        finally:
+            self.units_of_work.current = None
+
+        unit.commit()
 
     def create_entry(self, key, value, prefix=None):
         """
@@ -49,7 +179,7 @@ class DBManager:
         key = key.encode("utf-8")
         value = value.encode("utf-8")
 
-        self.db.put(key, value)
+        self.writer.put(key, value)
 
     def load_entry(self, key, prefix=None):
         """
@@ -77,7 +207,7 @@ class DBManager:
         if isinstance(prefix, str):
             key = prefix + key
 
-        return self.db.get(key.encode("utf-8"))
+        return self.writer.get(key.encode("utf-8"))
 
     def delete_entry(self, key, prefix=None):
         """
@@ -102,4 +232,4 @@ class DBManager:
 
         key = key.encode("utf-8")
 
-        self.db.delete(key)
+        self.writer.delete(key)
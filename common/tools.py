@@ -56,6 +56,19 @@ def compute_locator(tx_id):
     return tx_id[:LOCATOR_LEN_HEX]
 
 
+def compute_binary_locator(tx_id):
+    """
+    Computes an appointment locator given a transaction id, in binary. Used to index data in memory, since a 16-byte
+    ``bytes`` object is significantly smaller than its 32-char hex representation.
+    Args:
+        tx_id (:obj:`str`): the transaction id used to compute the locator.
+    Returns:
+       :obj:`bytes`: The computed locator.
+    """
+
+    return bytes.fromhex(tx_id[:LOCATOR_LEN_HEX])
+
+
 def setup_data_folder(data_folder):
     """
     Create a data folder for either the client or the server side if the folder does not exists.
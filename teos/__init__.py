@@ -9,10 +9,13 @@ LOG_PREFIX = "teos"
 DEFAULT_CONF = {
     "API_BIND": {"value": "localhost", "type": str},
     "API_PORT": {"value": 9814, "type": int},
+    "API_WORKERS": {"value": 8, "type": int},
     "BTC_RPC_USER": {"value": "user", "type": str},
     "BTC_RPC_PASSWORD": {"value": "passwd", "type": str},
     "BTC_RPC_CONNECT": {"value": "127.0.0.1", "type": str},
     "BTC_RPC_PORT": {"value": MAINNET_RPC_PORT, "type": int},
+    "BTC_RPC_POOL_SIZE": {"value": 16, "type": int},
+    "BTC_RPC_BATCH_SIZE": {"value": 500, "type": int},
     "BTC_NETWORK": {"value": "mainnet", "type": str},
     "BTC_FEED_PROTOCOL": {"value": "tcp", "type": str},
     "BTC_FEED_CONNECT": {"value": "localhost", "type": str},
@@ -23,6 +26,12 @@ DEFAULT_CONF = {
     "EXPIRY_DELTA": {"value": 6, "type": int},
     "MIN_TO_SELF_DELAY": {"value": 20, "type": int},
     "LOCATOR_CACHE_SIZE": {"value": 6, "type": int},
+    "BLOCK_CACHE_SIZE": {"value": 16, "type": int},
+    "BLOCK_PREFETCH_WORKERS": {"value": 4, "type": int},
+    "CATCH_UP_MAX_LEAD": {"value": 6, "type": int},
+    "LOCAL_TX_DECODING": {"value": True, "type": bool},
+    "DECRYPTION_WORKERS": {"value": 0, "type": int},
+    "DECRYPTION_WORKER_TYPE": {"value": "process", "type": str},
     "LOG_FILE": {"value": "teos.log", "type": str, "path": True},
     "TEOS_SECRET_KEY": {"value": "teos_sk.der", "type": str, "path": True},
     "APPOINTMENTS_DB_PATH": {"value": "appointments", "type": str, "path": True},
@@ -1,5 +1,5 @@
-import os
 import logging
+from waitress import serve
 from flask import Flask, request, abort, jsonify
 
 from teos import LOG_PREFIX
@@ -11,13 +11,24 @@ from teos.gatekeeper import NotEnoughSlots, AuthenticationFailure
 from common.logger import Logger
 from common.cryptographer import hash_160
 from common.exceptions import InvalidParameter
-from common.constants import HTTP_OK, HTTP_BAD_REQUEST, HTTP_SERVICE_UNAVAILABLE, HTTP_NOT_FOUND
+from common.constants import (
+    HTTP_OK,
+    HTTP_BAD_REQUEST,
+    HTTP_SERVICE_UNAVAILABLE,
+    HTTP_NOT_FOUND,
+    HTTP_INTERNAL_SERVER_ERROR,
+)
 
 
-# ToDo: #5-add-async-to-api
 app = Flask(__name__)
 logger = Logger(actor="API", log_name_prefix=LOG_PREFIX)
 
+# Number of threads serving requests
+DEFAULT_API_WORKERS = 8
+
+# Maximum number of appointments that can be sent to ``add_appointments`` at once
+MAX_APPOINTMENTS_PER_REQUEST = 100
+
 
 # NOTCOVERED: not sure how to monkey path this one. May be related to #77
 def get_remote_addr():
@@ -62,6 +73,48 @@ def get_request_data_json(request):
         raise InvalidParameter("Request is not json encoded")
 
 
+def get_rejection_response(e):
+    """
+    Builds the response for an appointment rejected by the :obj:`Inspector <teos.inspector.Inspector>` or the
+    :obj:`Watcher <teos.watcher.Watcher>`.
+
+    Args:
+        e (:obj:`Exception`): the exception the appointment was rejected with.
+
+    Returns:
+        :obj:`tuple`: A tuple containing the response (:obj:`dict`) and response code (:obj:`int`).
+    """
+
+    if isinstance(e, InspectionFailed):
+        rcode = HTTP_BAD_REQUEST
+        response = {"error": "appointment rejected. {}".format(e.reason), "error_code": e.erno}
+
+    elif isinstance(e, (AuthenticationFailure, NotEnoughSlots)):
+        rcode = HTTP_BAD_REQUEST
+        response = {
+            "error": "appointment rejected. Invalid signature or user does not have enough slots available",
+            "error_code": errors.APPOINTMENT_INVALID_SIGNATURE_OR_INSUFFICIENT_SLOTS,
+        }
+
+    elif isinstance(e, AppointmentLimitReached):
+        rcode = HTTP_SERVICE_UNAVAILABLE
+        response = {"error": "appointment rejected"}
+
+    elif isinstance(e, AppointmentAlreadyTriggered):
+        rcode = HTTP_BAD_REQUEST
+        response = {
+            "error": "appointment rejected. The provided appointment has already been triggered",
+            "error_code": errors.APPOINTMENT_ALREADY_TRIGGERED,
+        }
+
+    else:
+        logger.error("Unexpected error while adding appointment", error=repr(e))
+        rcode = HTTP_INTERNAL_SERVER_ERROR
+        response = {"error": "appointment rejected. Internal error"}
+
+    return response, rcode
+
+
 class API:
     """
     The :class:`API` is in charge of the interface between the user and the tower. It handles and serves user requests.
@@ -72,11 +125,13 @@ class API:
         inspector (:obj:`Inspector <teos.inspector.Inspector>`): an ``Inspector`` instance to check the correctness of
             the received appointment data.
         watcher (:obj:`Watcher <teos.watcher.Watcher>`): a ``Watcher`` instance to pass the requests to.
+        workers (:obj:`int`): the number of threads serving requests.
     """
 
-    def __init__(self, host, port, inspector, watcher):
+    def __init__(self, host, port, inspector, watcher, workers=DEFAULT_API_WORKERS):
         self.host = host
         self.port = port
+        self.workers = max(workers, 1)
         self.inspector = inspector
         self.watcher = watcher
         self.app = app
@@ -85,6 +140,7 @@ class API:
         routes = {
             "/register": (self.register, ["POST"]),
             "/add_appointment": (self.add_appointment, ["POST"]),
+            "/add_appointments": (self.add_appointments, ["POST"]),
             "/get_appointment": (self.get_appointment, ["POST"]),
             "/get_all_appointments": (self.get_all_appointments, ["GET"]),
         }
@@ -177,30 +233,76 @@ class API:
             response = self.watcher.add_appointment(appointment, request_data.get("signature"))
             rcode = HTTP_OK
 
-        except InspectionFailed as e:
-            rcode = HTTP_BAD_REQUEST
-            response = {"error": "appointment rejected. {}".format(e.reason), "error_code": e.erno}
+        except (
+            InspectionFailed,
+            AuthenticationFailure,
+            NotEnoughSlots,
+            AppointmentLimitReached,
+            AppointmentAlreadyTriggered,
+        ) as e:
+            response, rcode = get_rejection_response(e)
 
-        except (AuthenticationFailure, NotEnoughSlots):
-            rcode = HTTP_BAD_REQUEST
-            response = {
-                "error": "appointment rejected. Invalid signature or user does not have enough slots available",
-                "error_code": errors.APPOINTMENT_INVALID_SIGNATURE_OR_INSUFFICIENT_SLOTS,
-            }
+        logger.info("Sending response and disconnecting", from_addr="{}".format(remote_addr), response=response)
+        return jsonify(response), rcode
 
-        except AppointmentLimitReached:
-            rcode = HTTP_SERVICE_UNAVAILABLE
-            response = {"error": "appointment rejected"}
+    def add_appointments(self):
+        """
+        Batch version of :meth:`add_appointment`, for clients with many appointments to send at once.
 
-        except AppointmentAlreadyTriggered:
-            rcode = HTTP_BAD_REQUEST
-            response = {
-                "error": "appointment rejected. The provided appointment has already been triggered",
-                "error_code": errors.APPOINTMENT_ALREADY_TRIGGERED,
-            }
+        Requests must be json encoded and contain an ``appointments`` field with a list of up to
+        ``MAX_APPOINTMENTS_PER_REQUEST`` items, each of them containing an ``appointment`` and ``signature`` fields.
+        The appointments are added to the :obj:`Watcher <teos.watcher.Watcher>` all at once, so the user records and
+        the database are updated once per request instead of once per appointment.
+
+        Returns:
+            :obj:`tuple`: A tuple containing the response (:obj:`str`) and response code (:obj:`int`). For well-formed
+            requests, the ``rcode`` is always 200 and the response contains a json with a ``receipts`` list, with an
+            item per appointment (in the same order) that contains either what :meth:`add_appointment` would have
+            responded with for accepted appointments or the error for rejected ones. For malformed requests, the
+            ``rcode`` is a 400 and the value contains an application error, and an error message. Error messages can be
+            found at :mod:`Errors <teos.errors>`.
+        """
+
+        # Getting the real IP if the server is behind a reverse proxy
+        remote_addr = get_remote_addr()
+        logger.info("Received add_appointments request", from_addr="{}".format(remote_addr))
+
+        # Check that data type and content are correct. Abort otherwise.
+        try:
+            request_data = get_request_data_json(request)
+            appointments_data = request_data.get("appointments")
+
+            if not isinstance(appointments_data, list) or not all(isinstance(d, dict) for d in appointments_data):
+                raise InvalidParameter("Wrong appointments format")
+
+            if len(appointments_data) > MAX_APPOINTMENTS_PER_REQUEST:
+                raise InvalidParameter(
+                    "Too many appointments (max {} per request)".format(MAX_APPOINTMENTS_PER_REQUEST)
+                )
 
+        except InvalidParameter as e:
+            return jsonify({"error": str(e), "error_code": errors.INVALID_REQUEST_FORMAT}), HTTP_BAD_REQUEST
+
+        receipts = [None] * len(appointments_data)
+        appointments = []
+        indexes = []
+
+        for i, appointment_data in enumerate(appointments_data):
+            try:
+                appointments.append(
+                    (self.inspector.inspect(appointment_data.get("appointment")), appointment_data.get("signature"))
+                )
+                indexes.append(i)
+
+            except InspectionFailed as e:
+                receipts[i], _ = get_rejection_response(e)
+
+        for i, response in zip(indexes, self.watcher.add_appointments(appointments)):
+            receipts[i] = get_rejection_response(response)[0] if isinstance(response, Exception) else response
+
+        response = {"receipts": receipts}
         logger.info("Sending response and disconnecting", from_addr="{}".format(remote_addr), response=response)
-        return jsonify(response), rcode
+        return jsonify(response), HTTP_OK
 
     def get_appointment(self):
         """
@@ -242,32 +344,18 @@ class API:
             signature = request_data.get("signature")
             user_id = self.watcher.gatekeeper.authenticate_user(message, signature)
 
-            triggered_appointments = self.watcher.db_manager.load_all_triggered_flags()
             uuid = hash_160("{}{}".format(locator, user_id))
+            status, appointment_data = self.watcher.db_manager.get_appointment_status(uuid)
 
-            # If the appointment has been triggered, it should be in the locator (default else just in case).
-            if uuid in triggered_appointments:
-                appointment_data = self.watcher.db_manager.load_responder_tracker(uuid)
-                if appointment_data:
-                    rcode = HTTP_OK
-                    # Remove user_id field from appointment data since it is an internal field
-                    appointment_data.pop("user_id")
-                    response = {"locator": locator, "status": "dispute_responded", "appointment": appointment_data}
-                else:
-                    rcode = HTTP_NOT_FOUND
-                    response = {"locator": locator, "status": "not_found"}
-
-            # Otherwise it should be either in the watcher, or not in the system.
+            # Triggered appointments are looked up in the Responder's data, the rest in the Watcher's
+            if appointment_data:
+                rcode = HTTP_OK
+                # Remove user_id field from appointment data since it is an internal field
+                appointment_data.pop("user_id")
+                response = {"locator": locator, "status": status, "appointment": appointment_data}
             else:
-                appointment_data = self.watcher.db_manager.load_watcher_appointment(uuid)
-                if appointment_data:
-                    rcode = HTTP_OK
-                    # Remove user_id field from appointment data since it is an internal field
-                    appointment_data.pop("user_id")
-                    response = {"locator": locator, "status": "being_watched", "appointment": appointment_data}
-                else:
-                    rcode = HTTP_NOT_FOUND
-                    response = {"locator": locator, "status": "not_found"}
+                rcode = HTTP_NOT_FOUND
+                response = {"locator": locator, "status": "not_found"}
 
         except (InspectionFailed, AuthenticationFailure):
             rcode = HTTP_NOT_FOUND
@@ -301,10 +389,15 @@ class API:
         return response
 
     def start(self):
-        """ This function starts the Flask server used to run the API """
+        """
+        This function starts the server used to run the API.
+
+        The API is served by ``waitress``: connections are handled asynchronously by its main loop, and requests are
+        dispatched to a pool of ``workers`` threads, so a request waiting on ``bitcoind``, the database or signing does
+        not hold the rest.
+        """
 
-        # Setting Flask log to ERROR only so it does not mess with our logging. Also disabling flask initial messages
-        logging.getLogger("werkzeug").setLevel(logging.ERROR)
-        os.environ["WERKZEUG_RUN_MAIN"] = "true"
+        # Setting waitress log to ERROR only so it does not mess with our logging
+        logging.getLogger("waitress").setLevel(logging.ERROR)
 
-        app.run(host=self.host, port=self.port)
+        serve(self.app, host=self.host, port=self.port, threads=self.workers)
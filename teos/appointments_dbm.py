@@ -1,10 +1,12 @@
 import json
+import struct
 import plyvel
 
 from teos import LOG_PREFIX
 
 from common.logger import Logger
 from common.db_manager import DBManager
+from common.constants import LOCATOR_LEN_BYTES
 
 logger = Logger(actor="AppointmentsDBM", log_name_prefix=LOG_PREFIX)
 
@@ -15,6 +17,216 @@ RESPONDER_LAST_BLOCK_KEY = "br"
 LOCATOR_MAP_PREFIX = "m"
 TRIGGERED_APPOINTMENTS_PREFIX = "ta"
 
+# Binary records start with their format version. Legacy (json) records always start with "{"
+RECORD_VERSION = b"\x01"
+USER_ID_LEN_BYTES = 33
+TXID_LEN_BYTES = 32
+
+APPOINTMENT_FIELDS = {"locator", "to_self_delay", "encrypted_blob", "user_id"}
+TRACKER_FIELDS = {"locator", "dispute_txid", "penalty_txid", "penalty_rawtx", "user_id"}
+
+
+def hex_to_bytes(value, length=None):
+    """
+    Converts a hex-encoded string to bytes, making sure it can be converted back to the exact same string.
+
+    Args:
+        value (:obj:`str`): the hex-encoded string.
+        length (:obj:`int`): the expected length of the data (in bytes). Any length is accepted if not set.
+
+    Returns:
+        :obj:`bytes`: The decoded data.
+
+    Raises:
+        :obj:`ValueError`: If the value is not lowercase hex or does not have the expected length.
+    """
+
+    if not isinstance(value, str):
+        raise ValueError("Wrong value type")
+
+    data = bytes.fromhex(value)
+
+    if data.hex() != value:
+        raise ValueError("Value is not lowercase hex")
+
+    if length is not None and len(data) != length:
+        raise ValueError("Wrong value length")
+
+    return data
+
+
+def encode_appointment(appointment):
+    """
+    Encodes an appointment using the binary record format:
+
+    ``version (1) | locator (16) | to_self_delay (4, big endian) | user_id (33) | encrypted_blob``
+
+    Args:
+        appointment (:obj:`dict`): an appointment encoded as a dictionary.
+
+    Returns:
+        :obj:`bytes`: The encoded appointment.
+
+    Raises:
+        :obj:`ValueError`: If the appointment cannot be represented in the binary format (unexpected fields, values
+        that are not lowercase hex or have the wrong length, etc.).
+    """
+
+    if not isinstance(appointment, dict) or appointment.keys() != APPOINTMENT_FIELDS:
+        raise ValueError("Unexpected appointment fields")
+
+    to_self_delay = appointment.get("to_self_delay")
+    if type(to_self_delay) is not int or not 0 <= to_self_delay < 2**32:
+        raise ValueError("Wrong to_self_delay")
+
+    return (
+        RECORD_VERSION
+        + hex_to_bytes(appointment.get("locator"), LOCATOR_LEN_BYTES)
+        + struct.pack(">I", to_self_delay)
+        + hex_to_bytes(appointment.get("user_id"), USER_ID_LEN_BYTES)
+        + hex_to_bytes(appointment.get("encrypted_blob"))
+    )
+
+
+def decode_appointment(data):
+    """
+    Decodes an appointment encoded by :func:`encode_appointment`.
+
+    Args:
+        data (:obj:`bytes`): the encoded appointment.
+
+    Returns:
+        :obj:`dict`: The appointment encoded as a dictionary.
+
+    Raises:
+        :obj:`ValueError`: If the data is not a valid binary appointment record.
+    """
+
+    header_len = 1 + LOCATOR_LEN_BYTES + 4 + USER_ID_LEN_BYTES
+    if data[:1] != RECORD_VERSION or len(data) < header_len:
+        raise ValueError("Wrong appointment record")
+
+    pos = 1 + LOCATOR_LEN_BYTES
+
+    return {
+        "locator": data[1:pos].hex(),
+        "to_self_delay": struct.unpack(">I", data[pos : pos + 4])[0],
+        "encrypted_blob": data[header_len:].hex(),
+        "user_id": data[pos + 4 : header_len].hex(),
+    }
+
+
+def encode_tracker(tracker):
+    """
+    Encodes a tracker using the binary record format:
+
+    ``version (1) | locator (16) | dispute_txid (32) | penalty_txid (32) | user_id (33) | penalty_rawtx``
+
+    Args:
+        tracker (:obj:`dict`): a tracker encoded as a dictionary.
+
+    Returns:
+        :obj:`bytes`: The encoded tracker.
+
+    Raises:
+        :obj:`ValueError`: If the tracker cannot be represented in the binary format (unexpected fields, values that
+        are not lowercase hex or have the wrong length, etc.).
+    """
+
+    if not isinstance(tracker, dict) or tracker.keys() != TRACKER_FIELDS:
+        raise ValueError("Unexpected tracker fields")
+
+    return (
+        RECORD_VERSION
+        + hex_to_bytes(tracker.get("locator"), LOCATOR_LEN_BYTES)
+        + hex_to_bytes(tracker.get("dispute_txid"), TXID_LEN_BYTES)
+        + hex_to_bytes(tracker.get("penalty_txid"), TXID_LEN_BYTES)
+        + hex_to_bytes(tracker.get("user_id"), USER_ID_LEN_BYTES)
+        + hex_to_bytes(tracker.get("penalty_rawtx"))
+    )
+
+
+def decode_tracker(data):
+    """
+    Decodes a tracker encoded by :func:`encode_tracker`.
+
+    Args:
+        data (:obj:`bytes`): the encoded tracker.
+
+    Returns:
+        :obj:`dict`: The tracker encoded as a dictionary.
+
+    Raises:
+        :obj:`ValueError`: If the data is not a valid binary tracker record.
+    """
+
+    dispute_pos = 1 + LOCATOR_LEN_BYTES
+    penalty_pos = dispute_pos + TXID_LEN_BYTES
+    user_id_pos = penalty_pos + TXID_LEN_BYTES
+    header_len = user_id_pos + USER_ID_LEN_BYTES
+
+    if data[:1] != RECORD_VERSION or len(data) < header_len:
+        raise ValueError("Wrong tracker record")
+
+    return {
+        "locator": data[1:dispute_pos].hex(),
+        "dispute_txid": data[dispute_pos:penalty_pos].hex(),
+        "penalty_txid": data[penalty_pos:user_id_pos].hex(),
+        "penalty_rawtx": data[header_len:].hex(),
+        "user_id": data[user_id_pos:header_len].hex(),
+    }
+
+
+def encode_record(data, prefix):
+    """
+    Encodes the data of an appointment / tracker to be stored in the database. The binary format is used if the data
+    fits it, otherwise the data is stored as json.
+
+    Args:
+        data (:obj:`dict`): the data to be encoded.
+        prefix (:obj:`str`): the prefix the data will be stored under (``WATCHER_PREFIX`` or ``RESPONDER_PREFIX``).
+
+    Returns:
+        :obj:`bytes`: The encoded data.
+
+    Raises:
+        :obj:`TypeError`: If the data cannot be json encoded either.
+    """
+
+    try:
+        return RECORD_ENCODERS[prefix](data)
+
+    except ValueError:
+        return json.dumps(data).encode("utf-8")
+
+
+def decode_record(data, prefix):
+    """
+    Decodes data loaded from the database. Both binary and legacy (json) records are supported.
+
+    Args:
+        data (:obj:`bytes`): the data to be decoded.
+        prefix (:obj:`str`): the prefix the data was stored under.
+
+    Returns:
+        :obj:`dict`: The decoded data.
+
+    Raises:
+        :obj:`ValueError`: If the data cannot be decoded.
+    """
+
+    if data[:1] == RECORD_VERSION and prefix in RECORD_DECODERS:
+        return RECORD_DECODERS[prefix](data)
+
+    return json.loads(data)
+
+
+# Bits per key of the bloom filter, so point lookups of non-existing keys (e.g. is_triggered) rarely hit the disk
+BLOOM_FILTER_BITS = 10
+
+RECORD_ENCODERS = {WATCHER_PREFIX: encode_appointment, RESPONDER_PREFIX: encode_tracker}
+RECORD_DECODERS = {WATCHER_PREFIX: decode_appointment, RESPONDER_PREFIX: decode_tracker}
+
 
 class AppointmentsDBM(DBManager):
     """
@@ -27,9 +239,13 @@ class AppointmentsDBM(DBManager):
         - ``RESPONDER_PREFIX``, defines as ``b'r``, is used to store :obj:`Responder <teos.responder.Responder>` trackers.
         - ``WATCHER_LAST_BLOCK_KEY``, defined as ``b'bw``, is used to store the last block hash known by the :obj:`Watcher <teos.watcher.Watcher>`.
         - ``RESPONDER_LAST_BLOCK_KEY``, defined as ``b'br``, is used to store the last block hash known by the :obj:`Responder <teos.responder.Responder>`.
-        - ``LOCATOR_MAP_PREFIX``, defined as ``b'm``, is used to store the ``locator:uuid`` maps.
+        - ``LOCATOR_MAP_PREFIX``, defined as ``b'm``, is used to store the ``locator:uuid`` maps (one empty entry per ``locator``, ``uuid`` pair).
         - ``TRIGGERED_APPOINTMENTS_PREFIX``, defined as ``b'ta``, is used to stored triggered appointments (appointments that have been handed to the :obj:`Responder <teos.responder.Responder>`.)
 
+    Appointments and trackers are stored using a versioned binary format (see :func:`encode_appointment` and
+    :func:`encode_tracker`). Legacy json records (and locator maps) are migrated when the database is opened (see
+    ``migrate_records``).
+
     Args:
         db_path (:obj:`str`): the path (relative or absolute) to the system folder containing the database. A fresh
             database will be created if the specified path does not contain one.
@@ -44,7 +260,7 @@ class AppointmentsDBM(DBManager):
             raise ValueError("db_path must be a valid path/name")
 
         try:
-            super().__init__(db_path)
+            super().__init__(db_path, bloom_filter_bits=BLOOM_FILTER_BITS)
 
         except plyvel.Error as e:
             if "LOCK: Resource temporarily unavailable" in str(e):
@@ -52,6 +268,15 @@ class AppointmentsDBM(DBManager):
 
             raise e
 
+        migrated = self.migrate_records()
+        if any(migrated.values()):
+            logger.info(
+                "Migrated records to the current db format",
+                appointments=migrated.get(WATCHER_PREFIX),
+                trackers=migrated.get(RESPONDER_PREFIX),
+                locator_maps=migrated.get(LOCATOR_MAP_PREFIX),
+            )
+
     def load_appointments_db(self, prefix):
         """
         Loads all data from the appointments database given a prefix. Two prefixes are defined: ``WATCHER_PREFIX`` and
@@ -68,10 +293,10 @@ class AppointmentsDBM(DBManager):
 
         data = {}
 
-        for k, v in self.db.iterator(prefix=prefix.encode("utf-8")):
+        for k, v in self.writer.iterator(prefix=prefix.encode("utf-8")):
             # Get uuid and appointment_data from the db
             uuid = k[len(prefix) :].decode("utf-8")
-            data[uuid] = json.loads(v)
+            data[uuid] = decode_record(v, prefix)
 
         return data
 
@@ -89,7 +314,7 @@ class AppointmentsDBM(DBManager):
             Returns ``None`` if the entry is not found.
         """
 
-        last_block = self.db.get(key.encode("utf-8"))
+        last_block = self.writer.get(key.encode("utf-8"))
 
         if last_block:
             last_block = last_block.decode("utf-8")
@@ -110,13 +335,39 @@ class AppointmentsDBM(DBManager):
         """
 
         try:
-            data = self.load_entry(uuid, prefix=WATCHER_PREFIX)
-            data = json.loads(data)
-        except (TypeError, json.decoder.JSONDecodeError):
+            data = decode_record(self.load_entry(uuid, prefix=WATCHER_PREFIX), WATCHER_PREFIX)
+        except (TypeError, ValueError):
             data = None
 
         return data
 
+    def batch_load_watcher_appointments(self, uuids):
+        """
+        Loads a list of appointments from the database using ``WATCHER_PREFIX`` as prefix to the given ``uuids``. All
+        the appointments are read from the same database snapshot.
+
+        Args:
+            uuids (:obj:`list`): a list of appointment unique identifiers.
+
+        Returns:
+            :obj:`dict`: A dictionary (``uuid:appointment_data``) containing the data of the appointments that are
+            found. Appointments that cannot be found are not included.
+        """
+
+        appointments = {}
+
+        with self.db.snapshot() as snapshot:
+            for uuid in uuids:
+                data = snapshot.get((WATCHER_PREFIX + uuid).encode("utf-8"))
+
+                if data is not None:
+                    try:
+                        appointments[uuid] = decode_record(data, WATCHER_PREFIX)
+                    except ValueError:
+                        logger.error("Appointment data cannot be decoded", uuid=uuid)
+
+        return appointments
+
     def load_responder_tracker(self, uuid):
         """
         Loads a tracker from the database using ``RESPONDER_PREFIX`` as a prefix to the given ``uuid``.
@@ -131,9 +382,8 @@ class AppointmentsDBM(DBManager):
         """
 
         try:
-            data = self.load_entry(uuid, prefix=RESPONDER_PREFIX)
-            data = json.loads(data)
-        except (TypeError, json.decoder.JSONDecodeError):
+            data = decode_record(self.load_entry(uuid, prefix=RESPONDER_PREFIX), RESPONDER_PREFIX)
+        except (TypeError, ValueError):
             data = None
 
         return data
@@ -171,6 +421,47 @@ class AppointmentsDBM(DBManager):
 
         return self.load_appointments_db(prefix=RESPONDER_PREFIX)
 
+    def migrate_records(self):
+        """
+        Re-encodes all the legacy (json) appointments and trackers in the database using the binary record format, and
+        splits the legacy (json) ``locator:uuid`` maps into one entry per uuid. All the changes are written at once,
+        and records that do not fit the binary format are left untouched.
+
+        This is run every time the database is opened, so legacy records never reach the rest of the tower.
+
+        Returns:
+            :obj:`dict`: The number of migrated records per prefix
+            (``{WATCHER_PREFIX: int, RESPONDER_PREFIX: int, LOCATOR_MAP_PREFIX: int}``).
+        """
+
+        migrated = {WATCHER_PREFIX: 0, RESPONDER_PREFIX: 0, LOCATOR_MAP_PREFIX: 0}
+
+        with self.db.snapshot() as snapshot, self.db.write_batch() as b:
+            # Legacy locator maps are the only ones with a value (a json list of uuids)
+            for k, v in snapshot.iterator(prefix=LOCATOR_MAP_PREFIX.encode("utf-8")):
+                if not v:
+                    continue
+
+                for uuid in json.loads(v):
+                    b.put(k + uuid.encode("utf-8"), b"")
+
+                b.delete(k)
+                migrated[LOCATOR_MAP_PREFIX] += 1
+
+            for prefix in RECORD_ENCODERS:
+                for k, v in snapshot.iterator(prefix=prefix.encode("utf-8")):
+                    if v[:1] == RECORD_VERSION:
+                        continue
+
+                    try:
+                        b.put(k, RECORD_ENCODERS[prefix](json.loads(v)))
+                        migrated[prefix] += 1
+
+                    except ValueError:
+                        logger.info("Record cannot be migrated", key=k.decode("utf-8"))
+
+        return migrated
+
     def store_watcher_appointment(self, uuid, appointment):
         """
         Stores an appointment in the database using the ``WATCHER_PREFIX`` prefix.
@@ -184,16 +475,37 @@ class AppointmentsDBM(DBManager):
         """
 
         try:
-            self.create_entry(uuid, json.dumps(appointment), prefix=WATCHER_PREFIX)
+            self.writer.put((WATCHER_PREFIX + uuid).encode("utf-8"), encode_record(appointment, WATCHER_PREFIX))
             logger.info("Adding appointment to Watchers's db", uuid=uuid)
             return True
 
-        except json.JSONDecodeError:
-            logger.info("Could't add appointment to db. Wrong appointment format.", uuid=uuid, appoinent=appointment)
+        except TypeError:
+            logger.info("Could't add appointment to db.", uuid=uuid, appoinent=appointment)
             return False
 
+    def batch_store_watcher_appointments(self, appointments):
+        """
+        Stores multiple appointments in the database, alongside their ``locator:uuid`` maps, in a single write.
+
+        Args:
+            appointments (:obj:`dict`): the appointments to be stored (``uuid:appointment``), encoded as dictionaries.
+
+        Returns:
+            :obj:`bool`: True if the appointments were stored in the db. False otherwise.
+        """
+
+        try:
+            # Nothing is written if any of the appointments cannot be encoded
+            with self.writer.write_batch(transaction=True) as b:
+                for uuid, appointment in appointments.items():
+                    b.put((WATCHER_PREFIX + uuid).encode("utf-8"), encode_record(appointment, WATCHER_PREFIX))
+                    b.put(self.get_locator_map_key(appointment.get("locator"), uuid), b"")
+
+            logger.info("Adding appointments to Watchers's db", uuids=list(appointments.keys()))
+            return True
+
         except TypeError:
-            logger.info("Could't add appointment to db.", uuid=uuid, appoinent=appointment)
+            logger.info("Could't add appointments to db.", uuids=list(appointments.keys()))
             return False
 
     def store_responder_tracker(self, uuid, tracker):
@@ -209,108 +521,60 @@ class AppointmentsDBM(DBManager):
         """
 
         try:
-            self.create_entry(uuid, json.dumps(tracker), prefix=RESPONDER_PREFIX)
+            self.writer.put((RESPONDER_PREFIX + uuid).encode("utf-8"), encode_record(tracker, RESPONDER_PREFIX))
             logger.info("Adding tracker to Responder's db", uuid=uuid)
             return True
 
-        except json.JSONDecodeError:
-            logger.info("Could't add tracker to db. Wrong tracker format.", uuid=uuid, tracker=tracker)
-            return False
-
         except TypeError:
             logger.info("Could't add tracker to db.", uuid=uuid, tracker=tracker)
             return False
 
-    def load_locator_map(self, locator):
+    @staticmethod
+    def get_locator_map_key(locator, uuid=""):
         """
-        Loads the ``locator:uuid`` map of a given ``locator`` from the database.
+        Builds the key of a ``locator:uuid`` map entry. Every ``uuid`` of a map has its own (empty) entry, so maps can
+        be appended to and reduced without reading them first.
 
         Args:
             locator (:obj:`str`): a 16-byte hex-encoded string representing the appointment locator.
+            uuid (:obj:`str`): the appointment uuid. If empty, the key is the prefix of all the entries of the map.
 
         Returns:
-            :obj:`dict` or :obj:`None`: The requested ``locator:uuid`` map if found.
-
-            Returns ``None`` otherwise.
+            :obj:`bytes`: The database key of the entry.
         """
 
-        key = (LOCATOR_MAP_PREFIX + locator).encode("utf-8")
-        locator_map = self.db.get(key)
-
-        if locator_map is not None:
-            locator_map = json.loads(locator_map.decode("utf-8"))
-
-        else:
-            logger.info("Locator not found in the db", locator=locator)
-
-        return locator_map
+        return (LOCATOR_MAP_PREFIX + locator + uuid).encode("utf-8")
 
     def create_append_locator_map(self, locator, uuid):
         """
         Creates a ``locator:uuid`` map.
 
-        If the map already exists, the new ``uuid`` is appended to the existing ones (if it is not already there).
+        If the map already exists, the new ``uuid`` is added to the existing ones (nothing changes if it was already
+        there).
 
         Args:
             locator (:obj:`str`): a 16-byte hex-encoded string used as the key of the map.
             uuid (:obj:`str`): a 16-byte hex-encoded unique id to create (or add to) the map.
         """
 
-        locator_map = self.load_locator_map(locator)
-
-        if locator_map is not None:
-            if uuid not in locator_map:
-                locator_map.append(uuid)
-                logger.info("Updating locator map", locator=locator, uuid=uuid)
+        self.writer.put(self.get_locator_map_key(locator, uuid), b"")
+        logger.info("Adding uuid to locator map", locator=locator, uuid=uuid)
 
-            else:
-                logger.info("UUID already in the map", locator=locator, uuid=uuid)
-
-        else:
-            locator_map = [uuid]
-            logger.info("Creating new locator map", locator=locator, uuid=uuid)
-
-        key = (LOCATOR_MAP_PREFIX + locator).encode("utf-8")
-        self.db.put(key, json.dumps(locator_map).encode("utf-8"))
-
-    def update_locator_map(self, locator, locator_map):
+    def batch_delete_locator_map_entries(self, locator_maps):
         """
-        Updates a ``locator:uuid`` map in the database by deleting one of it's uuid. It will only work as long as
-        the given ``locator_map`` is a subset of the current one and it's not empty.
+        Removes a collection of uuids from their ``locator:uuid`` maps. Maps are deleted once all their uuids are
+        removed. The entries are deleted without reading the maps, so uuids that are not found are simply ignored.
 
         Args:
-            locator (:obj:`str`): a 16-byte hex-encoded string used as the key of the map.
-            locator_map (:obj:`list`): a list of uuids to replace the current one on the db.
+            locator_maps (:obj:`dict`): the uuids to be removed from every map (``locator:uuids``).
         """
 
-        current_locator_map = self.load_locator_map(locator)
-
-        if set(locator_map).issubset(current_locator_map) and len(locator_map) != 0:
-            key = (LOCATOR_MAP_PREFIX + locator).encode("utf-8")
-            self.db.put(key, json.dumps(locator_map).encode("utf-8"))
+        with self.writer.write_batch() as b:
+            for locator, uuids in locator_maps.items():
+                for uuid in uuids:
+                    b.delete(self.get_locator_map_key(locator, uuid))
 
-        else:
-            logger.error("Trying to update a locator_map with completely different, or empty, data")
-
-    def delete_locator_map(self, locator):
-        """
-        Deletes a ``locator:uuid`` map.
-
-        Args:
-            locator (:obj:`str`): a 16-byte hex-encoded string identifying the map to delete.
-
-        Returns:
-            :obj:`bool`: True if the locator map was deleted from the database or it was non-existent, False otherwise.
-        """
-
-        try:
-            self.delete_entry(locator, prefix=LOCATOR_MAP_PREFIX)
-            logger.info("Deleting locator map from db", locator=locator)
-            return True
-
-        except TypeError:
-            logger.info("Couldn't delete locator map from db, locator has wrong type", locator=locator)
-            return False
+                logger.info("Removing uuids from locator map", locator=locator, uuids=list(uuids))
 
     def delete_watcher_appointment(self, uuid):
         """
@@ -340,7 +604,7 @@ class AppointmentsDBM(DBManager):
            uuids (:obj:`list`): a list of 16-byte hex-encoded strings identifying the appointments to be deleted.
         """
 
-        with self.db.write_batch() as b:
+        with self.writer.write_batch() as b:
             for uuid in uuids:
                 b.delete((WATCHER_PREFIX + uuid).encode("utf-8"))
                 logger.info("Deleting appointment from Watcher's db", uuid=uuid)
@@ -373,7 +637,7 @@ class AppointmentsDBM(DBManager):
            uuids (:obj:`list`): a list of 16-byte hex-encoded strings identifying the trackers to be deleted.
         """
 
-        with self.db.write_batch() as b:
+        with self.writer.write_batch() as b:
             for uuid in uuids:
                 b.delete((RESPONDER_PREFIX + uuid).encode("utf-8"))
                 logger.info("Deleting appointment from Responder's db", uuid=uuid)
@@ -444,7 +708,7 @@ class AppointmentsDBM(DBManager):
             uuid (:obj:`str`): the identifier of the flag to be created.
         """
 
-        self.db.put((TRIGGERED_APPOINTMENTS_PREFIX + uuid).encode("utf-8"), "".encode("utf-8"))
+        self.writer.put((TRIGGERED_APPOINTMENTS_PREFIX + uuid).encode("utf-8"), "".encode("utf-8"))
         logger.info("Flagging appointment as triggered", uuid=uuid)
 
     def batch_create_triggered_appointment_flag(self, uuids):
@@ -455,7 +719,7 @@ class AppointmentsDBM(DBManager):
             uuids (:obj:`list`): a list of identifiers for the appointments to flag.
         """
 
-        with self.db.write_batch() as b:
+        with self.writer.write_batch() as b:
             for uuid in uuids:
                 b.put((TRIGGERED_APPOINTMENTS_PREFIX + uuid).encode("utf-8"), b"")
                 logger.info("Flagging appointment as triggered", uuid=uuid)
@@ -470,9 +734,53 @@ class AppointmentsDBM(DBManager):
 
         return [
             k.decode()[len(TRIGGERED_APPOINTMENTS_PREFIX) :]
-            for k, v in self.db.iterator(prefix=TRIGGERED_APPOINTMENTS_PREFIX.encode("utf-8"))
+            for k, v in self.writer.iterator(prefix=TRIGGERED_APPOINTMENTS_PREFIX.encode("utf-8"))
         ]
 
+    def is_triggered(self, uuid):
+        """
+        Checks whether an appointment has been flagged as triggered.
+
+        Args:
+            uuid (:obj:`str`): the identifier of the appointment.
+
+        Returns:
+            :obj:`bool`: True if the appointment has been flagged as triggered, False otherwise.
+        """
+
+        return self.writer.get((TRIGGERED_APPOINTMENTS_PREFIX + uuid).encode("utf-8")) is not None
+
+    def get_appointment_status(self, uuid):
+        """
+        Gets the status of an appointment and its data. The data is read from a single database snapshot, so the result
+        is consistent even if the appointment is being handed to the :obj:`Responder <teos.responder.Responder>`.
+
+        Args:
+            uuid (:obj:`str`): the identifier of the appointment.
+
+        Returns:
+            :obj:`tuple`: A tuple ``(status, data)``. The status is ``dispute_responded`` if the appointment has been
+            triggered (``data`` is the tracker), ``being_watched`` if it is still held by the
+            :obj:`Watcher <teos.watcher.Watcher>` (``data`` is the appointment), and ``not_found`` otherwise (``data``
+            is ``None``).
+        """
+
+        with self.db.snapshot() as snapshot:
+            if snapshot.get((TRIGGERED_APPOINTMENTS_PREFIX + uuid).encode("utf-8")) is not None:
+                status, prefix = "dispute_responded", RESPONDER_PREFIX
+            else:
+                status, prefix = "being_watched", WATCHER_PREFIX
+
+            data = snapshot.get((prefix + uuid).encode("utf-8"))
+
+        if data is not None:
+            try:
+                return status, decode_record(data, prefix)
+            except ValueError:
+                logger.error("Appointment data cannot be decoded", uuid=uuid)
+
+        return "not_found", None
+
     def delete_triggered_appointment_flag(self, uuid):
         """
         Deletes a flag that signals that an appointment has been triggered.
@@ -501,7 +809,7 @@ class AppointmentsDBM(DBManager):
             uuids (:obj:`list`): the identifier of the flag to be removed.
         """
 
-        with self.db.write_batch() as b:
+        with self.writer.write_batch() as b:
             for uuid in uuids:
                 b.delete((TRIGGERED_APPOINTMENTS_PREFIX + uuid).encode("utf-8"))
                 logger.info("Removing triggered flag from appointment appointment", uuid=uuid)
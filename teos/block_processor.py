@@ -1,17 +1,264 @@
+import sys
+from time import time
+from collections import OrderedDict
+from threading import Lock, Event
+from concurrent.futures import ThreadPoolExecutor
+
 from common.logger import Logger
 from common.exceptions import BasicException
 
 from teos import LOG_PREFIX
-from teos.tools import bitcoin_cli
+from teos.tools import bitcoin_cli, batch_rpc, DEFAULT_BATCH_SIZE
 from teos.utils.auth_proxy import JSONRPCException
+from teos.utils import tx_parser
 
 logger = Logger(actor="BlockProcessor", log_name_prefix=LOG_PREFIX)
 
+# Number of blocks kept by the block cache. Covers the blocks processed by the Watcher and the Responder, the ones
+# fetched when fixing the LocatorCache after a reorg and the ones prefetched while catching up (see Builder)
+DEFAULT_BLOCK_CACHE_SIZE = 16
+
+# Maximum number of blocks requested to bitcoind at the same time when fetching a range of blocks
+DEFAULT_PREFETCH_WORKERS = 4
+
+# Time (in seconds) the chain tip is trusted for without being refreshed. Covers a couple of ChainMonitor polls
+DEFAULT_CHAIN_TIP_MAX_AGE = 120
+
 
 class InvalidTransactionFormat(BasicException):
     """Raised when a transaction is not properly formatted"""
 
 
+def estimate_block_size(block):
+    """
+    Estimates the memory held by a block (as returned by ``getblock``). Only the block fields and the items of the
+    list fields (e.g. the ``tx`` list) are accounted for.
+
+    Args:
+        block (:obj:`dict`): the block data.
+
+    Returns:
+        :obj:`int`: The estimated size of the block, in bytes.
+    """
+
+    size = sys.getsizeof(block)
+
+    for k, v in block.items():
+        size += sys.getsizeof(k) + sys.getsizeof(v)
+
+        if isinstance(v, list):
+            size += sum(sys.getsizeof(item) for item in v)
+
+    return size
+
+
+class BlockCache:
+    """
+    The :class:`BlockCache` keeps the last requested blocks (by hash) so components processing the same block (e.g.
+    the :obj:`Watcher <teos.watcher.Watcher>` and the :obj:`Responder <teos.responder.Responder>`) only fetch and
+    decode it once. Blocks are evicted in least-recently-used order once the cache is full.
+
+    Concurrent requests for a block that is not cached are merged, so only the first one fetches it while the rest
+    wait for the result.
+
+    Args:
+        max_size (:obj:`int`): the maximum number of blocks kept in the cache.
+
+    Attributes:
+        blocks (:obj:`OrderedDict`): the cached blocks (``block_hash:block``), from least to most recently used.
+        sizes (:obj:`dict`): the estimated size of every cached block (``block_hash:size``).
+        hits (:obj:`int`): the number of requests served from the cache.
+        misses (:obj:`int`): the number of requests that required fetching the block.
+        size (:obj:`int`): the estimated size of all the cached blocks, in bytes.
+        pending (:obj:`dict`): the blocks that are being fetched (``block_hash:Event``). Requests for a block that is
+            already being fetched wait for its event instead of fetching it again.
+    """
+
+    def __init__(self, max_size=DEFAULT_BLOCK_CACHE_SIZE):
+        if not isinstance(max_size, int) or max_size < 0:
+            raise ValueError("max_size must be a non-negative integer")
+
+        self.max_size = max_size
+        self.blocks = OrderedDict()
+        self.sizes = dict()
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self.pending = dict()
+        self.lock = Lock()
+
+    def get(self, block_hash, fetch):
+        """
+        Gets a block from the cache, fetching it if missing.
+
+        Args:
+            block_hash (:obj:`str`): the hash of the requested block.
+            fetch (:obj:`function`): the function used to fetch the block if it is not cached. It receives the
+                ``block_hash`` and returns the block, or ``None`` if the block cannot be found.
+
+        Returns:
+            :obj:`dict` or :obj:`None`: The requested block, or ``None`` if it cannot be found. Cached blocks are shared
+            between callers, so they must not be modified.
+        """
+
+        with self.lock:
+            block = self.blocks.get(block_hash)
+
+            if block is not None:
+                self.blocks.move_to_end(block_hash)
+                self.hits += 1
+                return block
+
+            fetching = self.pending.get(block_hash)
+            if fetching is None:
+                self.misses += 1
+                self.pending[block_hash] = Event()
+
+        # Another thread is already fetching the block, so its result is used
+        if fetching is not None:
+            fetching.wait()
+            with self.lock:
+                block = self.blocks.get(block_hash)
+                if block is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+
+            return block if block is not None else fetch(block_hash)
+
+        try:
+            block = fetch(block_hash)
+
+            if block is not None:
+                self.add(block_hash, block)
+
+        finally:
+            with self.lock:
+                self.pending.pop(block_hash).set()
+
+        return block
+
+    def add(self, block_hash, block):
+        """
+        Adds a block to the cache, evicting the least recently used ones if the cache is full.
+
+        Args:
+            block_hash (:obj:`str`): the hash of the block.
+            block (:obj:`dict`): the block data.
+        """
+
+        if self.max_size == 0:
+            return
+
+        block_size = estimate_block_size(block)
+
+        with self.lock:
+            if block_hash in self.blocks:
+                self.size -= self.sizes.get(block_hash)
+
+            self.blocks[block_hash] = block
+            self.blocks.move_to_end(block_hash)
+            self.sizes[block_hash] = block_size
+            self.size += block_size
+
+            while len(self.blocks) > self.max_size:
+                evicted_hash, _ = self.blocks.popitem(last=False)
+                self.size -= self.sizes.pop(evicted_hash)
+
+    def get_metrics(self):
+        """
+        Gets the cache metrics.
+
+        Returns:
+            :obj:`dict`: A dictionary with the number of ``hits`` and ``misses``, the ``hit_rate``, the number of cached
+            ``blocks`` and the estimated ``size`` of the cache (in bytes).
+        """
+
+        with self.lock:
+            requests = self.hits + self.misses
+
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "blocks": len(self.blocks),
+                "size": self.size,
+            }
+
+
+class ChainTip:
+    """
+    The :class:`ChainTip` keeps the best chain tip, as seen by the
+    :obj:`ChainMonitor <teos.chain_monitor.ChainMonitor>`, so components that only need the current height (e.g. the
+    :obj:`Inspector <teos.inspector.Inspector>` or the :obj:`Gatekeeper <teos.gatekeeper.Gatekeeper>`) do not need to
+    query ``bitcoind`` for it.
+
+    The tip is refreshed every time the ``ChainMonitor`` hears from ``bitcoind``, so a tip that has not been refreshed
+    for ``max_age`` seconds is considered stale.
+
+    Args:
+        max_age (:obj:`int`): the time (in seconds) the tip is considered fresh after being updated or refreshed.
+
+    Attributes:
+        block_hash (:obj:`str`): the hash of the best chain tip.
+        height (:obj:`int`): the height of the best chain tip.
+        updated_at (:obj:`float`): the last time the tip was updated or refreshed.
+    """
+
+    def __init__(self, max_age=DEFAULT_CHAIN_TIP_MAX_AGE):
+        self.max_age = max_age
+        self.block_hash = None
+        self.height = None
+        self.updated_at = None
+        self.lock = Lock()
+
+    def update(self, block_hash, height):
+        """
+        Sets a new chain tip.
+
+        Args:
+            block_hash (:obj:`str`): the hash of the new tip.
+            height (:obj:`int`): the height of the new tip.
+        """
+
+        with self.lock:
+            self.block_hash = block_hash
+            self.height = height
+            self.updated_at = time()
+
+    def refresh(self, block_hash):
+        """
+        Refreshes the chain tip if it has not changed.
+
+        Args:
+            block_hash (:obj:`str`): the hash of the current tip.
+
+        Returns:
+            :obj:`bool`: True if ``block_hash`` is the known tip (and it has been refreshed), False otherwise.
+        """
+
+        with self.lock:
+            if self.block_hash is not None and block_hash == self.block_hash:
+                self.updated_at = time()
+                return True
+
+            return False
+
+    def get_height(self):
+        """
+        Gets the height of the chain tip.
+
+        Returns:
+            :obj:`int` or :obj:`None`: The height of the tip, or ``None`` if the tip is unknown or stale.
+        """
+
+        with self.lock:
+            if self.updated_at is None or time() - self.updated_at > self.max_age:
+                return None
+
+            return self.height
+
+
 class BlockProcessor:
     """
     The :class:`BlockProcessor` contains methods related to the blockchain. Most of its methods require communication
@@ -20,15 +267,65 @@ class BlockProcessor:
     Args:
         btc_connect_params (:obj:`dict`): a dictionary with the parameters to connect to bitcoind
             (rpc user, rpc password, host and port)
+        local_tx_decoding (:obj:`bool`): whether transactions should be decoded in-process instead of by ``bitcoind``.
+        block_cache_size (:obj:`int`): the maximum number of blocks kept in the block cache (``0`` disables it).
+        prefetch_workers (:obj:`int`): the maximum number of blocks requested at the same time when fetching a range of
+            blocks.
+
+    Attributes:
+        batch_size (:obj:`int`): the maximum number of requests sent to ``bitcoind`` in a single json-rpc batch
+            (``BTC_RPC_BATCH_SIZE``).
+        local_tx_decoding (:obj:`bool`): whether transactions are decoded in-process (using
+            :mod:`tx_parser <teos.utils.tx_parser>`) or by ``bitcoind``.
+        block_cache (:obj:`BlockCache`): a cache of the last requested blocks, shared by all the components using the
+            ``BlockProcessor``.
+        prefetch_workers (:obj:`int`): the maximum number of blocks requested at the same time when fetching a range of
+            blocks, and fetched ahead of the components when catching up (``1`` fetches them one by one).
+        chain_tip (:obj:`ChainTip`): the best chain tip, kept up to date by the
+            :obj:`ChainMonitor <teos.chain_monitor.ChainMonitor>` and shared by all the components using the
+            ``BlockProcessor``.
     """
 
-    def __init__(self, btc_connect_params):
+    def __init__(
+        self,
+        btc_connect_params,
+        local_tx_decoding=True,
+        block_cache_size=DEFAULT_BLOCK_CACHE_SIZE,
+        prefetch_workers=DEFAULT_PREFETCH_WORKERS,
+    ):
         self.btc_connect_params = btc_connect_params
+        self.batch_size = btc_connect_params.get("BTC_RPC_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+        self.local_tx_decoding = local_tx_decoding
+        self.block_cache = BlockCache(block_cache_size)
+        self.prefetch_workers = max(prefetch_workers, 1)
+        self.chain_tip = ChainTip()
 
-    def get_block(self, block_hash):
+    def get_block(self, block_hash, use_cache=True):
         """
         Gets a block given a block hash by querying ``bitcoind``.
 
+        Blocks are served from the block cache if possible. Cached blocks are shared, so they must not be modified, and
+        their chain dependant fields (``confirmations`` and ``nextblockhash``) may be outdated.
+
+        Args:
+            block_hash (:obj:`str`): the block hash to be queried.
+            use_cache (:obj:`bool`): whether the block can be served from (and added to) the block cache.
+
+        Returns:
+            :obj:`dict` or :obj:`None`: A dictionary containing the requested block data if the block is found.
+
+            Returns ``None`` otherwise.
+        """
+
+        if use_cache:
+            return self.block_cache.get(block_hash, self.fetch_block)
+
+        return self.fetch_block(block_hash)
+
+    def fetch_block(self, block_hash):
+        """
+        Gets a block given a block hash by querying ``bitcoind`` (bypassing the block cache).
+
         Args:
             block_hash (:obj:`str`): the block hash to be queried.
 
@@ -47,6 +344,104 @@ class BlockProcessor:
 
         return block
 
+    def get_blocks(self, block_hashes, use_cache=True):
+        """
+        Gets a list of blocks given their hashes, keeping up to ``prefetch_workers`` requests to ``bitcoind`` in flight.
+
+        Args:
+            block_hashes (:obj:`list`): the hashes of the blocks to be queried.
+            use_cache (:obj:`bool`): whether the blocks can be served from (and added to) the block cache.
+
+        Returns:
+            :obj:`list`: A list with the requested blocks, in the same order as ``block_hashes``. Blocks that cannot be
+            found are ``None``.
+        """
+
+        if self.prefetch_workers == 1 or len(block_hashes) < 2:
+            return [self.get_block(block_hash, use_cache) for block_hash in block_hashes]
+
+        with ThreadPoolExecutor(max_workers=self.prefetch_workers, thread_name_prefix="prefetch") as executor:
+            return list(executor.map(lambda block_hash: self.get_block(block_hash, use_cache), block_hashes))
+
+    def get_block_hashes(self, heights):
+        """
+        Gets the hashes of the best chain blocks at the given heights using json-rpc batches of up to ``batch_size``
+        requests.
+
+        If ``bitcoind`` rejects the batches, the hashes are requested one by one.
+
+        Args:
+            heights (:obj:`list`): the heights of the blocks.
+
+        Returns:
+            :obj:`list`: A list with the requested hashes, in the same order as ``heights``. Hashes that cannot be found
+            (e.g. the height is over the tip) are ``None``.
+        """
+
+        heights = list(heights)
+
+        try:
+            results = batch_rpc(
+                self.btc_connect_params, "getblockhash", [[height] for height in heights], self.batch_size
+            )
+            return [block_hash for block_hash, _ in results]
+
+        except JSONRPCException as e:
+            logger.warning("Batch request rejected. Falling back to single requests", error=e.error)
+
+        block_hashes = []
+        for height in heights:
+            try:
+                block_hashes.append(bitcoin_cli(self.btc_connect_params).getblockhash(height))
+
+            except JSONRPCException as e:
+                block_hashes.append(None)
+                logger.error("Couldn't get block hash", height=height, error=e.error)
+
+        return block_hashes
+
+    def get_previous_blocks(self, block_hash, n):
+        """
+        Gets up to ``n`` blocks of the chain ending at a given block (included), from the oldest to the most recent.
+
+        If the block is in the best chain, the hashes of its ancestors are resolved by height (in batches) and the
+        blocks are fetched concurrently (see ``get_blocks``). Otherwise, or if the best chain changes while the blocks
+        are being fetched, the chain is walked back one block at a time.
+
+        Args:
+            block_hash (:obj:`str`): the hash of the most recent block.
+            n (:obj:`int`): the maximum number of blocks to get. Less are returned if genesis is reached.
+
+        Returns:
+            :obj:`list`: A list with the requested blocks. Empty if ``block_hash`` cannot be found.
+        """
+
+        block = self.get_block(block_hash)
+        if block is None or n < 1:
+            return []
+
+        height = block.get("height")
+        block_hashes = self.get_block_hashes(range(max(height - n + 1, 0), height))
+
+        if None not in block_hashes:
+            blocks = self.get_blocks(block_hashes) + [block]
+
+            # Check the blocks are actually linked (this does not hold if block_hash is not in the best chain)
+            if None not in blocks and all(
+                child.get("previousblockhash") == parent.get("hash") for parent, child in zip(blocks, blocks[1:])
+            ):
+                return blocks
+
+        blocks = [block]
+        while len(blocks) < n and blocks[-1].get("previousblockhash"):
+            block = self.get_block(blocks[-1].get("previousblockhash"))
+            if block is None:
+                break
+
+            blocks.append(block)
+
+        return blocks[::-1]
+
     def get_best_block_hash(self):
         """
         Gets the hash of the current best chain tip.
@@ -85,11 +480,29 @@ class BlockProcessor:
 
         return block_count
 
+    def get_tip_height(self):
+        """
+        Gets the height of the best chain tip. The tip kept by the ``ChainMonitor`` (``chain_tip``) is used if fresh, so
+        ``bitcoind`` is only queried if the tip is unknown or stale.
+
+        Returns:
+            :obj:`int` or :obj:`None`: The height of the best chain tip if it can be computed.
+
+            Returns ``None`` otherwise.
+        """
+
+        height = self.chain_tip.get_height()
+
+        return height if height is not None else self.get_block_count()
+
     def decode_raw_transaction(self, raw_tx):
         """
         Deserializes a given raw transaction (hex encoded) and builds a dictionary representing it with all the
         associated metadata given by ``bitcoind`` (e.g. confirmation count).
 
+        If ``local_tx_decoding`` is set, the transaction is decoded in-process instead. The result includes all the
+        data that can be derived from the transaction itself (e.g. ``txid``), but scripts are not disassembled.
+
         Args:
             raw_tx (:obj:`str`): the hex representation of the transaction.
 
@@ -100,6 +513,15 @@ class BlockProcessor:
             :obj:`InvalidTransactionFormat`: If the provided ``raw_tx`` has invalid format.
         """
 
+        if self.local_tx_decoding:
+            try:
+                return tx_parser.decode_raw_transaction(raw_tx)
+
+            except ValueError as e:
+                msg = "Cannot build transaction from decoded data"
+                logger.error(msg, error=str(e))
+                raise InvalidTransactionFormat(msg)
+
         try:
             tx = bitcoin_cli(self.btc_connect_params).decoderawtransaction(raw_tx)
 
@@ -110,6 +532,58 @@ class BlockProcessor:
 
         return tx
 
+    def decode_raw_transactions(self, raw_txs):
+        """
+        Deserializes a list of raw transactions (hex encoded) using json-rpc batches of up to ``batch_size`` requests.
+
+        If ``bitcoind`` rejects the batches, the transactions are decoded one by one. If ``local_tx_decoding`` is set,
+        no requests are sent to ``bitcoind`` at all.
+
+        Args:
+            raw_txs (:obj:`list`): a list of hex encoded transactions.
+
+        Returns:
+            :obj:`dict`: A dictionary (``raw_tx:decoded_tx``) with an entry per each given ``raw_tx``. ``decoded_tx`` is
+            the decoding of ``raw_tx`` if the transaction is well formatted, ``None`` otherwise.
+        """
+
+        # Duplicates are dropped (keeping the order) so they are only decoded once
+        raw_txs = list(dict.fromkeys(raw_txs))
+        decoded_txs = {}
+
+        if self.local_tx_decoding:
+            for raw_tx in raw_txs:
+                try:
+                    decoded_txs[raw_tx] = self.decode_raw_transaction(raw_tx)
+                except InvalidTransactionFormat:
+                    decoded_txs[raw_tx] = None
+
+            return decoded_txs
+
+        try:
+            results = batch_rpc(
+                self.btc_connect_params, "decoderawtransaction", [[raw_tx] for raw_tx in raw_txs], self.batch_size
+            )
+
+        except JSONRPCException as e:
+            logger.warning("Batch request rejected. Falling back to single requests", error=e.error)
+
+            for raw_tx in raw_txs:
+                try:
+                    decoded_txs[raw_tx] = self.decode_raw_transaction(raw_tx)
+                except InvalidTransactionFormat:
+                    decoded_txs[raw_tx] = None
+
+            return decoded_txs
+
+        for raw_tx, (tx, error) in zip(raw_txs, results):
+            if error is not None:
+                logger.error("Cannot build transaction from decoded data", error=error)
+
+            decoded_txs[raw_tx] = tx
+
+        return decoded_txs
+
     def get_distance_to_tip(self, target_block_hash):
         """
         Compute the distance between a given block hash and the best chain tip.
@@ -142,7 +616,9 @@ class BlockProcessor:
         """
         Gets the blocks between the current best chain tip and a given block hash (``last_know_block_hash``).
 
-        This method is used to fetch all the missed information when recovering from a crash.
+        This method is used to fetch all the missed information when recovering from a crash. If the last known block is
+        in the best chain, the hashes are resolved by height (in batches). Otherwise the chain is walked back from the
+        tip one block at a time.
 
         Args:
             last_know_block_hash (:obj:`str`): the hash of the last known block.
@@ -153,6 +629,17 @@ class BlockProcessor:
         """
 
         current_block_hash = self.get_best_block_hash()
+
+        # If the last known block is in the best chain the missed blocks can be found by height
+        last_known_block = self.get_block(last_know_block_hash) if last_know_block_hash else None
+        tip = self.get_block(current_block_hash) if current_block_hash else None
+
+        if last_known_block is not None and tip is not None and last_known_block.get("height") <= tip.get("height"):
+            block_hashes = self.get_block_hashes(range(last_known_block.get("height"), tip.get("height") + 1))
+
+            if block_hashes[0] == last_know_block_hash and block_hashes[-1] == current_block_hash:
+                return block_hashes[1:]
+
         missed_blocks = []
 
         while current_block_hash != last_know_block_hash and current_block_hash is not None:
@@ -180,7 +667,8 @@ class BlockProcessor:
             KeyError: If the block cannot be found in the blockchain.
         """
 
-        block = self.get_block(block_hash)
+        # The confirmation count of cached blocks may be outdated
+        block = self.get_block(block_hash, use_cache=False)
 
         if block is None:
             # This should never happen as long as we are using the same node, since bitcoind never drops orphan blocks
@@ -205,13 +693,25 @@ class BlockProcessor:
             :obj:`tuple`: A tuple (:obj:`str`:, :obj:`list`:) where the first item contains the hash of the last common
                 ancestor and the second item contains the list of transactions from ``last_known_block_hash`` to
                 ``last_common_ancestor``.
+
+        Raises:
+            KeyError: If a block cannot be found in the blockchain.
         """
 
         target_block_hash = last_known_block_hash
         dropped_txs = []
 
-        while not self.is_block_in_best_chain(target_block_hash):
-            block = self.get_block(target_block_hash)
+        while True:
+            # The confirmation count of cached blocks may be outdated. The same request is used to check whether the
+            # block is in the best chain and to get its transactions
+            block = self.get_block(target_block_hash, use_cache=False)
+
+            if block is None:
+                raise KeyError("Block not found")
+
+            if block.get("confirmations") != -1:
+                break
+
             dropped_txs.extend(block.get("tx"))
             target_block_hash = block.get("previousblockhash")
 
@@ -1,6 +1,13 @@
+from queue import Queue
+from threading import Thread, Semaphore
+from concurrent.futures import ThreadPoolExecutor
+
 from teos.responder import TransactionTracker
 from teos.extended_appointment import ExtendedAppointment
 
+# Maximum number of blocks the Watcher can be ahead of the Responder while catching up
+DEFAULT_MAX_LEAD = 6
+
 
 class Builder:
     """
@@ -23,7 +30,7 @@ class Builder:
         Returns:
             :obj:`tuple`: A tuple with two dictionaries. ``appointments`` containing the appointment information in
             :obj:`ExtendedAppointment <teos.extended_appointment.ExtendedAppointment>` objects and ``locator_uuid_map``
-            containing a map of appointment (``uuid:locator``).
+            containing a map of appointment (``uuid:locator``). Locators are binary in both.
         """
 
         appointments = {}
@@ -31,13 +38,16 @@ class Builder:
 
         for uuid, data in appointments_data.items():
             appointment = ExtendedAppointment.from_dict(data)
-            appointments[uuid] = appointment.get_summary()
+            summary = appointment.get_summary()
+            appointments[uuid] = summary
 
-            if appointment.locator in locator_uuid_map:
-                locator_uuid_map[appointment.locator].append(uuid)
+            # The summary and the map share the same (binary) locator object
+            locator = summary.get("locator")
+            if locator in locator_uuid_map:
+                locator_uuid_map[locator].append(uuid)
 
             else:
-                locator_uuid_map[appointment.locator] = [uuid]
+                locator_uuid_map[locator] = [uuid]
 
         return appointments, locator_uuid_map
 
@@ -77,28 +87,85 @@ class Builder:
         return trackers, tx_tracker_map
 
     @staticmethod
-    def populate_block_queue(block_queue, missed_blocks):
+    def prefetch_blocks(block_processor, block_hashes, in_use=1):
+        """
+        Iterates over a list of block hashes while the blocks that follow are fetched (concurrently) into the block
+        cache of the ``block_processor``, so the components processing them do not have to wait for ``bitcoind``.
+
+        Up to ``prefetch_workers`` blocks are fetched ahead, as long as they fit in the block cache alongside the
+        ``in_use`` blocks that may still be requested or have been requested since (otherwise they could be evicted
+        before being processed).
+
+        Args:
+            block_processor (:obj:`BlockProcessor <teos.block_processor.BlockProcessor>`): the ``BlockProcessor`` the
+                components get the blocks from.
+            block_hashes (:obj:`list`): the hashes of the blocks to iterate over.
+            in_use (:obj:`int`): the number of blocks in the block cache that cannot be evicted in favour of the
+                prefetched ones.
+
+        Yields:
+            :obj:`str`: The block hashes, in order.
+        """
+
+        block_hashes = list(block_hashes)
+        ahead = min(block_processor.prefetch_workers, block_processor.block_cache.max_size - in_use)
+
+        if ahead < 1:
+            yield from block_hashes
+            return
+
+        # Blocks requested while they are being prefetched are not fetched twice (see BlockCache.get)
+        with ThreadPoolExecutor(max_workers=ahead, thread_name_prefix="prefetch") as executor:
+            for block_hash in block_hashes[:ahead]:
+                executor.submit(block_processor.get_block, block_hash)
+
+            for i, block_hash in enumerate(block_hashes):
+                if i + ahead < len(block_hashes):
+                    executor.submit(block_processor.get_block, block_hashes[i + ahead])
+
+                yield block_hash
+
+    @staticmethod
+    def populate_block_queue(block_queue, missed_blocks, block_processor=None):
         """
         Populates a ``Queue`` of block hashes to initialize the :mod:`Watcher <teos.watcher.Watcher>` or the
         :mod:`Responder <teos.responder.Responder>` using backed up data.
 
+        If a ``block_processor`` is provided, blocks are handed one by one (waiting for the queue to be processed) while
+        the following ones are prefetched (see ``prefetch_blocks``).
+
         Args:
             block_queue (:obj:`Queue`): a ``Queue``.
             missed_blocks (:obj:`list`): list of block hashes missed by the Watchtower (due to a crash or shutdown).
+            block_processor (:obj:`BlockProcessor <teos.block_processor.BlockProcessor>`): the ``BlockProcessor`` used
+                by the component consuming the queue. Optional.
 
         Returns:
             :obj:`Queue`: A ``Queue`` containing all the missed blocks hashes.
         """
 
-        for block in missed_blocks:
-            block_queue.put(block)
+        if block_processor is None:
+            for block in missed_blocks:
+                block_queue.put(block)
+
+        else:
+            for block in Builder.prefetch_blocks(block_processor, missed_blocks):
+                block_queue.put(block)
+                block_queue.join()
 
     @staticmethod
-    def update_states(watcher, missed_blocks_watcher, missed_blocks_responder):
+    def update_states(
+        watcher, missed_blocks_watcher, missed_blocks_responder, max_lead=DEFAULT_MAX_LEAD, block_processor=None
+    ):
         """
         Updates the states of both the :mod:`Watcher <teos.watcher.Watcher>` and the
         :mod:`Responder <teos.responder.Responder>`. If both have pending blocks to process they need to be updated at
-        the same time, block by block.
+        the same time.
+
+        Blocks are pipelined: a block is only sent to the ``Responder`` once the ``Watcher`` is done with it (so the
+        breaches found in it are already in the ``Responder``), but the ``Watcher`` can carry on with the following
+        blocks meanwhile, up to ``max_lead`` blocks ahead of the ``Responder``. ``max_lead=1`` updates them block by
+        block.
 
         If only one instance has to be updated, ``populate_block_queue`` should be used.
 
@@ -106,6 +173,10 @@ class Builder:
             watcher (:obj:`Watcher <teos.watcher.Watcher>`): a ``Watcher`` instance (including a ``Responder``).
             missed_blocks_watcher (:obj:`list`): the list of block missed by the ``Watcher``.
             missed_blocks_responder (:obj:`list`): the list of block missed by the ``Responder``.
+            max_lead (:obj:`int`): the maximum number of blocks the ``Watcher`` can be ahead of the ``Responder``.
+            block_processor (:obj:`BlockProcessor <teos.block_processor.BlockProcessor>`): the ``BlockProcessor``
+                shared by the ``Watcher`` and the ``Responder``. If provided, blocks are prefetched ahead of them (see
+                ``prefetch_blocks``).
 
         Raises:
             ValueError: is one of the provided list is empty.
@@ -122,20 +193,50 @@ class Builder:
             block_diff = sorted(
                 set(missed_blocks_responder).difference(missed_blocks_watcher), key=missed_blocks_responder.index
             )
-            Builder.populate_block_queue(watcher.responder.block_queue, block_diff)
+            Builder.populate_block_queue(watcher.responder.block_queue, block_diff, block_processor)
             watcher.responder.block_queue.join()
+            common_blocks = missed_blocks_watcher
 
         elif len(missed_blocks_watcher) > len(missed_blocks_responder):
             block_diff = sorted(
                 set(missed_blocks_watcher).difference(missed_blocks_responder), key=missed_blocks_watcher.index
             )
-            Builder.populate_block_queue(watcher.block_queue, block_diff)
+            Builder.populate_block_queue(watcher.block_queue, block_diff, block_processor)
             watcher.block_queue.join()
+            common_blocks = missed_blocks_responder
+
+        else:
+            common_blocks = missed_blocks_watcher
 
-        # Once they are at the same height, we update them one by one
-        for block in missed_blocks_watcher:
+        # Once they are at the same height, blocks are handed to the Responder by a relay thread as soon as the Watcher
+        # is done with them. The semaphore counts the blocks started by the Watcher and not yet finished by the
+        # Responder, bounding the lead.
+        lead = Semaphore(max(max_lead, 1))
+        relay_queue = Queue()
+
+        def relay():
+            while True:
+                block = relay_queue.get()
+                if block is None:
+                    break
+
+                watcher.responder.block_queue.put(block)
+                watcher.responder.block_queue.join()
+                lead.release()
+
+        relay_thread = Thread(target=relay, daemon=True)
+        relay_thread.start()
+
+        # The blocks in use are the ones the Responder has not got yet, and the ones it has got since the Watcher got
+        # the oldest of them (the cache evicts blocks in least-recently-used order)
+        if block_processor is not None:
+            common_blocks = Builder.prefetch_blocks(block_processor, common_blocks, 2 * max(max_lead, 1))
+
+        for block in common_blocks:
+            lead.acquire()
             watcher.block_queue.put(block)
             watcher.block_queue.join()
+            relay_queue.put(block)
 
-            watcher.responder.block_queue.put(block)
-            watcher.responder.block_queue.join()
+        relay_queue.put(None)
+        relay_thread.join()
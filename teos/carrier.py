@@ -1,6 +1,6 @@
 from teos import LOG_PREFIX
 from common.logger import Logger
-from teos.tools import bitcoin_cli
+from teos.tools import bitcoin_cli, batch_rpc, DEFAULT_BATCH_SIZE
 import teos.rpc_errors as rpc_errors
 from teos.utils.auth_proxy import JSONRPCException
 from common.errors import UNKNOWN_JSON_RPC_EXCEPTION, RPC_TX_REORGED_AFTER_BROADCAST
@@ -46,12 +46,15 @@ class Carrier:
     Attributes:
         issued_receipts (:obj:`dict`): a dictionary of issued receipts to prevent resending the same transaction over
             and over. It should periodically be reset to prevent it from growing unbounded.
+        batch_size (:obj:`int`): the maximum number of requests sent to ``bitcoind`` in a single json-rpc batch
+            (``BTC_RPC_BATCH_SIZE``).
 
     """
 
     def __init__(self, btc_connect_params):
         self.btc_connect_params = btc_connect_params
         self.issued_receipts = {}
+        self.batch_size = btc_connect_params.get("BTC_RPC_BATCH_SIZE", DEFAULT_BATCH_SIZE)
 
     # NOTCOVERED
     def send_transaction(self, rawtx, txid):
@@ -143,14 +146,63 @@ class Carrier:
             return tx_info
 
         except JSONRPCException as e:
-            # While it's quite unlikely, the transaction that was already in the blockchain could have been
-            # reorged while we were querying bitcoind to get the confirmation count. In that case we just restart
-            # the tracker
-            if e.error.get("code") == rpc_errors.RPC_INVALID_ADDRESS_OR_KEY:
-                logger.info("Transaction not found in mempool nor blockchain", txid=txid)
-
-            else:
-                # If something else happens (unlikely but possible) log it so we can treat it in future releases
-                logger.error("JSONRPCException", method="Carrier.get_transaction", error=e.error)
+            self.log_get_transaction_error(txid, e.error)
 
             return None
+
+    def get_transactions(self, txids):
+        """
+        Queries transaction data to ``bitcoind`` for a list of transaction ids. Requests are sent using json-rpc
+        batches of up to ``batch_size`` requests, so the whole list costs a handful of round-trips instead of one per
+        transaction.
+
+        If ``bitcoind`` rejects the batches, the transactions are queried one by one.
+
+        Args:
+            txids (:obj:`list`): a list of 32-byte hex-formatted strings representing the transaction ids.
+
+        Returns:
+            :obj:`dict`: A dictionary (``txid:tx_info``) with an entry per each given ``txid``. ``tx_info`` is a
+            dictionary with the transaction data if the transaction can be found on the chain, ``None`` otherwise.
+        """
+
+        # Duplicates are dropped (keeping the order) so they are only queried once
+        txids = list(dict.fromkeys(txids))
+
+        try:
+            results = batch_rpc(
+                self.btc_connect_params, "getrawtransaction", [[txid, 1] for txid in txids], self.batch_size
+            )
+
+        except JSONRPCException as e:
+            logger.warning("Batch request rejected. Falling back to single requests", error=e.error)
+            return {txid: self.get_transaction(txid) for txid in txids}
+
+        txs = {}
+        for txid, (tx_info, error) in zip(txids, results):
+            if error is not None:
+                self.log_get_transaction_error(txid, error)
+
+            txs[txid] = tx_info
+
+        return txs
+
+    @staticmethod
+    def log_get_transaction_error(txid, error):
+        """
+        Logs the error returned by ``bitcoind`` when a transaction cannot be queried.
+
+        Args:
+            txid (:obj:`str`): the id of the queried transaction.
+            error (:obj:`dict`): the error returned by ``bitcoind``.
+        """
+
+        # While it's quite unlikely, the transaction that was already in the blockchain could have been
+        # reorged while we were querying bitcoind to get the confirmation count. In that case we just restart
+        # the tracker
+        if error.get("code") == rpc_errors.RPC_INVALID_ADDRESS_OR_KEY:
+            logger.info("Transaction not found in mempool nor blockchain", txid=txid)
+
+        else:
+            # If something else happens (unlikely but possible) log it so we can treat it in future releases
+            logger.error("JSONRPCException", method="Carrier.get_transaction", error=error)
@@ -17,6 +17,9 @@ class ChainMonitor:
     The :class:`ChainMonitor` monitors the chain using two methods: ``zmq`` and ``polling``. Blocks are only notified
     once per queue and the notification is triggered by the method that detects the block faster.
 
+    The :class:`ChainMonitor` also keeps the ``chain_tip`` of the ``BlockProcessor`` up to date, so the rest of the
+    components can get the current height without querying ``bitcoind``.
+
     Args:
         watcher_queue (:obj:`Queue`): the queue to be used to send blocks hashes to the ``Watcher``.
         responder_queue (:obj:`Queue`): the queue to be used to send blocks hashes to the ``Responder``.
@@ -28,8 +31,8 @@ class ChainMonitor:
         last_tips (:obj:`list`): a list of last chain tips. Used as a sliding window to avoid notifying about old tips.
         terminate (:obj:`bool`): a flag to signal the termination of the :class:`ChainMonitor` (shutdown the tower).
         check_tip (:obj:`Event`): an event that is triggered at fixed time intervals and controls the polling thread.
-        lock (:obj:`Condition`): a lock used to protect concurrent access to the queues and ``best_tip`` by the zmq and
-            polling threads.
+        lock (:obj:`Condition`): a lock used to protect concurrent access to the queues, ``best_tip`` and the
+            ``BlockProcessor`` chain tip by the zmq and polling threads.
         zmqSubSocket (:obj:`socket`): a socket to connect to ``bitcoind`` via ``zmq``.
         watcher_queue (:obj:`Queue`): a queue to send new best tips to the :obj:`Watcher <teos.watcher.Watcher>`.
         responder_queue (:obj:`Queue`): a queue to send new best tips to the
@@ -103,6 +106,25 @@ class ChainMonitor:
         else:
             return False
 
+    def update_chain_tip(self, block_hash):
+        """
+        Updates the chain tip shared through the ``BlockProcessor``. If the tip has not changed it is just refreshed,
+        otherwise the block is fetched to get its height (blocks are cached, so the fetch is shared with the
+        ``Watcher`` and the ``Responder``).
+
+        This must only be called with tips accepted by ``update_state`` (and while holding ``lock``), so an old tip
+        cannot replace a newer one.
+
+        Args:
+            block_hash (:obj:`str`): the current best tip.
+        """
+
+        if not self.block_processor.chain_tip.refresh(block_hash):
+            block = self.block_processor.get_block(block_hash)
+
+            if block is not None:
+                self.block_processor.chain_tip.update(block_hash, block.get("height"))
+
     def monitor_chain_polling(self):
         """
         Monitors ``bitcoind`` via polling. Once the method is fired, it keeps monitoring as long as ``terminate`` is not
@@ -121,6 +143,11 @@ class ChainMonitor:
                 if self.update_state(current_tip):
                     self.notify_subscribers(current_tip)
                     logger.info("New block received via polling", block_hash=current_tip)
+                    self.update_chain_tip(current_tip)
+
+                elif current_tip is not None:
+                    # The tip is only refreshed if it has not changed (it may be older than one received via zmq)
+                    self.block_processor.chain_tip.refresh(current_tip)
                 self.lock.release()
 
     def monitor_chain_zmq(self):
@@ -145,6 +172,7 @@ class ChainMonitor:
                     if self.update_state(block_hash):
                         self.notify_subscribers(block_hash)
                         logger.info("New block received via zmq", block_hash=block_hash)
+                        self.update_chain_tip(block_hash)
                     self.lock.release()
 
     def monitor_chain(self):
@@ -155,5 +183,6 @@ class ChainMonitor:
         """
 
         self.best_tip = self.block_processor.get_best_block_hash()
+        self.update_chain_tip(self.best_tip)
         Thread(target=self.monitor_chain_polling, daemon=True).start()
         Thread(target=self.monitor_chain_zmq, daemon=True).start()
@@ -51,39 +51,6 @@ class Cleaner:
         db_manager.delete_watcher_appointment(uuid)
         db_manager.delete_triggered_appointment_flag(uuid)
 
-    @staticmethod
-    def update_delete_db_locator_map(uuids, locator, db_manager):
-        """
-        Updates the locator:uuid map of a given locator from the database by removing a given uuid. If the uuid is the
-        only element of the map, the map is deleted, otherwise the uuid is simply removed and the database is updated.
-
-        If either the uuid of the locator are not found, the data is not modified.
-
-        Args:
-            uuids (:obj:`list`): a list of identifiers to be removed from the map.
-            locator (:obj:`str`): the identifier of the map to be either updated or deleted.
-            db_manager (:obj:`AppointmentsDBM <teos.appointments_dbm.AppointmentsDBM>`): a ``AppointmentsDBM`` instance
-                to interact with the database.
-        """
-
-        locator_map = db_manager.load_locator_map(locator)
-
-        if locator_map is not None:
-            if set(locator_map).issuperset(uuids):
-                # Remove the map if all keys are requested to be deleted
-                if set(locator_map) == set(uuids):
-                    db_manager.delete_locator_map(locator)
-                else:
-                    # Otherwise remove only the selected keys
-                    locator_map = list(set(locator_map).difference(uuids))
-                    db_manager.update_locator_map(locator, locator_map)
-
-            else:
-                logger.error("Some UUIDs not found in the db", locator=locator, all_uuids=uuids)
-
-        else:
-            logger.error("Locator map not found in the db", locator=locator)
-
     @staticmethod
     def delete_expired_appointments(expired_appointments, appointments, locator_uuid_map, db_manager):
         """
@@ -103,7 +70,8 @@ class Cleaner:
         locator_maps_to_update = {}
 
         for uuid in expired_appointments:
-            locator = appointments[uuid].get("locator")
+            # Locators are binary in memory but hex-encoded in the database
+            locator = appointments[uuid].get("locator").hex()
             logger.info("End time reached with no breach. Deleting appointment", locator=locator, uuid=uuid)
 
             Cleaner.delete_appointment_from_memory(uuid, appointments, locator_uuid_map)
@@ -113,8 +81,8 @@ class Cleaner:
 
             locator_maps_to_update[locator].append(uuid)
 
-        for locator, uuids in locator_maps_to_update.items():
-            Cleaner.update_delete_db_locator_map(uuids, locator, db_manager)
+        # The uuids are removed from the locator maps straightaway (maps are deleted once they are empty)
+        db_manager.batch_delete_locator_map_entries(locator_maps_to_update)
 
         # Expired appointments are not flagged, so they can be deleted without caring about the db flag.
         db_manager.batch_delete_watcher_appointments(expired_appointments)
@@ -141,7 +109,7 @@ class Cleaner:
         locator_maps_to_update = {}
 
         for uuid in completed_appointments:
-            locator = appointments[uuid].get("locator")
+            locator = appointments[uuid].get("locator").hex()
 
             logger.warning(
                 "Appointment cannot be completed, it contains invalid data. Deleting", locator=locator, uuid=uuid
@@ -154,9 +122,8 @@ class Cleaner:
 
             locator_maps_to_update[locator].append(uuid)
 
-        for locator, uuids in locator_maps_to_update.items():
-            # Update / delete the locator map
-            Cleaner.update_delete_db_locator_map(uuids, locator, db_manager)
+        # The uuids are removed from the locator maps straightaway (maps are deleted once they are empty)
+        db_manager.batch_delete_locator_map_entries(locator_maps_to_update)
 
         db_manager.batch_delete_watcher_appointments(completed_appointments)
 
@@ -230,9 +197,8 @@ class Cleaner:
 
             locator_maps_to_update[locator].append(uuid)
 
-        for locator, uuids in locator_maps_to_update.items():
-            # Update / delete the locator map
-            Cleaner.update_delete_db_locator_map(uuids, locator, db_manager)
+        # The uuids are removed from the locator maps straightaway (maps are deleted once they are empty)
+        db_manager.batch_delete_locator_map_entries(locator_maps_to_update)
 
         # Delete appointment from the db (from watchers's and responder's db) and remove flag
         db_manager.batch_delete_responder_trackers(completed_trackers)
@@ -251,7 +217,7 @@ class Cleaner:
             (expired + completed)
         """
 
-        user_ids = []
+        deleted_appointments = {}
         # Remove appointments from memory
         for uuid, user_id in appointment_to_delete.items():
             if user_id in gatekeeper.registered_users and uuid in gatekeeper.registered_users[user_id].appointments:
@@ -261,9 +227,8 @@ class Cleaner:
                 gatekeeper.registered_users[user_id].available_slots += freed_slots
                 gatekeeper.lock.release()
 
-                if user_id not in user_ids:
-                    user_ids.append(user_id)
+                deleted_appointments.setdefault(user_id, []).append(uuid)
 
-        # Store the updated users in the DB
-        for user_id in user_ids:
-            gatekeeper.user_db.store_user(user_id, gatekeeper.registered_users[user_id].to_dict())
+        # Update the users in the DB (only the header and the deleted appointments are written)
+        for user_id, uuids in deleted_appointments.items():
+            gatekeeper.user_db.delete_user_appointments(user_id, gatekeeper.registered_users[user_id].to_dict(), uuids)
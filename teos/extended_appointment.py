@@ -8,12 +8,13 @@ class ExtendedAppointment(Appointment):
 
     def get_summary(self):
         """
-        Returns the summary of an appointment, consisting on the locator, the user_id and the appointment size.
+        Returns the summary of an appointment, consisting on the locator and the user_id. The locator is returned in
+        binary, since summaries are kept in memory by the :obj:`Watcher <teos.watcher.Watcher>`.
 
         Returns:
             :obj:`dict`: the appointment summary.
         """
-        return {"locator": self.locator, "user_id": self.user_id}
+        return {"locator": bytes.fromhex(self.locator), "user_id": self.user_id}
 
     @classmethod
     def from_dict(cls, appointment_data):
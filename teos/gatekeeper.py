@@ -6,6 +6,12 @@ from common.cryptographer import Cryptographer
 from common.constants import ENCRYPTED_BLOB_MAX_SIZE_HEX
 from common.exceptions import InvalidParameter, InvalidKey, SignatureError
 
+from teos.builder import DEFAULT_MAX_LEAD
+
+# Number of blocks expiry heights are kept in the index after being checked, so they can be checked again after a reorg
+# (or by a component lagging behind while catching up, if it lags further than this)
+EXPIRY_INDEX_DEPTH = 100
+
 
 class NotEnoughSlots(ValueError):
     """Raised when trying to subtract more slots than a user has available"""
@@ -61,20 +67,78 @@ class Gatekeeper:
             get block from bitcoind.
         user_db (:obj:`UserDBM <teos.user_dbm.UserDBM>`): a ``UserDBM`` instance to interact with the database.
         registered_users (:obj:`dict`): a map of user_pk:UserInfo.
+        max_lead (:obj:`int`): the maximum number of blocks the :obj:`Watcher <teos.watcher.Watcher>` can be ahead of
+            the :obj:`Responder <teos.responder.Responder>` while catching up.
+        expiring_users (:obj:`dict`): a map of block_height:user_ids with the users whose appointments expire at every
+            height (``subscription_expiry + expiry_delta``). Heights more than ``EXPIRY_INDEX_DEPTH`` (or ``max_lead``,
+            if bigger) blocks older than the last checked one are pruned.
+        expired_appointments_cache (:obj:`dict`): the appointments expiring at the last ``max_lead + 1`` checked
+            heights, so the :obj:`Watcher <teos.watcher.Watcher>` and the :obj:`Responder <teos.responder.Responder>`
+            share the lookups (even while the ``Responder`` lags behind).
         lock (:obj:`Lock`): a Threading.Lock object to lock access to the Gatekeeper on updates.
 
     """
 
-    def __init__(self, user_db, block_processor, subscription_slots, subscription_duration, expiry_delta):
+    def __init__(
+        self,
+        user_db,
+        block_processor,
+        subscription_slots,
+        subscription_duration,
+        expiry_delta,
+        max_lead=DEFAULT_MAX_LEAD,
+    ):
         self.subscription_slots = subscription_slots
         self.subscription_duration = subscription_duration
         self.expiry_delta = expiry_delta
+        self.max_lead = max_lead
         self.block_processor = block_processor
         self.user_db = user_db
         self.registered_users = {
             user_id: UserInfo.from_dict(user_data) for user_id, user_data in user_db.load_all_users().items()
         }
+        self.expiring_users = {}
+        self.expired_appointments_cache = {}
         self.lock = Lock()
+        self.rebuild_expiry_index()
+
+    def rebuild_expiry_index(self):
+        """Builds the expiry height index from the registered users (and drops any cached lookup)."""
+
+        with self.lock:
+            self.expiring_users = {}
+            self.expired_appointments_cache = {}
+
+            for user_id, user in self.registered_users.items():
+                self.expiring_users.setdefault(user.subscription_expiry + self.expiry_delta, set()).add(user_id)
+
+    def update_expiry_index(self, user_id, old_expiry, new_expiry):
+        """
+        Moves a user within the expiry height index.
+
+        Args:
+            user_id (:obj:`str`): the public key that identifies the user (33-bytes hex str).
+            old_expiry (:obj:`int` or :obj:`None`): the previous subscription expiry of the user (``None`` for new
+                users).
+            new_expiry (:obj:`int`): the current subscription expiry of the user.
+        """
+
+        with self.lock:
+            if old_expiry is not None:
+                old_height = old_expiry + self.expiry_delta
+                users = self.expiring_users.get(old_height)
+
+                if users:
+                    users.discard(user_id)
+                    if not users:
+                        self.expiring_users.pop(old_height)
+
+                # The user is not expiring at that height anymore
+                self.expired_appointments_cache.pop(old_height, None)
+
+            new_height = new_expiry + self.expiry_delta
+            self.expiring_users.setdefault(new_height, set()).add(user_id)
+            self.expired_appointments_cache.pop(new_height, None)
 
     def add_update_user(self, user_id):
         """
@@ -94,18 +158,23 @@ class Gatekeeper:
         if not is_compressed_pk(user_id):
             raise InvalidParameter("Provided public key does not match expected format (33-byte hex string)")
 
+        old_expiry = self.registered_users[user_id].subscription_expiry if user_id in self.registered_users else None
+
         if user_id not in self.registered_users:
             self.registered_users[user_id] = UserInfo(
-                self.subscription_slots, self.block_processor.get_block_count() + self.subscription_duration
+                self.subscription_slots, self.block_processor.get_tip_height() + self.subscription_duration
             )
+            self.user_db.store_user(user_id, self.registered_users[user_id].to_dict())
         else:
             # FIXME: For now new calls to register add subscription_slots to the current count and reset the expiry time
             self.registered_users[user_id].available_slots += self.subscription_slots
             self.registered_users[user_id].subscription_expiry = (
-                self.block_processor.get_block_count() + self.subscription_duration
+                self.block_processor.get_tip_height() + self.subscription_duration
             )
+            # The user appointments are untouched, so only the header needs to be updated
+            self.user_db.store_user_header(user_id, self.registered_users[user_id].to_dict())
 
-        self.user_db.store_user(user_id, self.registered_users[user_id].to_dict())
+        self.update_expiry_index(user_id, old_expiry, self.registered_users[user_id].subscription_expiry)
 
         return self.registered_users[user_id].available_slots, self.registered_users[user_id].subscription_expiry
 
@@ -158,30 +227,59 @@ class Gatekeeper:
             :obj:`NotEnoughSlots`: If the user does not have enough slots to fill.
         """
 
-        self.lock.acquire()
-        # For updates the difference between the existing appointment and the update is computed.
-        if uuid in self.registered_users[user_id].appointments:
-            used_slots = self.registered_users[user_id].appointments[uuid]
+        available_slots = self.add_update_appointments([(user_id, uuid, appointment)])[0]
 
-        else:
-            # For regular appointments 1 slot is reserved per ENCRYPTED_BLOB_MAX_SIZE_HEX block.
-            used_slots = 0
+        if available_slots is None:
+            raise NotEnoughSlots()
 
-        required_slots = ceil(len(appointment.encrypted_blob) / ENCRYPTED_BLOB_MAX_SIZE_HEX)
+        return available_slots
 
-        if required_slots - used_slots <= self.registered_users.get(user_id).available_slots:
-            # Filling / freeing slots depending on whether this is an update or not, and if it is bigger or smaller than
-            # the old appointment.
-            self.registered_users.get(user_id).appointments[uuid] = required_slots
-            self.registered_users.get(user_id).available_slots -= required_slots - used_slots
-            self.user_db.store_user(user_id, self.registered_users[user_id].to_dict())
+    def add_update_appointments(self, appointments):
+        """
+        Adds (or updates) a batch of appointments to the users subscriptions. Appointments are processed in order, and
+        slots are taken or given back as in :meth:`add_update_appointment`. The records of the users are updated at
+        once, with a single database write per user.
 
-        else:
-            self.lock.release()
-            raise NotEnoughSlots()
+        Args:
+            appointments (:obj:`list`): a list of ``(user_id, uuid, appointment)`` tuples.
+
+        Returns:
+            :obj:`list`: The number of remaining slots of the user after adding every appointment, in the same order.
+            The items of the appointments that do not fit in the user subscription are ``None``.
+        """
+
+        available_slots = []
+        updated_users = {}
+
+        with self.lock:
+            for user_id, uuid, appointment in appointments:
+                user = self.registered_users[user_id]
 
-        self.lock.release()
-        return self.registered_users.get(user_id).available_slots
+                # For updates the difference between the existing appointment and the update is computed.
+                # For regular appointments 1 slot is reserved per ENCRYPTED_BLOB_MAX_SIZE_HEX block.
+                used_slots = user.appointments.get(uuid, 0)
+                required_slots = ceil(len(appointment.encrypted_blob) / ENCRYPTED_BLOB_MAX_SIZE_HEX)
+
+                if required_slots - used_slots <= user.available_slots:
+                    # Filling / freeing slots depending on whether this is an update or not, and if it is bigger or
+                    # smaller than the old appointment.
+                    user.appointments[uuid] = required_slots
+                    user.available_slots -= required_slots - used_slots
+                    updated_users.setdefault(user_id, []).append(uuid)
+                    available_slots.append(user.available_slots)
+
+                else:
+                    available_slots.append(None)
+
+            for user_id, uuids in updated_users.items():
+                self.user_db.store_user_appointments(user_id, self.registered_users[user_id].to_dict(), uuids)
+
+                # The appointments expiring at the user's expiry height have changed
+                self.expired_appointments_cache.pop(
+                    self.registered_users[user_id].subscription_expiry + self.expiry_delta, None
+                )
+
+        return available_slots
 
     def get_expired_appointments(self, block_height):
         """
@@ -194,10 +292,29 @@ class Gatekeeper:
             :obj:`list`: a list of appointment uuids that will expire at ``block_height``.
         """
 
-        expired_appointments = []
-        # Avoiding dictionary changed size during iteration
-        for user_id in list(self.registered_users.keys()):
-            if block_height == self.registered_users[user_id].subscription_expiry + self.expiry_delta:
-                expired_appointments.extend(self.registered_users[user_id].appointments)
+        with self.lock:
+            expired_appointments = self.expired_appointments_cache.get(block_height)
+
+            if expired_appointments is None:
+                expired_appointments = []
+                for user_id in self.expiring_users.get(block_height, []):
+                    if user_id in self.registered_users:
+                        expired_appointments.extend(self.registered_users[user_id].appointments)
+
+                self.expired_appointments_cache[block_height] = expired_appointments
+                last_height = max(self.expired_appointments_cache)
+
+                # Both the Watcher and the Responder check every block, but the Responder can be up to max_lead blocks
+                # behind while catching up
+                stale_heights = [
+                    height for height in self.expired_appointments_cache if height < last_height - self.max_lead
+                ]
+                for height in stale_heights:
+                    self.expired_appointments_cache.pop(height)
+
+                # Heights that are deep enough are not going to be checked again
+                index_depth = max(EXPIRY_INDEX_DEPTH, self.max_lead)
+                for height in [height for height in self.expiring_users if height < last_height - index_depth]:
+                    self.expiring_users.pop(height)
 
-        return expired_appointments
+            return list(expired_appointments)
@@ -61,7 +61,7 @@ class Inspector:
         elif not isinstance(appointment_data, dict):
             raise InspectionFailed(errors.APPOINTMENT_WRONG_FIELD, "wrong appointment format")
 
-        block_height = self.block_processor.get_block_count()
+        block_height = self.block_processor.get_tip_height()
         if block_height is None:
             raise InspectionFailed(errors.UNKNOWN_JSON_RPC_EXCEPTION, "unexpected error occurred")
 
@@ -3,6 +3,7 @@ from threading import Thread
 
 from teos import LOG_PREFIX
 from teos.cleaner import Cleaner
+from teos.utils.ordered_set import OrderedSet
 
 from common.logger import Logger
 from common.constants import IRREVOCABLY_RESOLVED
@@ -119,9 +120,17 @@ class Responder:
             Each entry is identified by a ``uuid``.
         tx_tracker_map (:obj:`dict`): A ``penalty_txid:uuid`` map used to allow the :obj:`Responder` to deal with
             several trackers triggered by the same ``penalty_txid``.
-        unconfirmed_txs (:obj:`list`): A list that keeps track of all unconfirmed ``penalty_txs``.
+        unconfirmed_txs (:obj:`OrderedSet <teos.utils.ordered_set.OrderedSet>`): An ordered set that keeps track of all
+            unconfirmed ``penalty_txs``, in the order they were added.
         missed_confirmations (:obj:`dict`): A dictionary that keeps count of how many confirmations each ``penalty_tx``
             has missed. Used to trigger rebroadcast if needed.
+        confirmation_heights (:obj:`dict`): A ``penalty_txid:height`` map with the height at which each confirmed
+            ``penalty_tx`` got its first confirmation.
+        resolution_index (:obj:`dict`): A ``height:penalty_txids`` map with the confirmed ``penalty_txs`` that become
+            irrevocably resolved at every height. Used to get the completed trackers without querying ``bitcoind``.
+        unindexed_txs (:obj:`OrderedSet <teos.utils.ordered_set.OrderedSet>`): The ``penalty_txs`` that may be
+            confirmed but whose confirmation height is unknown (e.g. trackers loaded from the database or penalties
+            reorged out). Their status is queried to ``bitcoind`` once and then they are indexed.
         block_queue (:obj:`Queue`): A queue used by the :obj:`Responder` to receive block hashes from ``bitcoind``. It
         is populated by the :obj:`ChainMonitor <teos.chain_monitor.ChainMonitor>`.
         db_manager (:obj:`AppointmentsDBM <teos.appointments_dbm.AppointmentsDBM>`): a ``AppointmentsDBM`` instance
@@ -137,8 +146,11 @@ class Responder:
     def __init__(self, db_manager, gatekeeper, carrier, block_processor):
         self.trackers = dict()
         self.tx_tracker_map = dict()
-        self.unconfirmed_txs = []
+        self.unconfirmed_txs = OrderedSet()
         self.missed_confirmations = dict()
+        self.confirmation_heights = dict()
+        self.resolution_index = dict()
+        self.unindexed_txs = OrderedSet()
         self.block_queue = Queue()
         self.db_manager = db_manager
         self.gatekeeper = gatekeeper
@@ -244,9 +256,13 @@ class Responder:
         else:
             self.tx_tracker_map[penalty_txid] = [uuid]
 
-        # In the case we receive two trackers with the same penalty txid we only add it to the unconfirmed txs list once
-        if penalty_txid not in self.unconfirmed_txs and confirmations == 0:
-            self.unconfirmed_txs.append(penalty_txid)
+        # In the case we receive two trackers with the same penalty txid it is only added to the unconfirmed txs once
+        if confirmations == 0:
+            self.unconfirmed_txs.add(penalty_txid)
+
+        # If the penalty is already on chain its confirmation height is unknown, so it is left to be indexed
+        elif penalty_txid not in self.confirmation_heights:
+            self.unindexed_txs.add(penalty_txid)
 
         self.db_manager.store_responder_tracker(uuid, tracker.to_dict())
 
@@ -273,14 +289,14 @@ class Responder:
             if len(self.trackers) > 0 and block is not None:
                 txids = block.get("tx")
 
-                completed_trackers = self.get_completed_trackers()
-                expired_trackers = self.get_expired_trackers(block.get("height"))
-                trackers_to_delete_gatekeeper = {
-                    uuid: self.trackers[uuid].get("user_id") for uuid in completed_trackers + expired_trackers
-                }
-
                 if self.last_known_block == block.get("previousblockhash"):
-                    self.check_confirmations(txids)
+                    completed_trackers = self.get_completed_trackers(block.get("height"))
+                    expired_trackers = self.get_expired_trackers(block.get("height"))
+                    trackers_to_delete_gatekeeper = {
+                        uuid: self.trackers[uuid].get("user_id") for uuid in completed_trackers + expired_trackers
+                    }
+
+                    self.check_confirmations(txids, block.get("height"))
                     Cleaner.delete_trackers(
                         completed_trackers, block.get("height"), self.trackers, self.tx_tracker_map, self.db_manager
                     )
@@ -304,6 +320,10 @@ class Responder:
                         remote_prev_block_hash=block.get("previousblockhash"),
                     )
 
+                    # Confirmations may have been reorged out, so confirmed penalties are indexed again. Reorgs are
+                    # rare, so re-querying them (all at once) is preferred to walking back the forked chain
+                    self.rollback_confirmations(list(self.confirmation_heights))
+
                     # ToDo: #24-properly-handle-reorgs
                     self.handle_reorgs(block_hash)
 
@@ -318,23 +338,26 @@ class Responder:
             self.last_known_block = block.get("hash")
             self.block_queue.task_done()
 
-    def check_confirmations(self, txs):
+    def check_confirmations(self, txs, height):
         """
         Checks if any of the monitored ``penalty_txs`` has received it's first confirmation or keeps missing them.
 
-        This method manages ``unconfirmed_txs`` and ``missed_confirmations``.
+        This method manages ``unconfirmed_txs`` and ``missed_confirmations``, and records the confirmation height of
+        the confirmed ``penalty_txs``.
 
         Args:
             txs (:obj:`list`): A list of confirmed tx ids (the list of transactions included in the last received
                 block).
+            height (:obj:`int`): the height of the last received block.
         """
 
         # If a new confirmed tx matches a tx we are watching, then we remove it from the unconfirmed txs map
         for tx in txs:
             if tx in self.tx_tracker_map and tx in self.unconfirmed_txs:
                 self.unconfirmed_txs.remove(tx)
+                self.add_confirmation(tx, height)
 
-                logger.info("Confirmation received for transaction", tx=tx)
+                logger.info("Confirmation received for transaction", tx=tx, height=height)
 
         # We also add a missing confirmation to all those txs waiting to be confirmed that have not been confirmed in
         # the current block
@@ -363,35 +386,112 @@ class Responder:
 
         return txs_to_rebroadcast
 
-    def get_completed_trackers(self):
+    def add_confirmation(self, penalty_txid, height):
+        """
+        Records the confirmation height of a ``penalty_tx`` and indexes it by the height it becomes irrevocably resolved
+        at.
+
+        Args:
+            penalty_txid (:obj:`str`): the id of the confirmed penalty transaction.
+            height (:obj:`int`): the height of the block that included the transaction (first confirmation).
+        """
+
+        self.remove_confirmation(penalty_txid)
+
+        self.confirmation_heights[penalty_txid] = height
+        self.resolution_index.setdefault(height + IRREVOCABLY_RESOLVED - 1, set()).add(penalty_txid)
+
+    def remove_confirmation(self, penalty_txid):
+        """
+        Removes the confirmation height of a ``penalty_tx`` (if found) alongside its index entry.
+
+        Args:
+            penalty_txid (:obj:`str`): the id of the penalty transaction.
+        """
+
+        height = self.confirmation_heights.pop(penalty_txid, None)
+
+        if height is not None:
+            resolution_height = height + IRREVOCABLY_RESOLVED - 1
+            self.resolution_index[resolution_height].discard(penalty_txid)
+
+            if not self.resolution_index[resolution_height]:
+                self.resolution_index.pop(resolution_height)
+
+    def index_confirmations(self):
+        """
+        Queries ``bitcoind`` for the status of the ``unindexed_txs`` (all at once) and indexes them. Confirmed
+        transactions are indexed by their confirmation height while the rest are flagged as unconfirmed.
+        """
+
+        if not self.unindexed_txs:
+            return
+
+        # New trackers can be added (by the Watcher) while bitcoind is queried, so only the queried txs are unflagged
+        queried_txs = list(self.unindexed_txs)
+
+        # Confirmations are relative to bitcoind's tip, not to the last block processed by the Responder. If the tip
+        # moves while bitcoind is queried, they cannot be matched to a height, so the txs are indexed on the next call
+        tip_height = self.block_processor.get_block_count()
+        txs = self.carrier.get_transactions(queried_txs)
+
+        if tip_height is None or self.block_processor.get_block_count() != tip_height:
+            logger.info("Chain tip moved while indexing confirmations. Retrying on the next block")
+            return
+
+        for penalty_txid, tx in txs.items():
+            confirmations = tx.get("confirmations") if tx is not None else None
+
+            if confirmations:
+                self.add_confirmation(penalty_txid, tip_height - confirmations + 1)
+                self.unconfirmed_txs.discard(penalty_txid)
+            else:
+                self.unconfirmed_txs.add(penalty_txid)
+
+        for penalty_txid in queried_txs:
+            self.unindexed_txs.discard(penalty_txid)
+
+    def rollback_confirmations(self, dropped_txs):
+        """
+        Drops the confirmation height of the ``penalty_txs`` that may have been reorged out, so they are indexed again
+        once the next block is processed.
+
+        Args:
+            dropped_txs (:obj:`list`): the ids of the transactions whose confirmation may have been reorged out.
+        """
+
+        for tx in dropped_txs:
+            if tx in self.confirmation_heights:
+                self.remove_confirmation(tx)
+                self.unindexed_txs.add(tx)
+
+                logger.info("Confirmation reorged out for transaction", tx=tx)
+
+    def get_completed_trackers(self, height):
         """
         Gets the trackers that has already been fulfilled based on a given height (the justice transaction is
         irrevocably resolved).
 
+        Penalties are looked up in ``resolution_index``, so ``bitcoind`` is only queried for the ``unindexed_txs``.
+        Completed penalties are removed from the index.
+
+        Args:
+            height (:obj:`int`): the height of the last received block.
+
         Returns:
             :obj:`list`: a list of completed trackers uuids.
         """
 
-        completed_trackers = []
-        # FIXME: This is here for duplicated penalties, we should be able to get rid of it once we prevent duplicates in
-        #        the responder.
-        checked_txs = {}
-
-        # Avoiding dictionary changed size during iteration
-        for uuid in list(self.trackers.keys()):
-            penalty_txid = self.trackers[uuid].get("penalty_txid")
-            if penalty_txid not in self.unconfirmed_txs:
-                if penalty_txid not in checked_txs:
-                    tx = self.carrier.get_transaction(penalty_txid)
-                else:
-                    tx = checked_txs.get(penalty_txid)
+        self.index_confirmations()
 
-                if tx is not None:
-                    confirmations = tx.get("confirmations")
-                    checked_txs[penalty_txid] = tx
+        completed_trackers = []
 
-                    if confirmations is not None and confirmations >= IRREVOCABLY_RESOLVED:
-                        completed_trackers.append(uuid)
+        for resolution_height in [h for h in self.resolution_index if h <= height]:
+            for penalty_txid in self.resolution_index.pop(resolution_height):
+                self.confirmation_heights.pop(penalty_txid)
+                completed_trackers.extend(
+                    uuid for uuid in self.tx_tracker_map.get(penalty_txid, []) if uuid in self.trackers
+                )
 
         return completed_trackers
 
@@ -412,7 +512,7 @@ class Responder:
         expired_trackers = [
             uuid
             for uuid in self.gatekeeper.get_expired_appointments(height)
-            if self.trackers[uuid].get("penalty_txid") in self.unconfirmed_txs
+            if uuid in self.trackers and self.trackers[uuid].get("penalty_txid") in self.unconfirmed_txs
         ]
 
         return expired_trackers
@@ -469,22 +569,31 @@ class Responder:
 
         """
 
-        # Avoiding dictionary changed size during iteration
-        for uuid in list(self.trackers.keys()):
-            tracker = TransactionTracker.from_dict(self.db_manager.load_responder_tracker(uuid))
+        trackers = {
+            uuid: TransactionTracker.from_dict(self.db_manager.load_responder_tracker(uuid))
+            for uuid in list(self.trackers.keys())
+        }
+
+        # First we check if the dispute transactions are known (exist either in mempool or blockchain)
+        dispute_txs = self.carrier.get_transactions([tracker.dispute_txid for tracker in trackers.values()])
+
+        # The penalties are only checked for those trackers whose dispute is still there
+        penalty_txs = self.carrier.get_transactions(
+            [tracker.penalty_txid for tracker in trackers.values() if dispute_txs.get(tracker.dispute_txid) is not None]
+        )
 
-            # First we check if the dispute transaction is known (exists either in mempool or blockchain)
-            dispute_tx = self.carrier.get_transaction(tracker.dispute_txid)
+        for uuid, tracker in trackers.items():
+            dispute_tx = dispute_txs.get(tracker.dispute_txid)
 
             if dispute_tx is not None:
                 # If the dispute is there, we check the penalty
-                penalty_tx = self.carrier.get_transaction(tracker.penalty_txid)
+                penalty_tx = penalty_txs.get(tracker.penalty_txid)
 
                 if penalty_tx is not None:
                     # If the penalty exists we need to check is it's on the blockchain or not so we can update the
                     # unconfirmed transactions list accordingly.
                     if penalty_tx.get("confirmations") is None:
-                        self.unconfirmed_txs.append(tracker.penalty_txid)
+                        self.unconfirmed_txs.add(tracker.penalty_txid)
 
                         logger.info(
                             "Penalty transaction back in mempool. Updating unconfirmed transactions",
@@ -10,7 +10,7 @@ from common.tools import setup_logging, setup_data_folder
 
 from teos.api import API
 from teos.help import show_usage
-from teos.watcher import Watcher
+from teos.watcher import Watcher, create_decryption_pool
 from teos.builder import Builder
 from teos.carrier import Carrier
 from teos.users_dbm import UsersDBM
@@ -21,7 +21,7 @@ from teos.chain_monitor import ChainMonitor
 from teos.block_processor import BlockProcessor
 from teos.appointments_dbm import AppointmentsDBM
 from teos import LOG_PREFIX, DATA_DIR, DEFAULT_CONF, CONF_FILE_NAME
-from teos.tools import can_connect_to_bitcoind, in_correct_network, get_default_rpc_port
+from teos.tools import can_connect_to_bitcoind, in_correct_network, get_default_rpc_port, get_default_rpc_pool_size
 
 logger = Logger(actor="Daemon", log_name_prefix=LOG_PREFIX)
 
@@ -31,12 +31,21 @@ def handle_signals(signal_received, frame):
     db_manager.db.close()
     chain_monitor.terminate = True
 
+    if decryption_pool is not None:
+        decryption_pool.shutdown(wait=False)
+
+    if block_processor is not None:
+        logger.info("Block cache stats", **block_processor.block_cache.get_metrics())
+
     logger.info("Shutting down TEOS")
     exit(0)
 
 
 def main(command_line_conf):
-    global db_manager, chain_monitor
+    global db_manager, chain_monitor, decryption_pool, block_processor
+
+    decryption_pool = None
+    block_processor = None
 
     try:
         signal(SIGINT, handle_signals)
@@ -52,6 +61,12 @@ def main(command_line_conf):
         if "BTC_RPC_PORT" not in config_loader.overwritten_fields:
             config["BTC_RPC_PORT"] = get_default_rpc_port(config.get("BTC_NETWORK"))
 
+        # Size the bitcoind connection pool after the threads using it if not overwritten by the user.
+        if "BTC_RPC_POOL_SIZE" not in config_loader.overwritten_fields:
+            config["BTC_RPC_POOL_SIZE"] = get_default_rpc_pool_size(
+                config.get("API_WORKERS"), config.get("BLOCK_PREFETCH_WORKERS")
+            )
+
         setup_data_folder(data_dir)
         setup_logging(config.get("LOG_FILE"), LOG_PREFIX)
 
@@ -76,7 +91,12 @@ def main(command_line_conf):
                     Cryptographer.get_compressed_pk(Cryptographer.load_private_key_der(secret_key_der).public_key)
                 )
             )
-            block_processor = BlockProcessor(bitcoind_connect_params)
+            block_processor = BlockProcessor(
+                bitcoind_connect_params,
+                config.get("LOCAL_TX_DECODING"),
+                config.get("BLOCK_CACHE_SIZE"),
+                config.get("BLOCK_PREFETCH_WORKERS"),
+            )
             carrier = Carrier(bitcoind_connect_params)
 
             gatekeeper = Gatekeeper(
@@ -85,9 +105,13 @@ def main(command_line_conf):
                 config.get("SUBSCRIPTION_SLOTS"),
                 config.get("SUBSCRIPTION_DURATION"),
                 config.get("EXPIRY_DELTA"),
+                config.get("CATCH_UP_MAX_LEAD"),
             )
             db_manager = AppointmentsDBM(config.get("APPOINTMENTS_DB_PATH"))
             responder = Responder(db_manager, gatekeeper, carrier, block_processor)
+            decryption_pool = create_decryption_pool(
+                config.get("DECRYPTION_WORKERS"), config.get("DECRYPTION_WORKER_TYPE")
+            )
             watcher = Watcher(
                 db_manager,
                 gatekeeper,
@@ -96,6 +120,7 @@ def main(command_line_conf):
                 secret_key_der,
                 config.get("MAX_APPOINTMENTS"),
                 config.get("LOCATOR_CACHE_SIZE"),
+                decryption_pool,
             )
 
             # Create the chain monitor and start monitoring the chain
@@ -126,6 +151,8 @@ def main(command_line_conf):
                     watcher.responder.trackers, watcher.responder.tx_tracker_map = Builder.build_trackers(
                         responder_trackers_data
                     )
+                    # The status of the penalties is unknown, it'll be queried once the Responder processes a block
+                    watcher.responder.unindexed_txs.update(watcher.responder.tx_tracker_map)
 
                 # Awaking components so the states can be updated.
                 watcher.awake()
@@ -155,22 +182,30 @@ def main(command_line_conf):
 
                 # If only one of the instances needs to be updated, it can be done separately.
                 if len(missed_blocks_watcher) == 0 and len(missed_blocks_responder) != 0:
-                    Builder.populate_block_queue(watcher.responder.block_queue, missed_blocks_responder)
+                    Builder.populate_block_queue(
+                        watcher.responder.block_queue, missed_blocks_responder, block_processor
+                    )
                     watcher.responder.block_queue.join()
 
                 elif len(missed_blocks_responder) == 0 and len(missed_blocks_watcher) != 0:
-                    Builder.populate_block_queue(watcher.block_queue, missed_blocks_watcher)
+                    Builder.populate_block_queue(watcher.block_queue, missed_blocks_watcher, block_processor)
                     watcher.block_queue.join()
 
-                # Otherwise they need to be updated at the same time, block by block
+                # Otherwise they need to be updated at the same time, with the Watcher leading
                 elif len(missed_blocks_responder) != 0 and len(missed_blocks_watcher) != 0:
-                    Builder.update_states(watcher, missed_blocks_watcher, missed_blocks_responder)
+                    Builder.update_states(
+                        watcher,
+                        missed_blocks_watcher,
+                        missed_blocks_responder,
+                        config.get("CATCH_UP_MAX_LEAD"),
+                        block_processor,
+                    )
 
             # Fire the API and the ChainMonitor
             # FIXME: 92-block-data-during-bootstrap-db
             chain_monitor.monitor_chain()
             inspector = Inspector(block_processor, config.get("MIN_TO_SELF_DELAY"))
-            API(config.get("API_BIND"), config.get("API_PORT"), inspector, watcher).start()
+            API(config.get("API_BIND"), config.get("API_PORT"), inspector, watcher, config.get("API_WORKERS")).start()
     except Exception as e:
         logger.error("An error occurred: {}. Shutting down".format(e))
         exit(1)
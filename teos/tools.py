@@ -1,7 +1,8 @@
 from socket import timeout
 from http.client import HTTPException
 
-from teos.utils.auth_proxy import AuthServiceProxy, JSONRPCException
+from teos.utils.auth_proxy import JSONRPCException
+from teos.utils.rpc_pool import PooledServiceProxy, get_pool, get_service_url
 
 from common.constants import MAINNET_RPC_PORT, TESTNET_RPC_PORT, REGTEST_RPC_PORT
 
@@ -9,30 +10,73 @@ from common.constants import MAINNET_RPC_PORT, TESTNET_RPC_PORT, REGTEST_RPC_POR
 Tools is a module with general methods that can used by different entities in the codebase.
 """
 
+# Default number of requests sent to bitcoind in a single json-rpc batch
+DEFAULT_BATCH_SIZE = 500
+# Threads other than the API workers and the block prefetch workers that query bitcoind (the two ChainMonitor threads,
+# the Watcher and the Responder)
+INTERNAL_RPC_THREADS = 4
+
 
 # NOTCOVERED
 def bitcoin_cli(btc_connect_params):
     """
     An ``http`` connection with ``bitcoind`` using the ``json-rpc`` interface.
 
+    Connections are taken from a keep-alive pool shared by every component connecting to the same ``bitcoind`` (see
+    :obj:`RPCConnectionPool <teos.utils.rpc_pool.RPCConnectionPool>`).
+
     Args:
         btc_connect_params (:obj:`dict`): a dictionary with the parameters to connect to bitcoind
             (rpc user, rpc password, host and port)
 
     Returns:
-        :obj:`AuthServiceProxy <teos.utils.auth_proxy.AuthServiceProxy>`: An authenticated service proxy to ``bitcoind``
-        that can be used to send ``json-rpc`` commands.
+        :obj:`PooledServiceProxy <teos.utils.rpc_pool.PooledServiceProxy>`: An authenticated service proxy to
+        ``bitcoind`` that can be used to send ``json-rpc`` commands.
+    """
+
+    return PooledServiceProxy(get_service_url(btc_connect_params), get_pool(btc_connect_params))
+
+
+def batch_rpc(btc_connect_params, method, params_list, batch_size):
+    """
+    Sends the same ``json-rpc`` command to ``bitcoind`` once per set of parameters in ``params_list``, grouping the
+    requests in batches of up to ``batch_size``.
+
+    Args:
+        btc_connect_params (:obj:`dict`): a dictionary with the parameters to connect to bitcoind
+            (rpc user, rpc password, host and port)
+        method (:obj:`str`): the ``json-rpc`` command to be sent (e.g. ``getrawtransaction``).
+        params_list (:obj:`list`): a list of parameter lists, one per request.
+        batch_size (:obj:`int`): the maximum number of requests per batch.
+
+    Returns:
+        :obj:`list`: A list of ``(result, error)`` tuples, in the same order as ``params_list``. ``error`` is ``None``
+        if the request succeeded, and ``result`` is ``None`` otherwise.
+
+    Raises:
+        :obj:`JSONRPCException <teos.utils.auth_proxy.JSONRPCException>`: If ``bitcoind`` rejects a batch.
     """
 
-    return AuthServiceProxy(
-        "http://%s:%s@%s:%d"
-        % (
-            btc_connect_params.get("BTC_RPC_USER"),
-            btc_connect_params.get("BTC_RPC_PASSWORD"),
-            btc_connect_params.get("BTC_RPC_CONNECT"),
-            btc_connect_params.get("BTC_RPC_PORT"),
-        )
-    )
+    rpc = bitcoin_cli(btc_connect_params)
+    results = []
+
+    for i in range(0, len(params_list), batch_size):
+        chunk = params_list[i : i + batch_size]
+
+        # Request ids are set to the position in the chunk so responses can be matched regardless of their order
+        requests = []
+        for pos, params in enumerate(chunk):
+            request = getattr(rpc, method).get_request(*params)
+            request["id"] = pos
+            requests.append(request)
+
+        chunk_results = [None] * len(chunk)
+        for response in rpc.batch(requests):
+            chunk_results[response.get("id")] = (response.get("result"), response.get("error"))
+
+        results.extend(chunk_results)
+
+    return results
 
 
 # NOTCOVERED
@@ -109,3 +153,19 @@ def get_default_rpc_port(network):
         return REGTEST_RPC_PORT
     else:
         raise ValueError("Wrong Bitcoin network. Expected: mainnet, testnet or regtest. Received: {}".format(network))
+
+
+def get_default_rpc_pool_size(api_workers, prefetch_workers):
+    """
+    Returns the default size of the ``bitcoind`` connection pool, so every thread that may query ``bitcoind`` at the
+    same time can get a connection (and the internal components do not queue behind the API requests).
+
+    Args:
+        api_workers (:obj:`int`): the number of threads serving the API.
+        prefetch_workers (:obj:`int`): the number of threads prefetching blocks.
+
+    Returns:
+        :obj:`int`: The default size of the connection pool.
+    """
+
+    return api_workers + max(prefetch_workers, 1) + INTERNAL_RPC_THREADS
@@ -9,12 +9,19 @@ from common.tools import is_compressed_pk
 
 logger = Logger(actor="UsersDBM", log_name_prefix=LOG_PREFIX)
 
+# Users are stored as a header (user_id -> available_slots and subscription_expiry) plus an entry per appointment
+# (user_id:uuid -> required_slots), so adding or deleting an appointment does not rewrite the whole user record
+APPOINTMENT_KEY_SEPARATOR = ":"
+
 
 class UsersDBM(DBManager):
     """
     The :class:`UsersDBM` is in charge of interacting with the users database (``LevelDB``).
     Keys and values are stored as bytes in the database but processed as strings by the manager.
 
+    Users stored using the legacy layout (a single record including the ``appointments`` dict) are migrated to the
+    current layout when the database is opened.
+
     Args:
         db_path (:obj:`str`): the path (relative or absolute) to the system folder containing the database. A fresh
             database will be created if the specified path does not contain one.
@@ -37,10 +44,54 @@ class UsersDBM(DBManager):
 
             raise e
 
+        migrated_users = self.migrate_users()
+        if migrated_users:
+            logger.info("Migrated users to the current db layout", users=migrated_users)
+
+    @staticmethod
+    def get_appointment_key(user_id, uuid):
+        """
+        Builds the key of a user appointment entry.
+
+        Args:
+            user_id (:obj:`str`): a 33-byte hex-encoded string identifying the user.
+            uuid (:obj:`str`): the appointment uuid.
+
+        Returns:
+            :obj:`bytes`: The database key of the entry.
+        """
+
+        return (user_id + APPOINTMENT_KEY_SEPARATOR + uuid).encode("utf-8")
+
+    @staticmethod
+    def encode_user_header(user_data):
+        """
+        Encodes the user data that is not appointment related (the user header).
+
+        Args:
+            user_data (:obj:`dict`): the user associated data, as a dictionary.
+
+        Returns:
+            :obj:`bytes`: The encoded header.
+
+        Raises:
+            :obj:`TypeError`: If ``user_data`` is not a dictionary or it cannot be encoded.
+        """
+
+        if not isinstance(user_data, dict):
+            raise TypeError("User data must be a dict")
+
+        header = {k: v for k, v in user_data.items() if k != "appointments"}
+
+        return json.dumps(header).encode("utf-8")
+
     def store_user(self, user_id, user_data):
         """
         Stores a user record to the database. ``user_pk`` is used as identifier.
 
+        The whole record (header and appointments) is replaced atomically. Use :meth:`store_user_appointment` and
+        :meth:`delete_user_appointments` to update the appointments of an existing user.
+
         Args:
             user_id (:obj:`str`): a 33-byte hex-encoded string identifying the user.
             user_data (:obj:`dict`): the user associated data, as a dictionary.
@@ -51,19 +102,129 @@ class UsersDBM(DBManager):
 
         if is_compressed_pk(user_id):
             try:
-                self.create_entry(user_id, json.dumps(user_data))
+                header = self.encode_user_header(user_data)
+                appointments = user_data.get("appointments") or {}
+
+                with self.writer.write_batch(transaction=True) as b:
+                    for k in self.writer.iterator(prefix=self.get_appointment_key(user_id, ""), include_value=False):
+                        b.delete(k)
+
+                    b.put(user_id.encode("utf-8"), header)
+                    for uuid, required_slots in appointments.items():
+                        b.put(self.get_appointment_key(user_id, uuid), str(int(required_slots)).encode("utf-8"))
+
                 logger.info("Adding user to Gatekeeper's db", user_id=user_id)
                 return True
 
-            except json.JSONDecodeError:
+            except (TypeError, ValueError, AttributeError):
                 logger.info("Could't add user to db. Wrong user data format", user_id=user_id, user_data=user_data)
                 return False
+        else:
+            logger.info("Could't add user to db. Wrong pk format", user_id=user_id, user_data=user_data)
+            return False
+
+    def store_user_header(self, user_id, user_data):
+        """
+        Stores the header of a user record (everything but the appointments), leaving the appointments untouched.
+
+        Args:
+            user_id (:obj:`str`): a 33-byte hex-encoded string identifying the user.
+            user_data (:obj:`dict`): the user associated data, as a dictionary. The ``appointments`` field is ignored.
+
+        Returns:
+            :obj:`bool`: True if the header was stored in the database, False otherwise.
+        """
+
+        if is_compressed_pk(user_id):
+            try:
+                self.writer.put(user_id.encode("utf-8"), self.encode_user_header(user_data))
+                return True
 
             except TypeError:
-                logger.info("Could't add user to db", user_id=user_id, user_data=user_data)
+                logger.info("Could't update user. Wrong user data format", user_id=user_id, user_data=user_data)
                 return False
         else:
-            logger.info("Could't add user to db. Wrong pk format", user_id=user_id, user_data=user_data)
+            logger.info("Could't update user. Wrong pk format", user_id=user_id, user_data=user_data)
+            return False
+
+    def store_user_appointment(self, user_id, user_data, uuid):
+        """
+        Stores (or updates) a single appointment of a user alongside the user header, in a single atomic write.
+
+        Args:
+            user_id (:obj:`str`): a 33-byte hex-encoded string identifying the user.
+            user_data (:obj:`dict`): the user associated data, as a dictionary. Only the header and the slots of the
+                appointment identified by ``uuid`` are written.
+            uuid (:obj:`str`): the identifier of the appointment to store.
+
+        Returns:
+            :obj:`bool`: True if the appointment was stored in the database, False otherwise.
+        """
+
+        return self.store_user_appointments(user_id, user_data, [uuid])
+
+    def store_user_appointments(self, user_id, user_data, uuids):
+        """
+        Stores (or updates) some appointments of a user alongside the user header, in a single atomic write.
+
+        Args:
+            user_id (:obj:`str`): a 33-byte hex-encoded string identifying the user.
+            user_data (:obj:`dict`): the user associated data, as a dictionary. Only the header and the slots of the
+                appointments identified by ``uuids`` are written.
+            uuids (:obj:`list`): the identifiers of the appointments to store.
+
+        Returns:
+            :obj:`bool`: True if the appointments were stored in the database, False otherwise.
+        """
+
+        if is_compressed_pk(user_id) and all(isinstance(uuid, str) for uuid in uuids):
+            try:
+                required_slots = {uuid: int(user_data["appointments"][uuid]) for uuid in uuids}
+                header = self.encode_user_header(user_data)
+
+                with self.writer.write_batch(transaction=True) as b:
+                    b.put(user_id.encode("utf-8"), header)
+                    for uuid, slots in required_slots.items():
+                        b.put(self.get_appointment_key(user_id, uuid), str(slots).encode("utf-8"))
+
+                return True
+
+            except (TypeError, ValueError, KeyError):
+                logger.info("Could't add appointments to user. Wrong user data format", user_id=user_id, uuids=uuids)
+                return False
+        else:
+            logger.info("Could't add appointments to user. Wrong pk or uuid format", user_id=user_id, uuids=uuids)
+            return False
+
+    def delete_user_appointments(self, user_id, user_data, uuids):
+        """
+        Deletes a collection of appointments of a user and updates the user header, in a single atomic write.
+
+        Args:
+            user_id (:obj:`str`): a 33-byte hex-encoded string identifying the user.
+            user_data (:obj:`dict`): the user associated data, as a dictionary. Only the header is written.
+            uuids (:obj:`list`): the identifiers of the appointments to delete.
+
+        Returns:
+            :obj:`bool`: True if the appointments were deleted from the database, False otherwise.
+        """
+
+        if is_compressed_pk(user_id):
+            try:
+                header = self.encode_user_header(user_data)
+
+                with self.writer.write_batch(transaction=True) as b:
+                    b.put(user_id.encode("utf-8"), header)
+                    for uuid in uuids:
+                        b.delete(self.get_appointment_key(user_id, uuid))
+
+                return True
+
+            except TypeError:
+                logger.info("Could't delete user appointments. Wrong data format", user_id=user_id, uuids=uuids)
+                return False
+        else:
+            logger.info("Could't delete user appointments. Wrong pk format", user_id=user_id, uuids=uuids)
             return False
 
     def load_user(self, user_id):
@@ -81,16 +242,21 @@ class UsersDBM(DBManager):
         """
 
         try:
-            data = self.load_entry(user_id)
-            data = json.loads(data)
-        except (TypeError, json.decoder.JSONDecodeError):
+            with self.db.snapshot() as snapshot:
+                data = json.loads(snapshot.get(user_id.encode("utf-8")))
+                appointments = data.setdefault("appointments", {})
+
+                for k, v in snapshot.iterator(prefix=self.get_appointment_key(user_id, "")):
+                    appointments[k.decode("utf-8").split(APPOINTMENT_KEY_SEPARATOR, 1)[1]] = int(v)
+
+        except (TypeError, AttributeError, json.decoder.JSONDecodeError):
             data = None
 
         return data
 
     def delete_user(self, user_id):
         """
-        Deletes a user record from the database.
+        Deletes a user record from the database, including all their appointments.
 
         Args:
            user_id (:obj:`str`): a 33-byte hex-encoded string identifying the user.
@@ -100,11 +266,15 @@ class UsersDBM(DBManager):
         """
 
         try:
-            self.delete_entry(user_id)
+            with self.writer.write_batch(transaction=True) as b:
+                for k in self.writer.iterator(prefix=self.get_appointment_key(user_id, ""), include_value=False):
+                    b.delete(k)
+                b.delete(user_id.encode("utf-8"))
+
             logger.info("Deleting user from Gatekeeper's db", uuid=user_id)
             return True
 
-        except TypeError:
+        except (TypeError, AttributeError):
             logger.info("Cannot delete user from db, user key has wrong type", uuid=user_id)
             return False
 
@@ -119,10 +289,48 @@ class UsersDBM(DBManager):
         """
 
         data = {}
+        appointments = {}
 
-        for k, v in self.db.iterator():
-            # Get uuid and appointment_data from the db
-            user_id = k.decode("utf-8")
-            data[user_id] = json.loads(v)
+        with self.db.snapshot() as snapshot:
+            for k, v in snapshot.iterator():
+                key = k.decode("utf-8")
+
+                if APPOINTMENT_KEY_SEPARATOR in key:
+                    user_id, uuid = key.split(APPOINTMENT_KEY_SEPARATOR, 1)
+                    appointments.setdefault(user_id, {})[uuid] = int(v)
+                else:
+                    data[key] = json.loads(v)
+
+        for user_id, user_data in data.items():
+            user_data.setdefault("appointments", {}).update(appointments.get(user_id, {}))
 
         return data
+
+    def migrate_users(self):
+        """
+        Migrates the users stored using the legacy layout (a single record including all the user appointments) to the
+        current one (a header plus an entry per appointment). The whole migration is written atomically.
+
+        Returns:
+            :obj:`int`: The number of migrated users.
+        """
+
+        migrated = 0
+
+        with self.db.snapshot() as snapshot, self.db.write_batch(transaction=True) as b:
+            for k, v in snapshot.iterator():
+                if APPOINTMENT_KEY_SEPARATOR.encode("utf-8") in k:
+                    continue
+
+                user_data = json.loads(v)
+                if "appointments" not in user_data:
+                    continue
+
+                user_id = k.decode("utf-8")
+                b.put(k, self.encode_user_header(user_data))
+                for uuid, required_slots in user_data.get("appointments").items():
+                    b.put(self.get_appointment_key(user_id, uuid), str(int(required_slots)).encode("utf-8"))
+
+                migrated += 1
+
+        return migrated
@@ -0,0 +1,55 @@
+class OrderedSet:
+    """
+    A set that remembers insertion order. Membership checks, insertions and deletions are ``O(1)`` (it is backed by a
+    ``dict``, which preserves insertion order), while iteration follows the order in which the items were added.
+
+    Args:
+        items (:obj:`iterable`): an optional collection of items to populate the set with.
+    """
+
+    def __init__(self, items=None):
+        self._items = dict.fromkeys(items) if items is not None else {}
+
+    def add(self, item):
+        """Adds an item to the end of the set. Adding an item that is already in the set does not change its place."""
+
+        self._items[item] = None
+
+    def update(self, items):
+        """Adds a collection of items to the set, in order."""
+
+        for item in items:
+            self._items[item] = None
+
+    def remove(self, item):
+        """
+        Removes an item from the set.
+
+        Raises:
+            :obj:`KeyError`: If the item is not in the set.
+        """
+
+        del self._items[item]
+
+    def discard(self, item):
+        """Removes an item from the set if present."""
+
+        self._items.pop(item, None)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, OrderedSet):
+            return list(self) == list(other)
+
+        return NotImplemented
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, list(self))
@@ -0,0 +1,290 @@
+import select
+import http.client
+from time import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock, BoundedSemaphore
+
+from teos.utils.auth_proxy import AuthServiceProxy, JSONRPCException, HTTP_TIMEOUT
+
+DEFAULT_POOL_SIZE = 16
+# bitcoind closes idle keep-alive connections after rpcservertimeout (30 secs by default)
+DEFAULT_MAX_IDLE = 25
+
+# Errors that signal the server dropped the connection under our feet. A request failing this way is retried once
+# using a fresh connection, as long as it is read-only (the dropped request may have already been processed).
+CONNECTION_DROPPED_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+READ_ONLY_METHODS = frozenset(
+    {
+        "decoderawtransaction",
+        "getbestblockhash",
+        "getblock",
+        "getblockchaininfo",
+        "getblockcount",
+        "getblockhash",
+        "getblockheader",
+        "getnetworkinfo",
+        "getrawtransaction",
+        "help",
+    }
+)
+
+# JSONRPCException codes raised by the client itself (timeouts, non-JSON or incomplete replies) instead of bitcoind.
+# The connection may have a pending (or partially read) response after them, so it cannot be reused.
+TRANSPORT_ERROR_CODES = (-342, -343, -344)
+
+
+class RPCConnectionPool:
+    """
+    The :class:`RPCConnectionPool` keeps a bounded set of keep-alive ``http`` connections to ``bitcoind`` so requests
+    do not have to pay for a new TCP handshake every time. It is thread-safe and can be shared by every component that
+    talks to ``bitcoind``.
+
+    Args:
+        host (:obj:`str`): the host ``bitcoind`` is listening on.
+        port (:obj:`int`): the port ``bitcoind`` is listening on.
+        max_size (:obj:`int`): the maximum number of connections that can be in use at the same time.
+        max_idle (:obj:`int`): the maximum time (in seconds) a connection can be left idle before being recycled.
+        timeout (:obj:`int`): the timeout for the ``http`` connections.
+
+    Attributes:
+        hits (:obj:`int`): the number of times an idle connection has been reused.
+        misses (:obj:`int`): the number of times a new connection had to be created.
+        discarded (:obj:`int`): the number of connections that have been closed because they were unhealthy or failed.
+    """
+
+    def __init__(self, host, port, max_size=DEFAULT_POOL_SIZE, max_idle=DEFAULT_MAX_IDLE, timeout=HTTP_TIMEOUT):
+        if max_size < 1:
+            raise ValueError("The pool size must be at least 1")
+
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+        # Idle connections are stored as (connection, last_used) and reused LIFO so the hottest ones are kept alive
+        self._idle = deque()
+        self._slots = BoundedSemaphore(max_size)
+        self._lock = Lock()
+
+    @property
+    def stats(self):
+        """:obj:`dict`: The pool counters (``hits``, ``misses``, ``discarded`` and ``idle``)."""
+
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "discarded": self.discarded, "idle": len(self._idle)}
+
+    def is_healthy(self, conn, last_used):
+        """
+        Checks whether an idle connection can be reused.
+
+        A connection is considered unhealthy if it has been idle for longer than ``max_idle`` or if the server has
+        already closed it (the socket is readable while no request is in flight).
+
+        Args:
+            conn (:obj:`HTTPConnection`): the connection to be checked.
+            last_used (:obj:`float`): the timestamp at which the connection was returned to the pool.
+
+        Returns:
+            :obj:`bool`: True if the connection can be reused, False otherwise.
+        """
+
+        if time() - last_used > self.max_idle:
+            return False
+
+        # A connection with no socket is fine, http.client will open a new one on the next request
+        if conn.sock is None:
+            return True
+
+        try:
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+
+        return not readable
+
+    def acquire(self):
+        """
+        Gets a connection from the pool. Blocks if ``max_size`` connections are already in use.
+
+        Returns:
+            :obj:`HTTPConnection`: A connection to ``bitcoind``.
+        """
+
+        self._slots.acquire()
+
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+
+                if self.is_healthy(conn, last_used):
+                    self.hits += 1
+                    return conn
+
+                conn.close()
+                self.discarded += 1
+
+            self.misses += 1
+
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def release(self, conn, discard=False):
+        """
+        Returns a connection to the pool.
+
+        Args:
+            conn (:obj:`HTTPConnection`): the connection to be returned.
+            discard (:obj:`bool`): whether the connection should be closed instead of kept for reuse.
+        """
+
+        with self._lock:
+            if discard:
+                conn.close()
+                self.discarded += 1
+
+            else:
+                self._idle.append((conn, time()))
+
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that acquires a connection and releases it once done. Connections that raise anything other
+        than a ``bitcoind`` application error are discarded.
+        """
+
+        conn = self.acquire()
+
+        try:
+            yield conn
+
+        except JSONRPCException as e:
+            transport_error = isinstance(e.error, dict) and e.error.get("code") in TRANSPORT_ERROR_CODES
+            self.release(conn, discard=transport_error)
+            raise
+
+        except Exception:
+            self.release(conn, discard=True)
+            raise
+
+        else:
+            self.release(conn)
+
+    def close(self):
+        """Closes all the idle connections."""
+
+        with self._lock:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                conn.close()
+
+
+class PooledServiceProxy:
+    """
+    A drop-in replacement of :obj:`AuthServiceProxy <teos.utils.auth_proxy.AuthServiceProxy>` that borrows a connection
+    from a :obj:`RPCConnectionPool` for every call instead of owning one.
+
+    Args:
+        service_url (:obj:`str`): the url of the ``bitcoind`` RPC server (including credentials).
+        pool (:obj:`RPCConnectionPool`): the pool to borrow connections from.
+        service_name (:obj:`str`): the RPC method name (set when accessing an attribute of the proxy).
+    """
+
+    def __init__(self, service_url, pool, service_name=None):
+        self._service_url = service_url
+        self._pool = pool
+        self._service_name = service_name
+
+    def __getattr__(self, name):
+        if name.startswith("__") and name.endswith("__"):
+            # Python internal stuff
+            raise AttributeError
+
+        return PooledServiceProxy(self._service_url, self._pool, name)
+
+    def _run(self, method, read_only):
+        # Idle connections may have been dropped by bitcoind between the health check and the request. In that case
+        # read-only requests are retried (once) on a fresh connection. The rest may have already been processed.
+        try:
+            with self._pool.connection() as conn:
+                return method(AuthServiceProxy(self._service_url, self._service_name, connection=conn))
+
+        except CONNECTION_DROPPED_ERRORS:
+            if not read_only:
+                raise
+
+            with self._pool.connection() as conn:
+                return method(AuthServiceProxy(self._service_url, self._service_name, connection=conn))
+
+    def get_request(self, *args, **argsn):
+        """Builds the json-rpc request for this method without sending it. Useful to build batches."""
+
+        return AuthServiceProxy(self._service_url, self._service_name).get_request(*args, **argsn)
+
+    def __call__(self, *args, **argsn):
+        return self._run(lambda proxy: proxy(*args, **argsn), self._service_name in READ_ONLY_METHODS)
+
+    def batch(self, rpc_call_list):
+        read_only = all(request.get("method") in READ_ONLY_METHODS for request in rpc_call_list)
+        return self._run(lambda proxy: proxy.batch(rpc_call_list), read_only)
+
+
+_pools = {}
+_pools_lock = Lock()
+
+
+def get_pool(btc_connect_params):
+    """
+    Gets the :obj:`RPCConnectionPool` for a given set of connection parameters, creating it if it does not exist yet.
+    Pools are shared within the process, so every component connecting to the same ``bitcoind`` uses the same one.
+
+    Args:
+        btc_connect_params (:obj:`dict`): a dictionary with the parameters to connect to bitcoind
+            (rpc user, rpc password, host and port). ``BTC_RPC_POOL_SIZE`` can be used to set the pool size.
+
+    Returns:
+        :obj:`RPCConnectionPool`: The pool for the given parameters.
+    """
+
+    key = (
+        btc_connect_params.get("BTC_RPC_USER"),
+        btc_connect_params.get("BTC_RPC_PASSWORD"),
+        btc_connect_params.get("BTC_RPC_CONNECT"),
+        btc_connect_params.get("BTC_RPC_PORT"),
+    )
+
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = RPCConnectionPool(
+                btc_connect_params.get("BTC_RPC_CONNECT"),
+                btc_connect_params.get("BTC_RPC_PORT"),
+                max_size=btc_connect_params.get("BTC_RPC_POOL_SIZE", DEFAULT_POOL_SIZE),
+            )
+
+        return _pools[key]
+
+
+def get_service_url(btc_connect_params):
+    """
+    Builds the ``bitcoind`` RPC url given a set of connection parameters.
+
+    Args:
+        btc_connect_params (:obj:`dict`): a dictionary with the parameters to connect to bitcoind
+            (rpc user, rpc password, host and port)
+
+    Returns:
+        :obj:`str`: The RPC url.
+    """
+
+    return "http://%s:%s@%s:%d" % (
+        btc_connect_params.get("BTC_RPC_USER"),
+        btc_connect_params.get("BTC_RPC_PASSWORD"),
+        btc_connect_params.get("BTC_RPC_CONNECT"),
+        btc_connect_params.get("BTC_RPC_PORT"),
+    )
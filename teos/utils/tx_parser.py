@@ -0,0 +1,190 @@
+"""
+A minimal Bitcoin transaction deserializer supporting both the legacy and the segwit (BIP144) serialization formats.
+
+It follows the same rules ``bitcoind`` applies in ``decoderawtransaction``, so it can be used to check whether some data
+is a well-formatted transaction and to compute its id without a round-trip to the node.
+"""
+
+import struct
+from decimal import Decimal
+from binascii import unhexlify, Error as HexError
+
+from common.cryptographer import sha256d
+
+SATOSHIS_PER_BTC = Decimal(100000000)
+# No transaction can be bigger than the block weight limit, so it is used as an upper bound for any count or length
+MAX_SIZE = 4000000
+
+
+class TxReader:
+    """
+    Reads the fields of a serialized transaction sequentially.
+
+    Args:
+        data (:obj:`bytes`): the serialized transaction.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, n):
+        if n > len(self.data) - self.pos:
+            raise ValueError("Unexpected end of data")
+
+        chunk = self.data[self.pos : self.pos + n]
+        self.pos += n
+
+        return chunk
+
+    def read_uint(self, fmt):
+        return struct.unpack(fmt, self.read(struct.calcsize(fmt)))[0]
+
+    def read_compact_size(self):
+        size = self.read(1)[0]
+
+        if size == 0xFD:
+            size = self.read_uint("<H")
+            min_size = 0xFD
+        elif size == 0xFE:
+            size = self.read_uint("<I")
+            min_size = 0x10000
+        elif size == 0xFF:
+            size = self.read_uint("<Q")
+            min_size = 0x100000000
+        else:
+            min_size = 0
+
+        # Non-canonical encodings are rejected by bitcoind
+        if size < min_size:
+            raise ValueError("Non-canonical compact size")
+
+        if size > MAX_SIZE:
+            raise ValueError("Compact size too big")
+
+        return size
+
+    def read_var_bytes(self):
+        return self.read(self.read_compact_size())
+
+    def at_end(self):
+        return self.pos == len(self.data)
+
+
+def read_inputs(reader):
+    vin = []
+
+    for _ in range(reader.read_compact_size()):
+        prev_txid = reader.read(32)[::-1].hex()
+        prev_out_index = reader.read_uint("<I")
+        script_sig = reader.read_var_bytes().hex()
+        sequence = reader.read_uint("<I")
+
+        vin.append({"txid": prev_txid, "vout": prev_out_index, "scriptSig": {"hex": script_sig}, "sequence": sequence})
+
+    return vin
+
+
+def read_outputs(reader):
+    vout = []
+
+    for n in range(reader.read_compact_size()):
+        value = reader.read_uint("<q")
+        script_pubkey = reader.read_var_bytes().hex()
+
+        vout.append({"value": Decimal(value) / SATOSHIS_PER_BTC, "n": n, "scriptPubKey": {"hex": script_pubkey}})
+
+    return vout
+
+
+def decode_raw_transaction(raw_tx):
+    """
+    Deserializes a given raw transaction (hex encoded).
+
+    The format of the returned data mimics the one returned by ``bitcoind``'s ``decoderawtransaction``, but it only
+    includes data that can be derived from the transaction itself (scripts are not disassembled and addresses are not
+    computed).
+
+    Args:
+        raw_tx (:obj:`str`): the hex representation of the transaction.
+
+    Returns:
+        :obj:`dict`: The decoding of the given ``raw_tx``, including the ``txid``, ``hash``, ``version``, ``size``,
+        ``vsize``, ``weight``, ``locktime``, ``vin`` and ``vout``.
+
+    Raises:
+        :obj:`ValueError`: If the provided ``raw_tx`` has invalid format.
+    """
+
+    if not isinstance(raw_tx, str):
+        raise ValueError("Wrong transaction type. Expected str, received {}".format(type(raw_tx)))
+
+    try:
+        data = unhexlify(raw_tx)
+    except HexError:
+        raise ValueError("Transaction is not hex encoded")
+
+    reader = TxReader(data)
+    version = reader.read_uint("<i")
+    segwit = False
+
+    vin = read_inputs(reader)
+    vout = []
+
+    if len(vin) == 0:
+        # An empty vin may be the segwit marker (0x00). If so, it is followed by the flag and the actual vin and vout.
+        # Otherwise, the flag is read as an empty vout (same as bitcoind).
+        flags = reader.read(1)[0]
+
+        if flags != 0:
+            if flags != 1:
+                raise ValueError("Unknown transaction optional data")
+
+            segwit = True
+            vin = read_inputs(reader)
+            vout = read_outputs(reader)
+    else:
+        vout = read_outputs(reader)
+
+    # Non-witness data ends right after the outputs (the locktime is still to be read)
+    witness_start = reader.pos
+
+    if segwit:
+        has_witness = False
+
+        for tx_in in vin:
+            stack = [reader.read_var_bytes().hex() for _ in range(reader.read_compact_size())]
+            tx_in["txinwitness"] = stack
+            has_witness = has_witness or len(stack) > 0
+
+        if not has_witness:
+            raise ValueError("Superfluous witness record")
+
+    witness_end = reader.pos
+    locktime = reader.read_uint("<I")
+
+    if not reader.at_end():
+        raise ValueError("Data still available after the end of the transaction")
+
+    if len(vin) == 0:
+        raise ValueError("Transaction has no inputs")
+
+    if segwit:
+        # Stripped serialization: version | vin | vout | locktime (without marker, flag and witness)
+        stripped = data[:4] + data[6:witness_start] + data[witness_end:]
+    else:
+        stripped = data
+
+    weight = 3 * len(stripped) + len(data)
+
+    return {
+        "txid": sha256d(stripped)[::-1].hex(),
+        "hash": sha256d(data)[::-1].hex(),
+        "version": version,
+        "size": len(data),
+        "vsize": (weight + 3) // 4,
+        "weight": weight,
+        "locktime": locktime,
+        "vin": vin,
+        "vout": vout,
+    }
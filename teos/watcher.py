@@ -1,10 +1,13 @@
+from time import time
 from queue import Queue
 from threading import Thread
+from multiprocessing import get_context
 from collections import OrderedDict
 from readerwriterlock import rwlock
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 from common.logger import Logger
-from common.tools import compute_locator
+from common.tools import compute_binary_locator
 from common.exceptions import BasicException
 from common.exceptions import EncryptionError
 from common.cryptographer import Cryptographer, hash_160
@@ -14,9 +17,15 @@ from teos import LOG_PREFIX
 from teos.cleaner import Cleaner
 from teos.extended_appointment import ExtendedAppointment
 from teos.block_processor import InvalidTransactionFormat
+from teos.gatekeeper import AuthenticationFailure, NotEnoughSlots
 
 logger = Logger(actor="Watcher", log_name_prefix=LOG_PREFIX)
 
+# Below this number of distinct blobs the decryption pool overhead is not worth it, so blobs are decrypted serially
+MIN_PARALLEL_DECRYPTIONS = 64
+# Number of blobs sent to each worker at once (only relevant for process pools)
+DECRYPTION_CHUNK_SIZE = 32
+
 
 class AppointmentLimitReached(BasicException):
     """Raised when the tower maximum appointment count has been reached"""
@@ -26,6 +35,63 @@ class AppointmentAlreadyTriggered(BasicException):
     """Raised when an appointment is sent to the Watcher but that same data has already been sent to the Responder"""
 
 
+def decrypt_blob(encrypted_blob, dispute_txid):
+    """
+    Decrypts an ``encrypted_blob`` using the ``dispute_txid`` as key. Defined at module level so it can be sent to
+    the workers of a decryption pool.
+
+    Args:
+        encrypted_blob (:obj:`str`): the encrypted penalty transaction (hex-encoded).
+        dispute_txid (:obj:`str`): the id of the transaction that triggered the appointment.
+
+    Returns:
+        :obj:`str` or :obj:`None`: The decrypted penalty transaction if the blob can be decrypted, ``None`` otherwise.
+    """
+
+    try:
+        # Both values are known to be hex at this point (checked by the Inspector / coming from bitcoind), so the checks
+        # performed by Cryptographer.decrypt can be skipped
+        return Cryptographer.decrypt_bytes(bytes.fromhex(encrypted_blob), bytes.fromhex(dispute_txid)).hex()
+
+    except (ValueError, EncryptionError):
+        # ValueError covers odd-length blobs, which cannot be decrypted either
+        return None
+
+
+def create_decryption_pool(workers, worker_type="process"):
+    """
+    Creates a worker pool to decrypt the triggered appointments of a block in parallel.
+
+    Process pools are created using ``spawn`` so the workers do not inherit the state (threads, locks, db handlers) of
+    the tower.
+
+    Args:
+        workers (:obj:`int`): the number of workers of the pool. ``0`` means no pool.
+        worker_type (:obj:`str`): the type of the workers (``process`` or ``thread``).
+
+    Returns:
+        :obj:`Executor` or :obj:`None`: A ``ProcessPoolExecutor`` or ``ThreadPoolExecutor`` with the given number of
+        workers, or ``None`` if ``workers`` is ``0``.
+
+    Raises:
+        :obj:`ValueError`: If ``workers`` is negative or ``worker_type`` is unknown.
+    """
+
+    if workers < 0:
+        raise ValueError("The number of decryption workers cannot be negative")
+
+    if worker_type not in ["process", "thread"]:
+        raise ValueError("Unknown decryption worker type ({})".format(worker_type))
+
+    if workers == 0:
+        return None
+
+    if worker_type == "process":
+        return ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+    else:
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decryption")
+
+
 class LocatorCache:
     """
     The LocatorCache keeps the data about the last ``cache_size`` blocks around so appointments can be checked against
@@ -37,10 +103,11 @@ class LocatorCache:
 
     Attributes:
         cache (:obj:`dict`): a dictionary of ``locator:dispute_txid`` pairs that received appointments are checked
-            against.
-        blocks (:obj:`OrderedDict`): An ordered dictionary of the last ``blocks_in_cache`` blocks (block_hash:locators).
-            Used to keep track of what data belongs to what block, so data can be pruned accordingly. Also needed to
-            rebuild the cache in case of reorgs.
+            against. Locators are kept in binary (16-byte ``bytes``) to reduce the memory footprint.
+        blocks (:obj:`OrderedDict`): An ordered dictionary of the last ``blocks_in_cache`` blocks
+            (``block_hash:locator_txid_map``), from the oldest to the most recent. Used to keep track of what data
+            belongs to what block, so data can be pruned accordingly. Also needed to rebuild the cache in case of
+            reorgs.
         cache_size (:obj:`int`): the size of the cache in blocks.
     """
 
@@ -50,6 +117,26 @@ class LocatorCache:
         self.cache_size = blocks_in_cache
         self.rw_lock = rwlock.RWLockWrite()
 
+    @staticmethod
+    def build(blocks):
+        """
+        Builds the lookup index (``cache``) of a collection of blocks.
+
+        Args:
+            blocks (:obj:`OrderedDict`): the blocks to index (``block_hash:locator_txid_map``), from the oldest to the
+                most recent.
+
+        Returns:
+            :obj:`dict`: The ``locator:txid`` index. If a locator is found in more than one block, the most recent one
+            is kept.
+        """
+
+        cache = dict()
+        for locator_txid_map in blocks.values():
+            cache.update(locator_txid_map)
+
+        return cache
+
     def init(self, last_known_block, block_processor):
         """
         Sets the initial state of the locator cache.
@@ -61,30 +148,26 @@ class LocatorCache:
 
         # This is needed as a separate method from __init__ since it has to be initialized right before start watching.
         # Not doing so implies store temporary variables in the Watcher and initialising the cache as None.
-        target_block_hash = last_known_block
-        for _ in range(self.cache_size):
-            # In some setups, like regtest, it could be the case that there are no enough previous blocks.
-            # In those cases we pull as many as we can (up to cache_size).
-            if not target_block_hash:
-                break
+        blocks = OrderedDict()
 
-            target_block = block_processor.get_block(target_block_hash)
-            if not target_block:
-                break
+        # In some setups, like regtest, it could be the case that there are no enough previous blocks.
+        # In those cases we pull as many as we can (up to cache_size).
+        if last_known_block:
+            for block in block_processor.get_previous_blocks(last_known_block, self.cache_size):
+                blocks[block.get("hash")] = {compute_binary_locator(txid): txid for txid in block.get("tx")}
 
-            locator_txid_map = {compute_locator(txid): txid for txid in target_block.get("tx")}
-            self.cache.update(locator_txid_map)
-            self.blocks[target_block_hash] = list(locator_txid_map.keys())
-            target_block_hash = target_block.get("previousblockhash")
+        cache = self.build(blocks)
 
-        self.blocks = OrderedDict(reversed((list(self.blocks.items()))))
+        with self.rw_lock.gen_wlock():
+            self.blocks = blocks
+            self.cache = cache
 
     def get_txid(self, locator):
         """
         Gets a txid from the locator cache.
 
         Args:
-            locator (:obj:`str`): the locator to lookup in the cache.
+            locator (:obj:`bytes`): the (binary) locator to lookup in the cache.
 
         Returns:
             :obj:`str` or :obj:`None`: The txid linked to the given locator if found. None otherwise.
@@ -97,63 +180,138 @@ class LocatorCache:
     def update(self, block_hash, locator_txid_map):
         """
         Updates the cache with data from a new block. Removes the oldest block if the cache is full after the addition.
+        Both happen under the same lock, so readers never see the cache over its size.
 
         Args:
             block_hash (:obj:`str`): the hash of the new block.
-            locator_txid_map (:obj:`dict`): the dictionary of locators (locator:txid) derived from a list of transaction
-                ids.
+            locator_txid_map (:obj:`dict`): the dictionary of binary locators (locator:txid) derived from a list of
+                transaction ids. The dictionary is stored as is, so it must not be modified afterwards.
         """
 
         with self.rw_lock.gen_wlock():
             self.cache.update(locator_txid_map)
-            self.blocks[block_hash] = list(locator_txid_map.keys())
+            self.blocks[block_hash] = locator_txid_map
             logger.debug("Block added to cache", block_hash=block_hash)
 
-        if self.is_full():
-            self.remove_oldest_block()
+            if len(self.blocks) > self.cache_size:
+                self._remove_oldest_block()
 
     def is_full(self):
-        """  Returns whether the cache is full or not """
+        """Returns whether the cache is full or not"""
         with self.rw_lock.gen_rlock():
             full = len(self.blocks) > self.cache_size
         return full
 
     def remove_oldest_block(self):
-        """ Removes the oldest block from the cache """
+        """Removes the oldest block from the cache"""
         with self.rw_lock.gen_wlock():
-            block_hash, locators = self.blocks.popitem(last=False)
-            for locator in locators:
+            self._remove_oldest_block()
+
+    def _remove_oldest_block(self):
+        """Removes the oldest block from the cache. The write lock must be held by the caller."""
+
+        self._remove_block(next(iter(self.blocks)))
+
+    def _remove_block(self, block_hash):
+        """
+        Removes a given block from the cache. The write lock must be held by the caller.
+
+        Args:
+            block_hash (:obj:`str`): the hash of the block to remove.
+        """
+
+        locator_txid_map = self.blocks.pop(block_hash)
+        for locator, txid in locator_txid_map.items():
+            # Data that has been overwritten by a more recent block is kept
+            if self.cache.get(locator) == txid:
                 del self.cache[locator]
 
         logger.debug("Block removed from cache", block_hash=block_hash)
 
     def fix(self, last_known_block, block_processor):
         """
-        Fixes the cache after a reorg has been detected by feeding the most recent ``cache_size`` blocks to it.
+        Fixes the cache after a reorg has been detected so it covers the most recent ``cache_size`` blocks of the new
+        chain.
+
+        The new chain is walked back until the fork point (the most recent block that is also in the cache) is found,
+        so only the blocks that have been reorged out are dropped and only the new ones are fetched. If the new chain
+        is shorter, older blocks are fetched to fill the cache. If the fork point is deeper than the cache, the whole
+        cache is replaced.
 
         Args:
             last_known_block (:obj:`str`): the last known block hash after the reorg.
             block_processor (:obj:`teos.block_processor.BlockProcessor`): a ``BlockProcessor`` instance.
         """
 
-        tmp_cache = LocatorCache(self.cache_size)
+        # The cache is only modified by the Watcher thread, so the blocks cannot change while the fix is computed
+        with self.rw_lock.gen_rlock():
+            cached_blocks = list(self.blocks)
+            cached_block_hashes = set(cached_blocks)
+
+        new_blocks = OrderedDict()
+        fork_point = None
 
         # We assume there are no reorgs back to genesis. If so, this would raise some log warnings. And the cache will
         # be filled with less than cache_size blocks.
         target_block_hash = last_known_block
-        for _ in range(tmp_cache.cache_size):
+        for _ in range(self.cache_size):
+            if target_block_hash in cached_block_hashes:
+                fork_point = target_block_hash
+                break
+
             target_block = block_processor.get_block(target_block_hash)
-            if target_block:
-                # Compute the locator:txid pair for every transaction in the block and update both the cache and
-                # the block mapping.
-                locator_txid_map = {compute_locator(txid): txid for txid in target_block.get("tx")}
-                tmp_cache.cache.update(locator_txid_map)
-                tmp_cache.blocks[target_block_hash] = list(locator_txid_map.keys())
+            if not target_block:
+                break
+
+            # Compute the locator:txid pair for every transaction in the block
+            new_blocks[target_block_hash] = {compute_binary_locator(txid): txid for txid in target_block.get("tx")}
+            target_block_hash = target_block.get("previousblockhash")
+
+        if fork_point is not None:
+            orphaned_blocks = cached_blocks[cached_blocks.index(fork_point) + 1 :]
+            kept_blocks = len(cached_blocks) - len(orphaned_blocks)
+        else:
+            orphaned_blocks = cached_blocks
+            kept_blocks = 0
+
+        # If the new chain is shorter than the old one, the cache is filled with blocks older than the ones it holds
+        old_blocks = OrderedDict()
+        if fork_point is not None and kept_blocks + len(new_blocks) < self.cache_size:
+            oldest_block = block_processor.get_block(cached_blocks[0])
+            target_block_hash = oldest_block.get("previousblockhash") if oldest_block else None
+
+            for _ in range(self.cache_size - kept_blocks - len(new_blocks)):
+                target_block = block_processor.get_block(target_block_hash) if target_block_hash else None
+                if not target_block:
+                    break
+
+                old_blocks[target_block_hash] = {compute_binary_locator(txid): txid for txid in target_block.get("tx")}
                 target_block_hash = target_block.get("previousblockhash")
 
         with self.rw_lock.gen_wlock():
-            self.blocks = OrderedDict(reversed((list(tmp_cache.blocks.items()))))
-            self.cache = tmp_cache.cache
+            for block_hash in orphaned_blocks:
+                self._remove_block(block_hash)
+
+            # Old blocks go to the bottom of the cache and do not overwrite the data of more recent blocks
+            for block_hash, locator_txid_map in old_blocks.items():
+                self.blocks[block_hash] = locator_txid_map
+                self.blocks.move_to_end(block_hash, last=False)
+                for locator, txid in locator_txid_map.items():
+                    self.cache.setdefault(locator, txid)
+
+            for block_hash, locator_txid_map in reversed(new_blocks.items()):
+                self.cache.update(locator_txid_map)
+                self.blocks[block_hash] = locator_txid_map
+
+            while len(self.blocks) > self.cache_size:
+                self._remove_oldest_block()
+
+        logger.info(
+            "Locator cache fixed",
+            fork_point=fork_point,
+            orphaned_blocks=len(orphaned_blocks),
+            fetched_blocks=len(new_blocks) + len(old_blocks),
+        )
 
 
 class Watcher:
@@ -180,13 +338,16 @@ class Watcher:
         max_appointments (:obj:`int`): the maximum amount of appointments accepted by the ``Watcher`` at the same time.
         blocks_in_cache (:obj:`int`): the number of blocks to keep in cache so recently triggered appointments can be
             covered.
+        decryption_pool (:obj:`Executor`): an optional worker pool used to decrypt the triggered appointments of a
+            block in parallel (see :func:`create_decryption_pool`).
 
     Attributes:
         appointments (:obj:`dict`): a dictionary containing a summary of the appointments (:obj:`ExtendedAppointment
             <teos.extended_appointment.ExtendedAppointment>` instances) accepted by the tower (``locator`` and
             ``user_id``). It's populated trough ``add_appointment``.
         locator_uuid_map (:obj:`dict`): a ``locator:uuid`` map used to allow the :obj:`Watcher` to deal with several
-            appointments with the same ``locator``.
+            appointments with the same ``locator``. Locators are kept in binary (16-byte ``bytes``) here and in
+            ``appointments``, and converted to hex only when interacting with the database or the users.
         block_queue (:obj:`Queue`): A queue used by the :obj:`Watcher` to receive block hashes from ``bitcoind``. It is
         populated by the :obj:`ChainMonitor <teos.chain_monitor.ChainMonitor>`.
         db_manager (:obj:`AppointmentsDBM <teos.appointments_dbm.AppointmentsDBM>`): a ``AppointmentsDBM`` instance
@@ -200,13 +361,25 @@ class Watcher:
         max_appointments (:obj:`int`): the maximum amount of appointments accepted by the ``Watcher`` at the same time.
         last_known_block (:obj:`str`): the last block known by the ``Watcher``.
         locator_cache (:obj:`LocatorCache`): a cache of locators for the last ``blocks_in_cache`` blocks.
+        decryption_pool (:obj:`Executor`): the worker pool used to decrypt breaches. ``None`` if breaches are decrypted
+            serially.
 
     Raises:
         :obj:`InvalidKey <common.exceptions.InvalidKey>`: if teos sk cannot be loaded.
 
     """
 
-    def __init__(self, db_manager, gatekeeper, block_processor, responder, sk_der, max_appointments, blocks_in_cache):
+    def __init__(
+        self,
+        db_manager,
+        gatekeeper,
+        block_processor,
+        responder,
+        sk_der,
+        max_appointments,
+        blocks_in_cache,
+        decryption_pool=None,
+    ):
         self.appointments = dict()
         self.locator_uuid_map = dict()
         self.block_queue = Queue()
@@ -218,6 +391,7 @@ class Watcher:
         self.signing_key = Cryptographer.load_private_key_der(sk_der)
         self.last_known_block = db_manager.load_last_block_hash_watcher()
         self.locator_cache = LocatorCache(blocks_in_cache)
+        self.decryption_pool = decryption_pool
 
     def awake(self):
         """Starts a new thread to monitor the blockchain for channel breaches"""
@@ -258,82 +432,173 @@ class Watcher:
             so the appointment is rejected.
         """
 
-        if len(self.appointments) >= self.max_appointments:
-            message = "Maximum appointments reached, appointment rejected"
-            logger.info(message, locator=appointment.locator)
-            raise AppointmentLimitReached(message)
+        response = self.add_appointments([(appointment, signature)])[0]
 
-        user_id = self.gatekeeper.authenticate_user(appointment.serialize(), signature)
-        # The user_id needs to be added to the ExtendedAppointment once the former has been authenticated
-        appointment.user_id = user_id
+        if isinstance(response, Exception):
+            raise response
 
-        # The uuids are generated as the RIPEMD160(locator||user_pubkey).
-        # If an appointment is requested by the user the uuid can be recomputed and queried straightaway (no maps).
-        uuid = hash_160("{}{}".format(appointment.locator, user_id))
+        return response
+
+    def add_appointments(self, appointments):
+        """
+        Adds a batch of appointments to the ``appointments`` dictionary.
 
-        # If this is a copy of an appointment we've already reacted to, the new appointment is rejected.
-        if uuid in self.responder.trackers:
-            message = "Appointment already in Responder"
-            logger.info(message)
-            raise AppointmentAlreadyTriggered(message)
+        Appointments are processed in order and as in :meth:`add_appointment`, but the slots of all of them are taken
+        at once (with a single record update per user) and they are stored in the database in a single write, before
+        being added to memory. Appointments triggered in the cached blocks are handed to the ``Responder`` one by one,
+        writing all their data in a single unit of work.
 
-        # Add the appointment to the Gatekeeper
-        available_slots = self.gatekeeper.add_update_appointment(user_id, uuid, appointment)
+        Users are kept in their own database, so taking the slots is not part of the appointment writes. Slots are not
+        given back if storing the appointments fails.
+
+        Args:
+            appointments (:obj:`list`): a list of ``(appointment, signature)`` tuples, where ``appointment`` is an
+                :obj:`ExtendedAppointment <teos.extended_appointment.ExtendedAppointment>` and ``signature`` the user's
+                appointment signature (hex-encoded).
+
+        Returns:
+            :obj:`list`: The outcome of every appointment, in the same order. Accepted appointments get the tower
+            response (as in :meth:`add_appointment`), whereas rejected ones get the exception that
+            :meth:`add_appointment` would have raised (:obj:`AppointmentLimitReached`,
+            :obj:`AuthenticationFailure <teos.gatekeeper.AuthenticationFailure>`, :obj:`AppointmentAlreadyTriggered`
+            or :obj:`NotEnoughSlots <teos.gatekeeper.NotEnoughSlots>`).
+        """
+
+        responses = [None] * len(appointments)
+        authenticated_appointments = []
+
+        for i, (appointment, signature) in enumerate(appointments):
+            if len(self.appointments) + len(authenticated_appointments) >= self.max_appointments:
+                message = "Maximum appointments reached, appointment rejected"
+                logger.info(message, locator=appointment.locator)
+                responses[i] = AppointmentLimitReached(message)
+                continue
 
-        # Appointments that were triggered in blocks held in the cache
-        dispute_txid = self.locator_cache.get_txid(appointment.locator)
-        if dispute_txid:
             try:
-                penalty_txid, penalty_rawtx = self.check_breach(uuid, appointment, dispute_txid)
-                receipt = self.responder.handle_breach(
-                    uuid, appointment.locator, dispute_txid, penalty_txid, penalty_rawtx, user_id, self.last_known_block
-                )
+                user_id = self.gatekeeper.authenticate_user(appointment.serialize(), signature)
+            except AuthenticationFailure as e:
+                responses[i] = e
+                continue
+
+            # The user_id needs to be added to the ExtendedAppointment once the former has been authenticated
+            appointment.user_id = user_id
+
+            # The uuids are generated as the RIPEMD160(locator||user_pubkey).
+            # If an appointment is requested by the user the uuid can be recomputed and queried straightaway (no maps).
+            uuid = hash_160("{}{}".format(appointment.locator, user_id))
+
+            # If this is a copy of an appointment we've already reacted to, the new appointment is rejected.
+            if uuid in self.responder.trackers:
+                message = "Appointment already in Responder"
+                logger.info(message)
+                responses[i] = AppointmentAlreadyTriggered(message)
+                continue
+
+            authenticated_appointments.append((i, uuid, appointment))
+
+        # Add the appointments to the Gatekeeper
+        available_slots = self.gatekeeper.add_update_appointments(
+            [(appointment.user_id, uuid, appointment) for _, uuid, appointment in authenticated_appointments]
+        )
 
-                # At this point the appointment is accepted but data is only kept if it goes through the Responder.
-                # Otherwise it is dropped.
-                if receipt.delivered:
-                    self.db_manager.store_watcher_appointment(uuid, appointment.to_dict())
-                    self.db_manager.create_append_locator_map(appointment.locator, uuid)
-                    self.db_manager.create_triggered_appointment_flag(uuid)
+        accepted_appointments = []
+        triggered_appointments = []
+        new_appointments = {}
 
-            except (EncryptionError, InvalidTransactionFormat):
-                # If data inside the encrypted blob is invalid, the appointment is accepted but the data is dropped.
-                # (same as with data that bounces in the Responder). This reduces the appointment slot count so it
-                # could be used to discourage user misbehaviour.
-                pass
+        for (i, uuid, appointment), slots in zip(authenticated_appointments, available_slots):
+            if slots is None:
+                responses[i] = NotEnoughSlots()
+                continue
 
-        # Regular appointments that have not been triggered (or, at least, not recently)
-        else:
+            # Appointments that were triggered in blocks held in the cache (locators are kept in binary in memory)
+            dispute_txid = self.locator_cache.get_txid(bytes.fromhex(appointment.locator))
+            if dispute_txid:
+                triggered_appointments.append((i, uuid, appointment, slots, dispute_txid))
+
+            # Regular appointments that have not been triggered (or, at least, not recently)
+            else:
+                accepted_appointments.append((i, appointment, slots))
+                new_appointments[uuid] = appointment
+
+        # Regular appointments are stored (alongside their locator maps) in a single write, and only added to memory
+        # once it succeeds. The slots are already taken at this point, since users are kept in their own database.
+        if new_appointments:
+            self.db_manager.batch_store_watcher_appointments(
+                {uuid: appointment.to_dict() for uuid, appointment in new_appointments.items()}
+            )
+
+        for uuid, appointment in new_appointments.items():
             self.appointments[uuid] = appointment.get_summary()
+            # The summary and the map share the same (binary) locator object
+            locator = self.appointments[uuid].get("locator")
 
-            if appointment.locator in self.locator_uuid_map:
+            if locator in self.locator_uuid_map:
                 # If the uuid is already in the map it means this is an update.
-                if uuid not in self.locator_uuid_map[appointment.locator]:
-                    self.locator_uuid_map[appointment.locator].append(uuid)
+                if uuid not in self.locator_uuid_map[locator]:
+                    self.locator_uuid_map[locator].append(uuid)
             else:
                 # Otherwise two users have sent an appointment with the same locator, so we need to store both.
-                self.locator_uuid_map[appointment.locator] = [uuid]
+                self.locator_uuid_map[locator] = [uuid]
 
-            self.db_manager.store_watcher_appointment(uuid, appointment.to_dict())
-            self.db_manager.create_append_locator_map(appointment.locator, uuid)
+        for i, uuid, appointment, slots, dispute_txid in triggered_appointments:
+            # A copy of the appointment may have been handed to the Responder earlier in the same batch
+            if uuid in self.responder.trackers:
+                message = "Appointment already in Responder"
+                logger.info(message)
+                responses[i] = AppointmentAlreadyTriggered(message)
+                continue
 
-        try:
-            signature = Cryptographer.sign(appointment.serialize(), self.signing_key)
+            accepted_appointments.append((i, appointment, slots))
 
-        except (InvalidParameter, SignatureError):
-            # This should never happen since data is sanitized, just in case to avoid a crash
-            logger.error("Data couldn't be signed", appointment=appointment.to_dict())
-            signature = None
+            try:
+                penalty_txid, penalty_rawtx = self.check_breach(uuid, appointment, dispute_txid)
 
-        logger.info("New appointment accepted", locator=appointment.locator)
+                # The tracker, the appointment, its locator map and its triggered flag are written at once. The penalty
+                # is broadcast by then, so the Responder keeps the tracker in memory either way.
+                with self.db_manager.unit_of_work():
+                    receipt = self.responder.handle_breach(
+                        uuid,
+                        appointment.locator,
+                        dispute_txid,
+                        penalty_txid,
+                        penalty_rawtx,
+                        appointment.user_id,
+                        self.last_known_block,
+                    )
 
-        return {
-            "locator": appointment.locator,
-            "start_block": self.last_known_block,
-            "signature": signature,
-            "available_slots": available_slots,
-            "subscription_expiry": self.gatekeeper.registered_users[user_id].subscription_expiry,
-        }
+                    # At this point the appointment is accepted but data is only kept if it goes through the Responder.
+                    # Otherwise it is dropped.
+                    if receipt.delivered:
+                        self.db_manager.store_watcher_appointment(uuid, appointment.to_dict())
+                        self.db_manager.create_append_locator_map(appointment.locator, uuid)
+                        self.db_manager.create_triggered_appointment_flag(uuid)
+
+            except (EncryptionError, InvalidTransactionFormat):
+                # If data inside the encrypted blob is invalid, the appointment is accepted but the data is dropped.
+                # (same as with data that bounces in the Responder). This reduces the appointment slot count so it
+                # could be used to discourage user misbehaviour.
+                pass
+
+        for i, appointment, slots in accepted_appointments:
+            try:
+                signature = Cryptographer.sign(appointment.serialize(), self.signing_key)
+
+            except (InvalidParameter, SignatureError):
+                # This should never happen since data is sanitized, just in case to avoid a crash
+                logger.error("Data couldn't be signed", appointment=appointment.to_dict())
+                signature = None
+
+            logger.info("New appointment accepted", locator=appointment.locator)
+
+            responses[i] = {
+                "locator": appointment.locator,
+                "start_block": self.last_known_block,
+                "signature": signature,
+                "available_slots": slots,
+                "subscription_expiry": self.gatekeeper.registered_users[appointment.user_id].subscription_expiry,
+            }
+
+        return responses
 
     def do_watch(self):
         """
@@ -362,7 +627,7 @@ class Watcher:
 
             txids = block.get("tx")
             # Compute the locator for every transaction in the block and add them to the cache
-            locator_txid_map = {compute_locator(txid): txid for txid in txids}
+            locator_txid_map = {compute_binary_locator(txid): txid for txid in txids}
             self.locator_cache.update(block_hash, locator_txid_map)
 
             if len(self.appointments) > 0 and locator_txid_map:
@@ -439,20 +704,20 @@ class Watcher:
         Gets a dictionary of channel breaches given a map of locator:dispute_txid.
 
         Args:
-            locator_txid_map (:obj:`dict`): the dictionary of locators (locator:txid) derived from a list of
+            locator_txid_map (:obj:`dict`): the dictionary of binary locators (locator:txid) derived from a list of
                 transaction ids.
 
         Returns:
-            :obj:`dict`: A dictionary (``locator:txid``) with all the breaches found. An empty dictionary if none are
-            found.
+            :obj:`dict`: A dictionary (``locator:txid``, with binary locators) with all the breaches found. An empty
+            dictionary if none are found.
         """
 
-        # Check is any of the tx_ids in the received block is an actual match
-        intersection = set(self.locator_uuid_map.keys()).intersection(locator_txid_map.keys())
-        breaches = {locator: locator_txid_map[locator] for locator in intersection}
+        # Check is any of the tx_ids in the received block is an actual match. Block locators are looked up in the map
+        # (and not the other way round) so the cost depends on the block size and not on the number of appointments
+        breaches = {locator: txid for locator, txid in locator_txid_map.items() if locator in self.locator_uuid_map}
 
         if len(breaches) > 0:
-            logger.info("List of breaches", breaches=breaches)
+            logger.info("List of breaches", breaches={locator.hex(): txid for locator, txid in breaches.items()})
 
         else:
             logger.info("No breaches found")
@@ -477,13 +742,14 @@ class Watcher:
             :obj:`InvalidTransactionFormat`: If the decrypted data does not have a valid transaction format.
         """
 
-        try:
-            penalty_rawtx = Cryptographer.decrypt(appointment.encrypted_blob, dispute_txid)
-            penalty_tx = self.block_processor.decode_raw_transaction(penalty_rawtx)
+        penalty_rawtx = decrypt_blob(appointment.encrypted_blob, dispute_txid)
 
-        except EncryptionError as e:
+        if penalty_rawtx is None:
             logger.info("Transaction cannot be decrypted", uuid=uuid)
-            raise e
+            raise EncryptionError("Cannot decrypt blob with the provided key", uuid=uuid)
+
+        try:
+            penalty_tx = self.block_processor.decode_raw_transaction(penalty_rawtx)
 
         except InvalidTransactionFormat as e:
             logger.info("The breach contained an invalid transaction", uuid=uuid)
@@ -502,8 +768,12 @@ class Watcher:
         The :obj:`Watcher` cannot know if an ``encrypted_blob`` contains a valid transaction until a breach is seen.
         Blobs that contain arbitrary data are dropped and not sent to the :obj:`Responder <teos.responder.Responder>`.
 
+        Breaches are checked in three stages: the triggered appointments are loaded from the database at once, their
+        blobs are decrypted, and the resulting penalties are decoded (in-process, or using a single batched request to
+        ``bitcoind`` if local decoding is disabled). The time taken by each stage is logged.
+
         Args:
-            breaches (:obj:`dict`): a dictionary containing channel breaches (``locator:txid``).
+            breaches (:obj:`dict`): a dictionary containing channel breaches (``locator:txid``, with binary locators).
 
         Returns:
             :obj:`tuple`: A dictionary and a list. The former contains the valid breaches, while the latter contain the
@@ -517,34 +787,110 @@ class Watcher:
         valid_breaches = {}
         invalid_breaches = []
 
-        # A cache of the already decrypted blobs so replicate decryption can be avoided
-        decrypted_blobs = {}
+        # Stage 1: load all the triggered appointments at once
+        load_start = time()
+        uuids = [uuid for locator in breaches for uuid in self.locator_uuid_map[locator]]
+        appointments_data = self.db_manager.batch_load_watcher_appointments(uuids)
 
+        triggered_appointments = {}
         for locator, dispute_txid in breaches.items():
             for uuid in self.locator_uuid_map[locator]:
-                appointment = ExtendedAppointment.from_dict(self.db_manager.load_watcher_appointment(uuid))
-
-                if appointment.encrypted_blob in decrypted_blobs:
-                    penalty_txid, penalty_rawtx = decrypted_blobs[appointment.encrypted_blob]
-                    valid_breaches[uuid] = {
-                        "locator": appointment.locator,
-                        "dispute_txid": dispute_txid,
-                        "penalty_txid": penalty_txid,
-                        "penalty_rawtx": penalty_rawtx,
-                    }
-
-                else:
-                    try:
-                        penalty_txid, penalty_rawtx = self.check_breach(uuid, appointment, dispute_txid)
-                        valid_breaches[uuid] = {
-                            "locator": appointment.locator,
-                            "dispute_txid": dispute_txid,
-                            "penalty_txid": penalty_txid,
-                            "penalty_rawtx": penalty_rawtx,
-                        }
-                        decrypted_blobs[appointment.encrypted_blob] = (penalty_txid, penalty_rawtx)
-
-                    except (EncryptionError, InvalidTransactionFormat):
-                        invalid_breaches.append(uuid)
+                data = appointments_data.get(uuid)
+                appointment = ExtendedAppointment.from_dict(data) if data is not None else None
+                triggered_appointments[uuid] = (appointment, dispute_txid)
+
+        # Stage 2: decrypt the blobs
+        decrypt_start = time()
+        decrypted_blobs = self.decrypt_breaches(triggered_appointments.values(), self.decryption_pool)
+
+        # Stage 3: decode all the decrypted penalties at once
+        decode_start = time()
+        penalty_txs = self.block_processor.decode_raw_transactions(
+            [penalty_rawtx for penalty_rawtx in decrypted_blobs.values() if penalty_rawtx is not None]
+        )
+        decode_end = time()
+
+        for uuid, (appointment, dispute_txid) in triggered_appointments.items():
+            if appointment is None:
+                logger.error("Triggered appointment not found in the db", uuid=uuid)
+                invalid_breaches.append(uuid)
+                continue
+
+            penalty_rawtx = decrypted_blobs.get((appointment.encrypted_blob, dispute_txid))
+            if penalty_rawtx is None:
+                logger.info("Transaction cannot be decrypted", uuid=uuid)
+                invalid_breaches.append(uuid)
+                continue
+
+            penalty_tx = penalty_txs.get(penalty_rawtx)
+            if penalty_tx is None:
+                logger.info("The breach contained an invalid transaction", uuid=uuid)
+                invalid_breaches.append(uuid)
+                continue
+
+            logger.info(
+                "Breach found for locator", locator=appointment.locator, uuid=uuid, penalty_txid=penalty_tx.get("txid")
+            )
+
+            valid_breaches[uuid] = {
+                "locator": appointment.locator,
+                "dispute_txid": dispute_txid,
+                "penalty_txid": penalty_tx.get("txid"),
+                "penalty_rawtx": penalty_rawtx,
+            }
+
+        if triggered_appointments:
+            logger.info(
+                "Breaches filtered",
+                appointments=len(triggered_appointments),
+                load_time="{:.6f}".format(decrypt_start - load_start),
+                decrypt_time="{:.6f}".format(decode_start - decrypt_start),
+                decode_time="{:.6f}".format(decode_end - decode_start),
+            )
 
         return valid_breaches, invalid_breaches
+
+    @staticmethod
+    def decrypt_breaches(triggered_appointments, decryption_pool=None):
+        """
+        Decrypts the ``encrypted_blob`` of a list of triggered appointments. Every distinct blob is only decrypted once
+        per ``dispute_txid`` (the decryption key), so the same blob triggered by different transactions is decrypted
+        with every one of them.
+
+        If a ``decryption_pool`` is provided and there are enough blobs (``MIN_PARALLEL_DECRYPTIONS``), the blobs are
+        decrypted by the pool workers. The result does not depend on whether a pool is used or not.
+
+        Args:
+            triggered_appointments (:obj:`list`): a list of ``(appointment, dispute_txid)`` tuples, where
+                ``appointment`` is an :obj:`ExtendedAppointment <teos.extended_appointment.ExtendedAppointment>` (or
+                ``None`` if it could not be loaded) and ``dispute_txid`` the id of the transaction that triggered it.
+            decryption_pool (:obj:`Executor`): an optional worker pool to decrypt the blobs in parallel.
+
+        Returns:
+            :obj:`dict`: A dictionary of decrypted blobs (``(encrypted_blob, dispute_txid):penalty_rawtx``). Blobs that
+            cannot be decrypted are set to ``None``.
+        """
+
+        # Replicate blobs are only decrypted once per key
+        blobs_to_decrypt = list(
+            dict.fromkeys(
+                (appointment.encrypted_blob, dispute_txid)
+                for appointment, dispute_txid in triggered_appointments
+                if appointment is not None
+            )
+        )
+
+        encrypted_blobs = [encrypted_blob for encrypted_blob, _ in blobs_to_decrypt]
+        dispute_txids = [dispute_txid for _, dispute_txid in blobs_to_decrypt]
+
+        if decryption_pool is not None and len(encrypted_blobs) >= MIN_PARALLEL_DECRYPTIONS:
+            # map returns the results in order, so they can be zipped back with the blobs
+            penalty_rawtxs = decryption_pool.map(
+                decrypt_blob, encrypted_blobs, dispute_txids, chunksize=DECRYPTION_CHUNK_SIZE
+            )
+        else:
+            penalty_rawtxs = map(decrypt_blob, encrypted_blobs, dispute_txids)
+
+        decrypted_blobs = dict(zip(blobs_to_decrypt, penalty_rawtxs))
+
+        return decrypted_blobs
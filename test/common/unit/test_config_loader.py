@@ -257,3 +257,33 @@ def test_extend_paths():
     conf_loader.extend_paths()
 
     assert conf_loader.conf_fields["ABSOLUTE_PATH"]["value"] == absolute_path
+
+
+def test_build_conf_bool():
+    # Bool fields can be set in the config file using any of the values supported by ConfigParser
+    default_conf_copy = deepcopy(DEFAULT_CONF)
+    default_conf_copy["FOO_BOOL"] = {"value": True, "type": bool}
+    bool_data_dir = "test_bool_data_dir/"
+    os.mkdir(bool_data_dir)
+
+    try:
+        for value, expected in [("false", False), ("no", False), ("0", False), ("on", True), ("True", True)]:
+            config_parser = ConfigParser()
+            config_parser["foo_section"] = {"FOO_BOOL": value}
+            with open(bool_data_dir + conf_file_name, "w") as fout:
+                config_parser.write(fout)
+
+            config = ConfigLoader(bool_data_dir, conf_file_name, deepcopy(default_conf_copy), {}).build_config()
+            assert config.get("FOO_BOOL") is expected
+
+        # Anything else is rejected
+        config_parser = ConfigParser()
+        config_parser["foo_section"] = {"FOO_BOOL": "foo"}
+        with open(bool_data_dir + conf_file_name, "w") as fout:
+            config_parser.write(fout)
+
+        with pytest.raises(ValueError):
+            ConfigLoader(bool_data_dir, conf_file_name, deepcopy(default_conf_copy), {}).build_config()
+
+    finally:
+        shutil.rmtree(bool_data_dir)
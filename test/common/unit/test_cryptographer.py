@@ -101,6 +101,31 @@ def test_decrypt():
     assert Cryptographer.decrypt(encrypted_data, key) == data
 
 
+def test_encrypt_bytes():
+    # The bytes API must match the hex one
+    assert Cryptographer.encrypt_bytes(bytes.fromhex(data), bytes.fromhex(key)) == bytes.fromhex(encrypted_data)
+
+    # Any bytes-like object is accepted
+    encrypted_blob = Cryptographer.encrypt_bytes(memoryview(bytes.fromhex(data)), bytearray.fromhex(key))
+    assert encrypted_blob == bytes.fromhex(encrypted_data)
+
+
+def test_decrypt_bytes():
+    assert Cryptographer.decrypt_bytes(bytes.fromhex(encrypted_data), bytes.fromhex(key)) == bytes.fromhex(data)
+
+    # Any bytes-like object is accepted
+    decrypted_blob = Cryptographer.decrypt_bytes(memoryview(bytes.fromhex(encrypted_data)), bytearray.fromhex(key))
+    assert decrypted_blob == bytes.fromhex(data)
+
+
+def test_decrypt_bytes_invalid_tag():
+    random_key = os.urandom(32)
+    random_encrypted_blob = os.urandom(64)
+
+    with pytest.raises(EncryptionError, match="Cannot decrypt blob with the provided key"):
+        Cryptographer.decrypt_bytes(random_encrypted_blob, random_key)
+
+
 def test_load_key_file():
     dummy_sk = ec.generate_private_key(ec.SECP256K1, default_backend())
     dummy_sk_der = dummy_sk.private_bytes(
@@ -1,6 +1,7 @@
 import os
 import shutil
 import pytest
+from threading import Thread
 
 from common.db_manager import DBManager
 from test.common.unit.conftest import get_random_value_hex
@@ -123,3 +124,155 @@ def test_delete_entry(db_manager):
 
     with pytest.raises(TypeError):
         db_manager.delete_entry(get_random_value_hex(16), prefix=1)
+
+
+def test_unit_of_work(db_manager):
+    key = get_random_value_hex(16)
+    value = get_random_value_hex(32)
+    deleted_key = get_random_value_hex(16)
+    db_manager.create_entry(deleted_key, value)
+
+    with db_manager.unit_of_work():
+        db_manager.create_entry(key, value)
+        db_manager.delete_entry(deleted_key)
+
+        # Writes are not applied until the unit of work is over, but reads through the manager already see them
+        assert db_manager.db.get(key.encode("utf-8")) is None
+        assert db_manager.db.get(deleted_key.encode("utf-8")) is not None
+        assert db_manager.load_entry(key).decode("utf-8") == value
+        assert db_manager.load_entry(deleted_key) is None
+
+    assert db_manager.db.get(key.encode("utf-8")).decode("utf-8") == value
+    assert db_manager.db.get(deleted_key.encode("utf-8")) is None
+
+    # Writes are back to the db once the unit of work is over
+    assert db_manager.writer is db_manager.db
+
+
+def test_unit_of_work_exception(db_manager):
+    key = get_random_value_hex(16)
+    value = get_random_value_hex(32)
+
+    # Nothing is written if the unit of work fails
+    with pytest.raises(ValueError):
+        with db_manager.unit_of_work():
+            db_manager.create_entry(key, value)
+            raise ValueError()
+
+    assert db_manager.db.get(key.encode("utf-8")) is None
+    assert db_manager.writer is db_manager.db
+
+    # The same applies to wrong formatted writes
+    with pytest.raises(TypeError):
+        with db_manager.unit_of_work():
+            db_manager.create_entry(key, value)
+            db_manager.create_entry(None, value)
+
+    assert db_manager.db.get(key.encode("utf-8")) is None
+
+
+def test_unit_of_work_nested(db_manager):
+    key = get_random_value_hex(16)
+    value = get_random_value_hex(32)
+    other_key = get_random_value_hex(16)
+
+    # Nested units of work are merged into the outer one
+    with db_manager.unit_of_work() as outer:
+        with db_manager.unit_of_work() as inner:
+            assert inner is outer
+            db_manager.create_entry(key, value)
+
+        assert db_manager.db.get(key.encode("utf-8")) is None
+
+        # Transactional write batches within the unit are only merged if they succeed
+        with pytest.raises(TypeError):
+            with db_manager.writer.write_batch(transaction=True) as b:
+                b.put(other_key.encode("utf-8"), value.encode("utf-8"))
+                b.put(None, value.encode("utf-8"))
+
+        assert db_manager.load_entry(other_key) is None
+
+        with db_manager.writer.write_batch(transaction=True) as b:
+            b.put(other_key.encode("utf-8"), value.encode("utf-8"))
+
+        assert db_manager.load_entry(other_key).decode("utf-8") == value
+
+    assert db_manager.db.get(key.encode("utf-8")).decode("utf-8") == value
+    assert db_manager.db.get(other_key.encode("utf-8")).decode("utf-8") == value
+
+
+def test_unit_of_work_iterator(db_manager):
+    prefix = get_random_value_hex(8)
+    keys = sorted(prefix + get_random_value_hex(16) for _ in range(4))
+    value = get_random_value_hex(32)
+
+    for key in keys[:2]:
+        db_manager.create_entry(key, value)
+
+    with db_manager.unit_of_work():
+        # Iterating within the unit includes the pending writes, and skips the pending deletions
+        db_manager.create_entry(keys[2], value)
+        db_manager.create_entry(keys[3], value)
+        db_manager.delete_entry(keys[0])
+
+        pending_keys = [
+            k.decode("utf-8") for k in db_manager.writer.iterator(prefix=prefix.encode("utf-8"), include_value=False)
+        ]
+        assert pending_keys == keys[1:]
+        assert list(db_manager.writer.iterator(prefix=keys[1].encode("utf-8"))) == [
+            (keys[1].encode("utf-8"), value.encode("utf-8"))
+        ]
+
+        # Write batches within the unit see them too
+        with db_manager.writer.write_batch() as b:
+            for k in b.iterator(prefix=prefix.encode("utf-8"), include_value=False):
+                b.delete(k)
+
+        assert list(db_manager.writer.iterator(prefix=prefix.encode("utf-8"))) == []
+
+    assert list(db_manager.db.iterator(prefix=prefix.encode("utf-8"))) == []
+
+
+def test_unit_of_work_threads(db_manager):
+    key = get_random_value_hex(16)
+    value = get_random_value_hex(32)
+    other_key = get_random_value_hex(16)
+
+    # Units of work are kept per thread, so writes from other threads go straight to the db
+    with db_manager.unit_of_work():
+        db_manager.create_entry(key, value)
+
+        t = Thread(target=db_manager.create_entry, args=[other_key, value])
+        t.start()
+        t.join()
+
+        assert db_manager.db.get(other_key.encode("utf-8")).decode("utf-8") == value
+        assert db_manager.db.get(key.encode("utf-8")) is None
+
+    assert db_manager.db.get(key.encode("utf-8")).decode("utf-8") == value
+
+
+def test_unit_of_work_sync(db_manager):
+    batch_kwargs = []
+    write_batch = db_manager.db.write_batch
+
+    class DBWrapper:
+        def __getattr__(self, name):
+            return getattr(db_manager.db, name)
+
+        def write_batch(self, **kwargs):
+            batch_kwargs.append(kwargs)
+            return write_batch(**kwargs)
+
+    manager = DBManager.__new__(DBManager)
+    manager.db = DBWrapper()
+    manager.units_of_work = db_manager.units_of_work
+
+    key = get_random_value_hex(16)
+    with manager.unit_of_work(sync=True):
+        manager.create_entry(key, get_random_value_hex(32))
+        manager.create_entry(get_random_value_hex(16), get_random_value_hex(32))
+
+    # All the writes go in a single (synced) batch
+    assert batch_kwargs == [{"transaction": True, "sync": True}]
+    assert db_manager.db.get(key.encode("utf-8")) is not None
@@ -7,6 +7,7 @@ from common.tools import (
     is_256b_hex_str,
     is_locator,
     compute_locator,
+    compute_binary_locator,
     setup_data_folder,
     setup_logging,
 )
@@ -82,6 +83,15 @@ def test_compute_locator():
         assert is_locator(compute_locator(get_random_value_hex(i))) is False
 
 
+def test_compute_binary_locator():
+    for _ in range(100):
+        txid = get_random_value_hex(32)
+        locator = compute_binary_locator(txid)
+
+        assert isinstance(locator, bytes) and len(locator) == LOCATOR_LEN_BYTES
+        assert locator.hex() == compute_locator(txid)
+
+
 def test_setup_data_folder():
     # This method should create a folder if it does not exist, and do nothing otherwise
     test_folder = "test_folder"
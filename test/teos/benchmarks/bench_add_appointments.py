@@ -0,0 +1,123 @@
+"""
+Benchmarks the throughput (appointments/sec) of sending appointments to the tower one per request (``/add_appointment``)
+and in batches (``/add_appointments``), for different batch sizes. The database and user record writes are counted
+alongside, since batches update them once per request instead of once per appointment.
+
+The API is served as by ``teosd`` (``waitress``) and the chain tip is kept fresh, so no ``bitcoind`` is needed.
+
+Run from the repository root: ``python -m test.teos.benchmarks.bench_add_appointments``
+"""
+
+import os
+import logging
+from time import sleep
+from threading import Thread
+from shutil import rmtree
+from tempfile import mkdtemp
+from coincurve import PrivateKey
+from waitress.server import create_server
+
+from teos.api import API
+from teos.watcher import Watcher
+from teos.inspector import Inspector
+from teos.responder import Responder
+from teos.gatekeeper import Gatekeeper
+from teos.users_dbm import UsersDBM
+from teos.appointments_dbm import AppointmentsDBM
+
+from common.cryptographer import Cryptographer
+
+from test.teos.benchmarks.bench_api_load import HOST, MockedBlockProcessor, build_requests, run_load
+
+PORT = 9835
+APPOINTMENTS = 2000
+BATCH_SIZES = [10, 100]
+
+
+class CountingWriteBatch:
+    def __init__(self, write_batch, counter):
+        self.write_batch = write_batch
+        self.counter = counter
+
+    def __enter__(self):
+        self.counter["writes"] += 1
+        return self.write_batch.__enter__()
+
+    def __exit__(self, *args):
+        return self.write_batch.__exit__(*args)
+
+
+class CountingDB:
+    """Wraps a LevelDB handler counting the writes (single puts and write batches)."""
+
+    def __init__(self, db):
+        self.db = db
+        self.counter = {"writes": 0}
+
+    def put(self, *args, **kwargs):
+        self.counter["writes"] += 1
+        return self.db.put(*args, **kwargs)
+
+    def write_batch(self, *args, **kwargs):
+        return CountingWriteBatch(self.db.write_batch(*args, **kwargs), self.counter)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+def main():
+    logging.getLogger("waitress").setLevel(logging.ERROR)
+
+    db_path = mkdtemp()
+    user_sk = PrivateKey()
+    user_id = Cryptographer.get_compressed_pk(user_sk.public_key)
+
+    try:
+        block_processor = MockedBlockProcessor(0.005)
+        block_processor.chain_tip.update(os.urandom(32).hex(), 100)
+        db_manager = AppointmentsDBM(os.path.join(db_path, "appointments"))
+        user_db = UsersDBM(os.path.join(db_path, "users"))
+        db_manager.db, user_db.db = CountingDB(db_manager.db), CountingDB(user_db.db)
+
+        gatekeeper = Gatekeeper(user_db, block_processor, 10**6, 4320, 6)
+        gatekeeper.add_update_user(user_id)
+        responder = Responder(db_manager, gatekeeper, None, block_processor)
+        watcher = Watcher(db_manager, gatekeeper, block_processor, responder, PrivateKey().to_der(), 10**7, 6)
+        api = API(HOST, PORT, Inspector(block_processor, 20), watcher)
+        Thread(target=create_server(api.app, host=HOST, port=PORT, threads=8).run, daemon=True).start()
+        sleep(0.5)
+
+        print("Adding {} appointments".format(APPOINTMENTS))
+        print("{:>16} | {:>14} | {:>12} | {:>12}".format("endpoint", "appointments/s", "db writes", "user writes"))
+
+        for batch_size in [1] + BATCH_SIZES:
+            appointments_data = build_requests(user_sk, APPOINTMENTS)
+            db_writes, user_writes = db_manager.db.counter["writes"], user_db.db.counter["writes"]
+
+            if batch_size == 1:
+                name = "add_appointment"
+                throughput, _, _ = run_load(PORT, appointments_data)
+
+            else:
+                name = "batch of {}".format(batch_size)
+                batches = [
+                    {"appointments": appointments_data[i : i + batch_size]} for i in range(0, APPOINTMENTS, batch_size)
+                ]
+                throughput, _, _ = run_load(PORT, batches, endpoint="add_appointments")
+                throughput *= batch_size
+
+            print(
+                "{:>16} | {:>14.0f} | {:>12} | {:>12}".format(
+                    name,
+                    throughput,
+                    db_manager.db.counter["writes"] - db_writes,
+                    user_db.db.counter["writes"] - user_writes,
+                )
+            )
+
+    finally:
+        rmtree(db_path)
+
+
+if __name__ == "__main__":
+    main()
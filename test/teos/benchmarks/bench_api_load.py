@@ -0,0 +1,147 @@
+"""
+Benchmarks the throughput (requests/sec) and the latency (p50 and p99) of ``/add_appointment`` under concurrent load,
+serving the API with ``werkzeug``'s development server (the one behind ``app.run``, the former approach) and with
+``waitress`` (the current one), for different numbers of worker threads. Finally, the height is read from a fresh
+chain tip (as kept by the ``ChainMonitor``) instead of queried to ``bitcoind`` for every request.
+
+The whole ``add_appointment`` path is run (inspection, authentication, slot accounting, database writes and signing).
+No ``bitcoind`` is needed: ``getblockcount`` is served by a mocked ``BlockProcessor`` that adds a fixed latency to every
+call.
+
+Run from the repository root: ``python -m test.teos.benchmarks.bench_api_load [latency_ms]``
+"""
+
+import os
+import logging
+import sys
+import requests
+from time import time, sleep
+from threading import Thread, local
+from shutil import rmtree
+from tempfile import mkdtemp
+from coincurve import PrivateKey
+from waitress.server import create_server
+from werkzeug.serving import make_server
+from concurrent.futures import ThreadPoolExecutor
+
+from teos.api import API
+from teos.watcher import Watcher
+from teos.inspector import Inspector
+from teos.block_processor import BlockProcessor, ChainTip
+from teos.responder import Responder
+from teos.gatekeeper import Gatekeeper
+from teos.users_dbm import UsersDBM
+from teos.appointments_dbm import AppointmentsDBM
+
+from common.appointment import Appointment
+from common.cryptographer import Cryptographer
+
+HOST = "localhost"
+PORT = 9815
+REQUESTS = 2000
+CLIENTS = 16
+API_WORKERS = [4, 8, 16]
+
+
+class MockedBlockProcessor:
+    get_tip_height = BlockProcessor.get_tip_height
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.chain_tip = ChainTip()
+
+    def get_block_count(self):
+        sleep(self.latency)
+        return 100
+
+
+def build_requests(user_sk, n):
+    requests_data = []
+    for _ in range(n):
+        appointment = Appointment(os.urandom(16).hex(), 20, os.urandom(100).hex())
+        requests_data.append(
+            {"appointment": appointment.to_dict(), "signature": Cryptographer.sign(appointment.serialize(), user_sk)}
+        )
+
+    return requests_data
+
+
+def run_load(port, requests_data, endpoint="add_appointment"):
+    url = "http://{}:{}/{}".format(HOST, port, endpoint)
+    clients_data = local()
+
+    def post(request_data):
+        # One keep-alive session per client thread
+        if not hasattr(clients_data, "session"):
+            clients_data.session = requests.Session()
+
+        start = time()
+        r = clients_data.session.post(url, json=request_data)
+        assert r.status_code == 200
+        return time() - start
+
+    start = time()
+    with ThreadPoolExecutor(CLIENTS) as clients:
+        latencies = sorted(clients.map(post, requests_data))
+    elapsed = time() - start
+
+    return len(requests_data) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main(latency):
+    # Access logs are silenced for both servers, as API.start does
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    logging.getLogger("waitress").setLevel(logging.ERROR)
+
+    db_path = mkdtemp()
+    user_sk = PrivateKey()
+    user_id = Cryptographer.get_compressed_pk(user_sk.public_key)
+
+    try:
+        block_processor = MockedBlockProcessor(latency)
+        db_manager = AppointmentsDBM(os.path.join(db_path, "appointments"))
+        gatekeeper = Gatekeeper(UsersDBM(os.path.join(db_path, "users")), block_processor, 10**6, 4320, 6)
+        gatekeeper.add_update_user(user_id)
+        responder = Responder(db_manager, gatekeeper, None, block_processor)
+        watcher = Watcher(db_manager, gatekeeper, block_processor, responder, PrivateKey().to_der(), 10**7, 6)
+        api = API(HOST, PORT, Inspector(block_processor, 20), watcher)
+
+        print(
+            "add_appointment under load ({} requests, {} clients, {}ms per getblockcount)".format(
+                REQUESTS, CLIENTS, latency * 1000
+            )
+        )
+        print("{:>20} | {:>10} | {:>10} | {:>10}".format("server", "req/s", "p50", "p99"))
+
+        # Every server gets its own port and is left running (in a daemon thread) once benchmarked
+        servers = [("werkzeug (app.run)", lambda port: make_server(HOST, port, api.app, threaded=True).serve_forever)]
+        servers.extend(
+            (
+                "waitress {} workers".format(w),
+                lambda port, w=w: create_server(api.app, host=HOST, port=port, threads=w).run,
+            )
+            for w in API_WORKERS
+        )
+
+        for i, (name, build_server) in enumerate(servers):
+            port = PORT + i
+            Thread(target=build_server(port), daemon=True).start()
+            sleep(0.5)
+
+            throughput, p50, p99 = run_load(port, build_requests(user_sk, REQUESTS))
+            print("{:>20} | {:>10.0f} | {:>8.1f}ms | {:>8.1f}ms".format(name, throughput, p50 * 1000, p99 * 1000))
+
+        block_processor.chain_tip.update(os.urandom(32).hex(), 100)
+        port = PORT + len(servers)
+        Thread(target=create_server(api.app, host=HOST, port=port, threads=8).run, daemon=True).start()
+        sleep(0.5)
+
+        throughput, p50, p99 = run_load(port, build_requests(user_sk, REQUESTS))
+        print("{:>20} | {:>10.0f} | {:>8.1f}ms | {:>8.1f}ms".format("+ chain tip", throughput, p50 * 1000, p99 * 1000))
+
+    finally:
+        rmtree(db_path)
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.005)
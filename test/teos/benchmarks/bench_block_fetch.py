@@ -0,0 +1,220 @@
+"""
+Benchmarks the client side cost (latency and peak memory) of getting the data the Watcher needs from a block
+(``hash``, ``height``, ``previousblockhash`` and ``tx``) using:
+
+- ``json``: ``getblock <block_hash>`` (verbosity 1), decoding the json response the same way ``AuthServiceProxy`` does.
+- ``raw``: ``getblockheader <block_hash>`` plus ``getblock <block_hash> 0``, extracting the txids locally and checking
+  them against the header merkle root.
+
+Blocks are synthetic but sized like full mainnet blocks (a mix of legacy and segwit transactions). No ``bitcoind`` is
+needed: the responses are built in-process, so only the client side is measured.
+
+At verbosity 1 ``getblock`` only includes the txids, so the json response is several times smaller than the raw block
+and much cheaper to decode. The raw path is therefore not used by the ``BlockProcessor``. The raw block decoding only
+lives here, to be able to repeat the measurement.
+
+Run from the repository root: ``python -m test.teos.benchmarks.bench_block_fetch``
+"""
+
+import os
+import json
+import struct
+import tracemalloc
+from time import time
+from decimal import Decimal
+
+from common.cryptographer import sha256d
+
+from teos.utils.tx_parser import TxReader
+
+# Number of transactions per block. ~2500 txs with 2 inputs and 2 outputs make ~1.3MB blocks
+BLOCK_TXS = [500, 2500, 5000]
+ROUNDS = 5
+
+
+def compact_size(n):
+    if n < 0xFD:
+        return bytes([n])
+    elif n <= 0xFFFF:
+        return b"\xfd" + struct.pack("<H", n)
+    else:
+        return b"\xfe" + struct.pack("<I", n)
+
+
+def create_transaction(segwit):
+    inputs = b"".join(
+        os.urandom(32) + struct.pack("<I", 0) + compact_size(107) + os.urandom(107) + b"\xff" * 4 for _ in range(2)
+    )
+    outputs = b"".join(struct.pack("<q", 10000) + compact_size(22) + os.urandom(22) for _ in range(2))
+    stripped = struct.pack("<i", 2) + compact_size(2) + inputs + compact_size(2) + outputs + struct.pack("<I", 0)
+
+    if not segwit:
+        return stripped, stripped
+
+    witness = b"".join(
+        compact_size(2) + compact_size(72) + os.urandom(72) + compact_size(33) + os.urandom(33) for _ in range(2)
+    )
+    tx = stripped[:4] + b"\x00\x01" + stripped[4:-4] + witness + stripped[-4:]
+
+    return tx, stripped
+
+
+def compute_merkle_root(txids):
+    hashes = [bytes.fromhex(txid)[::-1] for txid in txids]
+
+    while len(hashes) > 1:
+        if len(hashes) % 2 == 1:
+            hashes.append(hashes[-1])
+
+        hashes = [sha256d(hashes[i] + hashes[i + 1]) for i in range(0, len(hashes), 2)]
+
+    return hashes[0][::-1].hex()
+
+
+def create_block(n_txs):
+    txs = [create_transaction(segwit=i % 2 == 1) for i in range(n_txs)]
+    txids = [sha256d(stripped)[::-1].hex() for _, stripped in txs]
+    merkle_root = bytes.fromhex(compute_merkle_root(txids))[::-1]
+
+    header = struct.pack("<i32s32sIII", 0x20000000, os.urandom(32), merkle_root, 1600000000, 0x170E92AA, 0)
+    raw_block = header + compact_size(n_txs) + b"".join(tx for tx, _ in txs)
+    block_hash = sha256d(header)[::-1].hex()
+
+    header_data = {
+        "hash": block_hash,
+        "confirmations": 1,
+        "height": 650000,
+        "version": 0x20000000,
+        "merkleroot": merkle_root[::-1].hex(),
+        "time": 1600000000,
+        "mediantime": 1599999000,
+        "nonce": 0,
+        "bits": "170e92aa",
+        "difficulty": "19298087186262.61",
+        "chainwork": os.urandom(32).hex(),
+        "nTx": n_txs,
+        "previousblockhash": os.urandom(32).hex(),
+    }
+    block_data = dict(header_data, size=len(raw_block), strippedsize=len(raw_block), weight=4 * len(raw_block))
+    block_data["tx"] = txids
+
+    # Responses as sent by bitcoind (the difficulty is a float, not a string)
+    json_response = json.dumps({"result": block_data, "error": None, "id": 1}).replace('"19298087186262.61"', "1.9e13")
+    header_response = json.dumps({"result": header_data, "error": None, "id": 1})
+    raw_response = json.dumps({"result": raw_block.hex(), "error": None, "id": 1})
+
+    return txids, json_response, header_response, raw_response
+
+
+def read_txid(reader):
+    # Skips over the transaction fields, hashing the stripped serialization (without marker, flag and witness)
+    data = reader.data
+    start = reader.pos
+    reader.read(4)
+
+    n_inputs = reader.read_compact_size()
+    segwit = n_inputs == 0 and reader.read(1)[0] == 1
+    if segwit:
+        n_inputs = reader.read_compact_size()
+
+    for _ in range(n_inputs):
+        # prev_txid | prev_out_index | scriptSig | sequence
+        reader.read(36)
+        reader.read_var_bytes()
+        reader.read(4)
+
+    for _ in range(reader.read_compact_size()):
+        # value | scriptPubKey
+        reader.read(8)
+        reader.read_var_bytes()
+
+    witness_start = reader.pos
+
+    if segwit:
+        for _ in range(n_inputs):
+            for _ in range(reader.read_compact_size()):
+                reader.read_var_bytes()
+
+    witness_end = reader.pos
+    reader.read(4)
+
+    if segwit:
+        stripped = data[start : start + 4] + data[start + 6 : witness_start] + data[witness_end : reader.pos]
+    else:
+        stripped = data[start : reader.pos]
+
+    return sha256d(stripped)[::-1].hex()
+
+
+def decode_raw_block(raw_block, merkle_root):
+    reader = TxReader(bytes.fromhex(raw_block))
+    reader.read(80)
+    txids = [read_txid(reader) for _ in range(reader.read_compact_size())]
+
+    if not reader.at_end() or compute_merkle_root(txids) != merkle_root:
+        raise ValueError("Invalid block")
+
+    return txids
+
+
+def fetch_json(json_response):
+    block = json.loads(json_response, parse_float=Decimal)["result"]
+
+    return block
+
+
+def fetch_raw(header_response, raw_response):
+    block = json.loads(header_response, parse_float=Decimal)["result"]
+    block["tx"] = decode_raw_block(json.loads(raw_response, parse_float=Decimal)["result"], block.get("merkleroot"))
+
+    return block
+
+
+def bench(f, *args):
+    best = None
+
+    for _ in range(ROUNDS):
+        start = time()
+        f(*args)
+        elapsed = time() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    f(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best, peak
+
+
+def main():
+    print("Block fetch client side cost (best of {})".format(ROUNDS))
+    print(
+        "{:>8} | {:>10} | {:>10} | {:>10} | {:>10} | {:>10} | {:>10}".format(
+            "txs", "json size", "raw size", "json time", "raw time", "json mem", "raw mem"
+        )
+    )
+
+    for n_txs in BLOCK_TXS:
+        txids, json_response, header_response, raw_response = create_block(n_txs)
+
+        assert fetch_json(json_response).get("tx") == fetch_raw(header_response, raw_response).get("tx") == txids
+
+        json_time, json_mem = bench(fetch_json, json_response)
+        raw_time, raw_mem = bench(fetch_raw, header_response, raw_response)
+
+        print(
+            "{:>8} | {:>8}kB | {:>8}kB | {:>8.2f}ms | {:>8.2f}ms | {:>8}kB | {:>8}kB".format(
+                n_txs,
+                len(json_response) // 1000,
+                (len(header_response) + len(raw_response)) // 1000,
+                json_time * 1000,
+                raw_time * 1000,
+                json_mem // 1000,
+                raw_mem // 1000,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmarks the time needed to catch up with the chain after some downtime and to fill a 144-block ``LocatorCache``.
+
+Catching up is timed the way ``teosd`` does it: the missed blocks are found (``get_missed_blocks``) and fed to a
+component (``Builder.populate_block_queue``) that gets every block from the ``BlockProcessor``, like the ``Watcher``
+does. The former approach walks the chain back one ``getblock`` at a time and lets the component fetch every block
+itself. The current one resolves the hashes by height (batched ``getblockhash``) and prefetches the following blocks
+into the block cache while the component processes the current one. The ``LocatorCache`` is filled walking the chain
+back (former) or using ``get_previous_blocks`` (current, blocks fetched concurrently).
+
+No ``bitcoind`` is needed: the chain is served in-process by a fake ``bitcoind`` that adds a fixed latency to every
+request (and batch).
+
+Run from the repository root: ``python -m test.teos.benchmarks.bench_block_prefetch [latency_ms]``
+"""
+
+import os
+import sys
+from queue import Queue
+from threading import Thread
+from time import time, sleep
+
+import teos.tools
+import teos.block_processor
+from teos.builder import Builder
+from teos.block_processor import BlockProcessor
+
+MISSED_BLOCKS = [144, 1000]
+CACHE_BLOCKS = 144
+PREFETCH_WORKERS = [4, 16]
+
+
+class FakeMethod:
+    def __init__(self, bitcoind, name):
+        self.bitcoind = bitcoind
+        self.name = name
+
+    def __call__(self, *params):
+        sleep(self.bitcoind.latency)
+        return self.bitcoind.handle(self.name, params)
+
+    def get_request(self, *params):
+        return {"method": self.name, "params": list(params)}
+
+
+class FakeBitcoind:
+    def __init__(self, n_blocks, latency):
+        self.latency = latency
+        self.chain = []
+        self.blocks = {}
+
+        prev_block_hash = None
+        for height in range(n_blocks):
+            block_hash = os.urandom(32).hex()
+            txs = [os.urandom(32).hex() for _ in range(10)]
+            self.blocks[block_hash] = {
+                "hash": block_hash,
+                "height": height,
+                "previousblockhash": prev_block_hash,
+                "confirmations": n_blocks - height,
+                "tx": txs,
+            }
+            self.chain.append(block_hash)
+            prev_block_hash = block_hash
+
+    def handle(self, method, params):
+        if method == "getblock":
+            return dict(self.blocks.get(params[0]))
+        elif method == "getblockhash":
+            return self.chain[params[0]]
+        elif method == "getbestblockhash":
+            return self.chain[-1]
+
+    def batch(self, requests):
+        sleep(self.latency)
+        return [
+            {"id": request["id"], "result": self.handle(request["method"], request["params"]), "error": None}
+            for request in requests
+        ]
+
+    def __getattr__(self, name):
+        return FakeMethod(self, name)
+
+
+def walk_back(block_processor, block_hash, stop_hash=None, n=None):
+    """The former approach: one getblock per block, since each step needs the previous hash."""
+
+    blocks = []
+    while block_hash != stop_hash and (n is None or len(blocks) < n):
+        block = block_processor.get_block(block_hash)
+        blocks.append(block)
+        block_hash = block.get("previousblockhash")
+
+    return blocks[::-1]
+
+
+def process_blocks(block_processor, missed_blocks, prefetch):
+    """Feeds the missed blocks to a component that gets them from the block processor, returning the blocks it got."""
+
+    blocks = []
+    block_queue = Queue()
+
+    def do_watch():
+        while True:
+            block_hash = block_queue.get()
+            blocks.append(block_processor.get_block(block_hash))
+            block_queue.task_done()
+
+    Thread(target=do_watch, daemon=True).start()
+    Builder.populate_block_queue(block_queue, missed_blocks, block_processor if prefetch else None)
+    block_queue.join()
+
+    return blocks
+
+
+def former_catch_up(block_processor, tip_hash, last_known_block_hash):
+    """The former approach: missed hashes walking back the chain, then every block is fetched by the component."""
+
+    missed_blocks = [block.get("hash") for block in walk_back(block_processor, tip_hash, last_known_block_hash)]
+    return process_blocks(block_processor, missed_blocks, prefetch=False)
+
+
+def catch_up(block_processor, last_known_block_hash):
+    """The current approach: missed hashes by height, then the blocks are prefetched ahead of the component."""
+
+    return process_blocks(block_processor, block_processor.get_missed_blocks(last_known_block_hash), prefetch=True)
+
+
+def timed(f, *args, **kwargs):
+    start = time()
+    result = f(*args, **kwargs)
+    return time() - start, result
+
+
+def main(latency):
+    print("Block prefetch ({}ms of latency per request)".format(latency * 1000))
+    print(
+        "{:>20} | {:>10} | ".format("task", "serial")
+        + " | ".join("{:>10}".format("{} workers".format(w)) for w in PREFETCH_WORKERS)
+    )
+
+    for n in MISSED_BLOCKS:
+        bitcoind = FakeBitcoind(n + CACHE_BLOCKS, latency)
+        teos.tools.bitcoin_cli = teos.block_processor.bitcoin_cli = lambda _: bitcoind
+        last_known_block_hash = bitcoind.chain[-n - 1]
+
+        serial_time, serial_blocks = timed(
+            former_catch_up, BlockProcessor({}, block_cache_size=0), bitcoind.chain[-1], last_known_block_hash
+        )
+        row = []
+        for workers in PREFETCH_WORKERS:
+            elapsed, blocks = timed(catch_up, BlockProcessor({}, prefetch_workers=workers), last_known_block_hash)
+            assert blocks == serial_blocks
+            row.append("{:>8.2f}s".format(elapsed))
+
+        print(
+            "{:>20} | {:>8.2f}s | ".format("catch up {}".format(n), serial_time)
+            + " | ".join("{:>10}".format(r) for r in row)
+        )
+
+    serial_time, serial_blocks = timed(
+        walk_back, BlockProcessor({}, block_cache_size=0), bitcoind.chain[-1], n=CACHE_BLOCKS
+    )
+    row = []
+    for workers in PREFETCH_WORKERS:
+        elapsed, blocks = timed(
+            BlockProcessor({}, block_cache_size=0, prefetch_workers=workers).get_previous_blocks,
+            bitcoind.chain[-1],
+            CACHE_BLOCKS,
+        )
+        assert blocks == serial_blocks
+        row.append("{:>8.2f}s".format(elapsed))
+
+    print(
+        "{:>20} | {:>8.2f}s | ".format("cache {}".format(CACHE_BLOCKS), serial_time)
+        + " | ".join("{:>10}".format(r) for r in row)
+    )
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.005)
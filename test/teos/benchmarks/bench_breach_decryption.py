@@ -0,0 +1,102 @@
+"""
+Benchmarks the latency of ``Watcher.filter_breaches`` (load + decrypt + decode) against the number of appointments
+triggered by a block, using serial decryption and thread / process decryption pools.
+
+Run from the repository root: ``python -m test.teos.benchmarks.bench_breach_decryption [workers]``
+
+No ``bitcoind`` is needed: transactions are decoded in-process.
+"""
+
+import os
+import sys
+from uuid import uuid4
+from time import time
+from shutil import rmtree
+from tempfile import mkdtemp
+from coincurve import PrivateKey
+from bitcoind_mock.transaction import create_dummy_transaction
+
+from teos.watcher import Watcher, create_decryption_pool
+from teos.block_processor import BlockProcessor
+from teos.appointments_dbm import AppointmentsDBM
+from teos.extended_appointment import ExtendedAppointment
+
+from common.tools import compute_locator
+from common.cryptographer import Cryptographer
+
+TRIGGERED_APPOINTMENTS = [10, 100, 1000, 5000]
+ROUNDS = 3
+
+
+def populate_watcher(watcher, n):
+    breaches = {}
+
+    for _ in range(n):
+        dispute_txid = create_dummy_transaction().tx_id.hex()
+        penalty_rawtx = create_dummy_transaction(dispute_txid).hex()
+        locator = compute_locator(dispute_txid)
+        uuid = uuid4().hex
+
+        appointment = ExtendedAppointment(
+            locator, 20, Cryptographer.encrypt(penalty_rawtx, dispute_txid), os.urandom(16).hex()
+        )
+        watcher.db_manager.store_watcher_appointment(uuid, appointment.to_dict())
+        watcher.appointments[uuid] = appointment.get_summary()
+        watcher.locator_uuid_map[locator] = [uuid]
+        breaches[locator] = dispute_txid
+
+    return breaches
+
+
+def bench(watcher, breaches):
+    best = None
+
+    for _ in range(ROUNDS):
+        start = time()
+        valid_breaches, _ = watcher.filter_breaches(breaches)
+        elapsed = time() - start
+
+        assert len(valid_breaches) == len(breaches)
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main(workers):
+    db_path = mkdtemp()
+    db_manager = AppointmentsDBM(os.path.join(db_path, "appointments"))
+    block_processor = BlockProcessor({}, local_tx_decoding=True)
+    watcher = Watcher(db_manager, None, block_processor, None, PrivateKey().to_der(), max(TRIGGERED_APPOINTMENTS), 6)
+
+    pools = {
+        "serial": None,
+        "thread": create_decryption_pool(workers, "thread"),
+        "process": create_decryption_pool(workers, "process"),
+    }
+
+    print("filter_breaches latency (best of {}, {} workers)".format(ROUNDS, workers))
+    print("{:>10} | {:>10} | {:>10} | {:>10}".format("triggered", *pools.keys()))
+
+    try:
+        for n in TRIGGERED_APPOINTMENTS:
+            watcher.appointments, watcher.locator_uuid_map = {}, {}
+            breaches = populate_watcher(watcher, n)
+            row = []
+
+            for pool in pools.values():
+                watcher.decryption_pool = pool
+                row.append("{:.2f}ms".format(bench(watcher, breaches) * 1000))
+
+            print("{:>10} | {:>10} | {:>10} | {:>10}".format(n, *row))
+
+    finally:
+        for pool in pools.values():
+            if pool is not None:
+                pool.shutdown()
+
+        db_manager.db.close()
+        rmtree(db_path)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count())
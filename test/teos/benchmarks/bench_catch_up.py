@@ -0,0 +1,96 @@
+"""
+Benchmarks the time needed by ``Builder.update_states`` to bring the ``Watcher`` and the ``Responder`` up to date after
+some downtime, updating them block by block (``max_lead=1``, the former approach) and letting the ``Watcher`` run some
+blocks ahead of the ``Responder``.
+
+No ``bitcoind`` is needed: blocks are served by a mocked ``BlockProcessor`` that adds a fixed latency to every
+``get_block`` call, standing for the RPC and the per-block work of each component.
+
+Run from the repository root: ``python -m test.teos.benchmarks.bench_catch_up [latency_ms]``
+"""
+
+import os
+import sys
+from time import time, sleep
+from shutil import rmtree
+from tempfile import mkdtemp
+from coincurve import PrivateKey
+
+from teos.builder import Builder
+from teos.watcher import Watcher
+from teos.responder import Responder
+from teos.appointments_dbm import AppointmentsDBM
+
+MISSED_BLOCKS = [144, 1000]
+MAX_LEADS = [1, 2, 6]
+BLOCK_TXS = 100
+
+
+class MockedBlockProcessor:
+    def __init__(self, n_blocks, latency):
+        self.latency = latency
+        self.chain = []
+        self.blocks = {}
+
+        prev_block_hash = None
+        for height in range(n_blocks):
+            block_hash = os.urandom(32).hex()
+            self.blocks[block_hash] = {
+                "hash": block_hash,
+                "height": height,
+                "previousblockhash": prev_block_hash,
+                "tx": [os.urandom(32).hex() for _ in range(BLOCK_TXS)],
+            }
+            self.chain.append(block_hash)
+            prev_block_hash = block_hash
+
+    def get_block(self, block_hash):
+        sleep(self.latency)
+        return self.blocks.get(block_hash)
+
+    def get_best_block_hash(self):
+        return self.chain[0]
+
+    def get_previous_blocks(self, block_hash, n):
+        return []
+
+
+def catch_up(db_path, block_processor, max_lead):
+    db_manager = AppointmentsDBM(db_path)
+    responder = Responder(db_manager, None, None, block_processor)
+    watcher = Watcher(db_manager, None, block_processor, responder, PrivateKey().to_der(), 100, 6)
+    watcher.last_known_block = responder.last_known_block = block_processor.chain[0]
+    watcher.awake()
+    responder.awake()
+
+    missed_blocks = block_processor.chain[1:]
+    start = time()
+    Builder.update_states(watcher, missed_blocks, missed_blocks, max_lead)
+    elapsed = time() - start
+
+    assert watcher.last_known_block == responder.last_known_block == block_processor.chain[-1]
+
+    return elapsed
+
+
+def main(latency):
+    print("Catch-up time ({}ms per get_block)".format(latency * 1000))
+    print("{:>14} | ".format("missed blocks") + " | ".join("{:>10}".format("lead {}".format(k)) for k in MAX_LEADS))
+
+    db_path = mkdtemp()
+    try:
+        for n in MISSED_BLOCKS:
+            block_processor = MockedBlockProcessor(n + 1, latency)
+            row = []
+            for max_lead in MAX_LEADS:
+                elapsed = catch_up(os.path.join(db_path, "{}-{}".format(n, max_lead)), block_processor, max_lead)
+                row.append("{:>9.2f}s".format(elapsed))
+
+            print("{:>14} | ".format(n) + " | ".join(row))
+
+    finally:
+        rmtree(db_path)
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.005)
@@ -0,0 +1,87 @@
+"""
+Benchmarks the latency and the memory allocated by ``Watcher.get_breaches`` against the number of appointments, using
+the former approach (intersecting a copy of every appointment locator with the block locators) and the current one
+(looking the block locators up in the ``locator_uuid_map``).
+
+Run from the repository root: ``python -m test.teos.benchmarks.bench_get_breaches``
+"""
+
+import os
+import random
+import tracemalloc
+from time import time
+from shutil import rmtree
+from tempfile import mkdtemp
+from coincurve import PrivateKey
+
+from teos.watcher import Watcher
+from teos.appointments_dbm import AppointmentsDBM
+
+from common.tools import compute_binary_locator
+
+APPOINTMENTS = [10000, 100000, 1000000]
+BLOCK_TXS = 3000
+BREACHES = 10
+ROUNDS = 5
+
+
+def get_breaches_intersection(watcher, locator_txid_map):
+    intersection = set(watcher.locator_uuid_map.keys()).intersection(locator_txid_map.keys())
+    return {locator: locator_txid_map[locator] for locator in intersection}
+
+
+def bench(f, *args):
+    best = None
+
+    for _ in range(ROUNDS):
+        start = time()
+        f(*args)
+        elapsed = time() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    f(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best, peak
+
+
+def main():
+    db_path = mkdtemp()
+    db_manager = AppointmentsDBM(os.path.join(db_path, "appointments"))
+    # Only the locator map is needed by get_breaches
+    watcher = Watcher(db_manager, None, None, None, PrivateKey().to_der(), max(APPOINTMENTS), 6)
+
+    print("get_breaches cost per block (best of {}, {} txs per block)".format(ROUNDS, BLOCK_TXS))
+    print("{:>12} | {:>12} | {:>12} | {:>12} | {:>12}".format("appointments", "old", "new", "old mem", "new mem"))
+
+    try:
+        for n in APPOINTMENTS:
+            watcher.locator_uuid_map = {os.urandom(16): [os.urandom(16).hex()] for _ in range(n)}
+
+            txids = [os.urandom(32).hex() for _ in range(BLOCK_TXS)]
+            locator_txid_map = {compute_binary_locator(txid): txid for txid in txids}
+
+            # Make some of the block transactions trigger appointments
+            for txid in random.sample(txids, BREACHES):
+                watcher.locator_uuid_map[compute_binary_locator(txid)] = [os.urandom(16).hex()]
+
+            assert get_breaches_intersection(watcher, locator_txid_map) == watcher.get_breaches(locator_txid_map)
+
+            old_time, old_mem = bench(get_breaches_intersection, watcher, locator_txid_map)
+            new_time, new_mem = bench(watcher.get_breaches, locator_txid_map)
+
+            print(
+                "{:>12} | {:>10.2f}ms | {:>10.2f}ms | {:>10}kB | {:>10}kB".format(
+                    n, old_time * 1000, new_time * 1000, old_mem // 1000, new_mem // 1000
+                )
+            )
+
+    finally:
+        db_manager.db.close()
+        rmtree(db_path)
+
+
+if __name__ == "__main__":
+    main()
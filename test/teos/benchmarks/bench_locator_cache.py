@@ -0,0 +1,110 @@
+"""
+Benchmarks the lookup and rotation (add a block, drop the oldest one) cost of big ``LocatorCache`` instances (one day of
+blocks), comparing:
+
+- ``index``: the ``LocatorCache``, which keeps a ``locator:txid`` index on top of the per-block data, so dropping a
+  block deletes its locators from the index one by one.
+- ``ring``: a ring buffer of per-block ``locator:txid`` slots, so dropping a block is a single step, but lookups have
+  to check every slot.
+
+Run from the repository root: ``python -m test.teos.benchmarks.bench_locator_cache``
+"""
+
+import os
+from time import time
+from readerwriterlock import rwlock
+from collections import deque
+
+from teos.watcher import LocatorCache
+
+from common.tools import compute_binary_locator
+
+CACHE_BLOCKS = [6, 144]
+BLOCK_TXS = 3000
+LOOKUPS = 10000
+ROTATIONS = 50
+
+
+class RingLocatorCache:
+    """A ring buffer of per-block slots, using the same locking as the LocatorCache."""
+
+    def __init__(self, blocks_in_cache):
+        self.slots = deque(maxlen=blocks_in_cache)
+        self.rw_lock = rwlock.RWLockWrite()
+
+    def get_txid(self, locator):
+        with self.rw_lock.gen_rlock():
+            for _, locator_txid_map in reversed(self.slots):
+                txid = locator_txid_map.get(locator)
+                if txid is not None:
+                    return txid
+
+        return None
+
+    def update(self, block_hash, locator_txid_map):
+        with self.rw_lock.gen_wlock():
+            # The oldest slot is dropped by the deque once it is full
+            self.slots.append((block_hash, locator_txid_map))
+
+
+def create_block():
+    return os.urandom(32).hex(), {
+        compute_binary_locator(txid): txid for txid in (os.urandom(32).hex() for _ in range(BLOCK_TXS))
+    }
+
+
+def bench_lookups(locator_cache, locators):
+    start = time()
+    for locator in locators:
+        locator_cache.get_txid(locator)
+
+    return (time() - start) / len(locators)
+
+
+def bench_rotations(locator_cache, blocks):
+    start = time()
+    for block_hash, locator_txid_map in blocks:
+        locator_cache.update(block_hash, locator_txid_map)
+
+    return (time() - start) / len(blocks)
+
+
+def main():
+    print("LocatorCache cost ({} txs per block, {} lookups, {} rotations)".format(BLOCK_TXS, LOOKUPS, ROTATIONS))
+    print(
+        "{:>6} | {:>8} | {:>12} | {:>12} | {:>12} | {:>12}".format(
+            "blocks", "layout", "hit newest", "hit oldest", "miss", "rotation"
+        )
+    )
+
+    for n_blocks in CACHE_BLOCKS:
+        blocks = [create_block() for _ in range(n_blocks)]
+        new_blocks = [create_block() for _ in range(ROTATIONS)]
+
+        newest = [locator for locator in blocks[-1][1]]
+        oldest = [locator for locator in blocks[0][1]]
+        newest = (newest * (LOOKUPS // len(newest) + 1))[:LOOKUPS]
+        oldest = (oldest * (LOOKUPS // len(oldest) + 1))[:LOOKUPS]
+        missing = [os.urandom(16) for _ in range(LOOKUPS)]
+
+        for layout, cache_class in [("index", LocatorCache), ("ring", RingLocatorCache)]:
+            locator_cache = cache_class(n_blocks)
+            for block_hash, locator_txid_map in blocks:
+                locator_cache.update(block_hash, locator_txid_map)
+
+            assert locator_cache.get_txid(newest[0]) is not None and locator_cache.get_txid(oldest[0]) is not None
+
+            print(
+                "{:>6} | {:>8} | {:>10.2f}us | {:>10.2f}us | {:>10.2f}us | {:>10.2f}ms".format(
+                    n_blocks,
+                    layout,
+                    bench_lookups(locator_cache, newest) * 10**6,
+                    bench_lookups(locator_cache, oldest) * 10**6,
+                    bench_lookups(locator_cache, missing) * 10**6,
+                    bench_rotations(locator_cache, new_blocks) * 1000,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmarks the memory used by the ``Watcher`` in-memory indexes (``appointments`` summaries and ``locator_uuid_map``)
+and by the ``LocatorCache`` when locators are kept as 32-char hex strings (the former representation) and as 16-byte
+``bytes`` (the current one).
+
+Run from the repository root: ``python -m test.teos.benchmarks.bench_locator_memory``
+"""
+
+import os
+import tracemalloc
+
+from teos.watcher import LocatorCache
+
+from common.tools import compute_locator, compute_binary_locator
+
+APPOINTMENTS = [10000, 100000, 1000000]
+CACHE_BLOCKS = 6
+BLOCK_TXS = 3000
+
+
+def build_watcher_indexes(locators, uuids, user_id, binary):
+    appointments = {}
+    locator_uuid_map = {}
+
+    for raw_locator, uuid in zip(locators, uuids):
+        # This mimics Builder.build_appointments: the locator is decoded from the database (as hex) and shared by the
+        # summary and the map
+        locator = raw_locator.hex()
+        locator = bytes.fromhex(locator) if binary else locator
+        appointments[uuid] = {"locator": locator, "user_id": user_id}
+        locator_uuid_map[locator] = [uuid]
+
+    return appointments, locator_uuid_map
+
+
+def build_locator_cache(blocks, binary):
+    locator_cache = LocatorCache(CACHE_BLOCKS)
+    compute = compute_binary_locator if binary else compute_locator
+
+    for block_hash, txids in blocks.items():
+        locator_cache.update(block_hash, {compute(txid): txid for txid in txids})
+
+    return locator_cache
+
+
+def measure(f, *args):
+    tracemalloc.start()
+    result = f(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Keep the result alive until the memory has been measured
+    del result
+
+    return size
+
+
+def main():
+    user_id = "02" + os.urandom(32).hex()
+
+    print("Watcher indexes (appointments + locator_uuid_map)")
+    print("{:>12} | {:>10} | {:>10} | {:>8}".format("appointments", "hex", "binary", "saved"))
+
+    for n in APPOINTMENTS:
+        locators = [os.urandom(16) for _ in range(n)]
+        uuids = [os.urandom(20).hex() for _ in range(n)]
+
+        hex_size = measure(build_watcher_indexes, locators, uuids, user_id, False)
+        binary_size = measure(build_watcher_indexes, locators, uuids, user_id, True)
+
+        print(
+            "{:>12} | {:>8}MB | {:>8}MB | {:>7.1f}%".format(
+                n, hex_size // 10**6, binary_size // 10**6, 100 * (1 - binary_size / hex_size)
+            )
+        )
+
+    blocks = {os.urandom(32).hex(): [os.urandom(32).hex() for _ in range(BLOCK_TXS)] for _ in range(CACHE_BLOCKS)}
+    hex_size = measure(build_locator_cache, blocks, False)
+    binary_size = measure(build_locator_cache, blocks, True)
+
+    print("\nLocatorCache ({} blocks, {} txs per block)".format(CACHE_BLOCKS, BLOCK_TXS))
+    print(
+        "hex: {}kB | binary: {}kB | saved: {:.1f}%".format(
+            hex_size // 1000, binary_size // 1000, 100 * (1 - binary_size / hex_size)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
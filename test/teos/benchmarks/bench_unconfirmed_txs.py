@@ -0,0 +1,62 @@
+"""
+Benchmarks the bookkeeping of unconfirmed penalty transactions done by the ``Responder`` on every block, using a plain
+list (the former structure) and an :obj:`OrderedSet <teos.utils.ordered_set.OrderedSet>`.
+
+Every round mimics the confirmation check done by ``check_confirmations`` for a new block (a membership check for every
+transaction in the block and a removal for every confirmed penalty). With a list, checks and removals are linear on the
+number of unconfirmed penalties.
+
+Run from the repository root: ``python -m test.teos.benchmarks.bench_unconfirmed_txs``
+"""
+
+import os
+import random
+from time import time
+
+from teos.utils.ordered_set import OrderedSet
+
+UNCONFIRMED_PENALTIES = [10000, 50000, 100000]
+BLOCK_TXS = 2500
+# Share of the block transactions that confirm one of the tracked penalties
+CONFIRMED_SHARE = 0.1
+ROUNDS = 3
+
+
+def check_block(unconfirmed_txs, tx_tracker_map, block_txs):
+    # Same operations as Responder.check_confirmations (without the logging)
+    for tx in block_txs:
+        if tx in tx_tracker_map and tx in unconfirmed_txs:
+            unconfirmed_txs.remove(tx)
+
+
+def bench(structure, penalties, block_txs):
+    tx_tracker_map = dict.fromkeys(penalties)
+    best = None
+
+    for _ in range(ROUNDS):
+        unconfirmed_txs = structure(penalties)
+
+        start = time()
+        check_block(unconfirmed_txs, tx_tracker_map, block_txs)
+        elapsed = time() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main():
+    print("Unconfirmed penalties bookkeeping per block (best of {}, {} txs per block)".format(ROUNDS, BLOCK_TXS))
+    print("{:>12} | {:>12} | {:>12}".format("unconfirmed", "list", "OrderedSet"))
+
+    for n in UNCONFIRMED_PENALTIES:
+        penalties = [os.urandom(32).hex() for _ in range(n)]
+        confirmed = random.sample(penalties, int(BLOCK_TXS * CONFIRMED_SHARE))
+        block_txs = confirmed + [os.urandom(32).hex() for _ in range(BLOCK_TXS - len(confirmed))]
+
+        row = [bench(structure, penalties, block_txs) for structure in (list, OrderedSet)]
+        print("{:>12} | {:>10.2f}ms | {:>10.2f}ms".format(n, *[t * 1000 for t in row]))
+
+
+if __name__ == "__main__":
+    main()
@@ -164,6 +164,12 @@ def generate_dummy_tracker():
     return TransactionTracker.from_dict(tracker_data)
 
 
+def load_locator_map(db_manager, locator):
+    # Locator maps are stored as one entry per uuid (see AppointmentsDBM.get_locator_map_key)
+    prefix = db_manager.get_locator_map_key(locator)
+    return {k[len(prefix) :].decode("utf-8") for k in db_manager.writer.iterator(prefix=prefix, include_value=False)}
+
+
 def get_config():
     config_loader = ConfigLoader(".", "teos.conf", DEFAULT_CONF, {})
     config = config_loader.build_config()
@@ -2,7 +2,7 @@ import pytest
 from shutil import rmtree
 from binascii import hexlify
 
-from teos.api import API
+from teos.api import API, MAX_APPOINTMENTS_PER_REQUEST, get_rejection_response
 import common.errors as errors
 from teos.inspector import Inspector
 from teos.gatekeeper import UserInfo
@@ -26,6 +26,7 @@ from common.constants import (
     HTTP_NOT_FOUND,
     HTTP_BAD_REQUEST,
     HTTP_SERVICE_UNAVAILABLE,
+    HTTP_INTERNAL_SERVER_ERROR,
     LOCATOR_LEN_BYTES,
     ENCRYPTED_BLOB_MAX_SIZE_HEX,
 )
@@ -35,6 +36,7 @@ config = get_config()
 TEOS_API = "http://{}:{}".format(config.get("API_HOST"), config.get("API_PORT"))
 register_endpoint = "{}/register".format(TEOS_API)
 add_appointment_endpoint = "{}/add_appointment".format(TEOS_API)
+add_appointments_endpoint = "{}/add_appointments".format(TEOS_API)
 get_appointment_endpoint = "{}/get_appointment".format(TEOS_API)
 get_all_appointment_endpoint = "{}/get_all_appointments".format(TEOS_API)
 
@@ -262,7 +264,7 @@ def test_add_appointment_multiple_times_same_user(api, client, appointment, n=MU
         assert r.json.get("start_block") == api.watcher.last_known_block
 
     # Since all updates came from the same user, only the last one is stored
-    assert len(api.watcher.locator_uuid_map[appointment.locator]) == 1
+    assert len(api.watcher.locator_uuid_map[bytes.fromhex(appointment.locator)]) == 1
 
 
 def test_add_appointment_multiple_times_different_users(api, client, appointment, n=MULTIPLE_APPOINTMENTS):
@@ -285,7 +287,7 @@ def test_add_appointment_multiple_times_different_users(api, client, appointment
         assert r.json.get("start_block") == api.watcher.last_known_block
 
     # Check that all the appointments have been added and that there are no duplicates
-    assert len(set(api.watcher.locator_uuid_map[appointment.locator])) == n
+    assert len(set(api.watcher.locator_uuid_map[bytes.fromhex(appointment.locator)])) == n
 
 
 def test_add_appointment_update_same_size(api, client, appointment):
@@ -369,7 +371,8 @@ def test_add_appointment_in_cache(api, client):
 
     # Add the data to the cache
     dispute_txid = api.watcher.block_processor.decode_raw_transaction(dispute_tx).get("txid")
-    api.watcher.locator_cache.cache[appointment.locator] = dispute_txid
+    block_hash = get_random_value_hex(32)
+    api.watcher.locator_cache.update(block_hash, {bytes.fromhex(appointment.locator): dispute_txid})
 
     r = add_appointment(client, {"appointment": appointment.to_dict(), "signature": appointment_signature}, user_id)
     assert (
@@ -383,7 +386,7 @@ def test_add_appointment_in_cache(api, client):
     assert r.status_code == HTTP_BAD_REQUEST and r.json.get("error_code") == errors.APPOINTMENT_ALREADY_TRIGGERED
 
     # The appointment would be rejected even if the data is not in the cache provided it has been triggered
-    del api.watcher.locator_cache.cache[appointment.locator]
+    api.watcher.locator_cache.blocks.pop(block_hash, None)
     r = add_appointment(client, {"appointment": appointment.to_dict(), "signature": appointment_signature}, user_id)
     assert r.status_code == HTTP_BAD_REQUEST and r.json.get("error_code") == errors.APPOINTMENT_ALREADY_TRIGGERED
 
@@ -396,7 +399,7 @@ def test_add_appointment_in_cache_cannot_decrypt(api, client):
 
     # Add the data to the cache
     dispute_txid = api.watcher.block_processor.decode_raw_transaction(dispute_tx).get("txid")
-    api.watcher.locator_cache.cache[dispute_txid] = appointment.locator
+    api.watcher.locator_cache.update(get_random_value_hex(32), {bytes.fromhex(appointment.locator): dispute_txid})
 
     # The appointment should be accepted
     r = add_appointment(client, {"appointment": appointment.to_dict(), "signature": appointment_signature}, user_id)
@@ -427,11 +430,10 @@ def test_add_appointment_in_cache_invalid_transaction(api, client):
     }
 
     appointment = ExtendedAppointment.from_dict(appointment_data)
-    api.watcher.locator_cache.cache[appointment.locator] = dispute_tx.tx_id.hex()
     appointment_signature = Cryptographer.sign(appointment.serialize(), user_sk)
 
     # Add the data to the cache
-    api.watcher.locator_cache.cache[dispute_txid] = appointment.locator
+    api.watcher.locator_cache.update(get_random_value_hex(32), {bytes.fromhex(appointment.locator): dispute_txid})
 
     # The appointment should be accepted
     r = add_appointment(client, {"appointment": appointment.to_dict(), "signature": appointment_signature}, user_id)
@@ -442,6 +444,63 @@ def test_add_appointment_in_cache_invalid_transaction(api, client):
     )
 
 
+def test_add_appointments(api, client):
+    # Simulate the user registration (end time does not matter here)
+    api.watcher.gatekeeper.registered_users[user_id] = UserInfo(available_slots=3, subscription_expiry=0)
+
+    batch = []
+    for _ in range(4):
+        appointment, dispute_tx = generate_dummy_appointment()
+        locator_dispute_tx_map[appointment.locator] = dispute_tx
+        batch.append(
+            {"appointment": appointment.to_dict(), "signature": Cryptographer.sign(appointment.serialize(), user_sk)}
+        )
+
+    # Add a wrong appointment and one with an invalid signature in between
+    wrong_appointment, _ = generate_dummy_appointment()
+    wrong_appointment.to_self_delay = 0
+    batch.insert(
+        1,
+        {
+            "appointment": wrong_appointment.to_dict(),
+            "signature": Cryptographer.sign(wrong_appointment.serialize(), user_sk),
+        },
+    )
+    batch.insert(2, {"appointment": batch[0]["appointment"], "signature": batch[0]["signature"][::-1]})
+
+    r = client.post(add_appointments_endpoint, json={"appointments": batch})
+    assert r.status_code == HTTP_OK
+
+    receipts = r.json.get("receipts")
+    assert len(receipts) == len(batch)
+    assert receipts[1].get("error_code") == errors.APPOINTMENT_FIELD_TOO_SMALL
+    assert receipts[2].get("error_code") == errors.APPOINTMENT_INVALID_SIGNATURE_OR_INSUFFICIENT_SLOTS
+
+    # The user only had slots for three of the appointments
+    for i, available_slots in zip([0, 3, 4], [2, 1, 0]):
+        assert receipts[i].get("locator") == batch[i]["appointment"]["locator"]
+        assert receipts[i].get("available_slots") == available_slots
+        assert receipts[i].get("start_block") == api.watcher.last_known_block
+
+        uuid = hash_160("{}{}".format(batch[i]["appointment"]["locator"], user_id))
+        appointments[uuid] = batch[i]["appointment"]
+
+    assert receipts[5].get("error_code") == errors.APPOINTMENT_INVALID_SIGNATURE_OR_INSUFFICIENT_SLOTS
+
+
+def test_add_appointments_wrong(api, client):
+    # The appointments must be sent as a list of dicts
+    for data in [{}, {"appointments": {}}, {"appointments": ["appointment"]}]:
+        r = client.post(add_appointments_endpoint, json=data)
+        assert r.status_code == HTTP_BAD_REQUEST
+        assert errors.INVALID_REQUEST_FORMAT == r.json.get("error_code")
+
+    # And there is a limit of appointments per request
+    r = client.post(add_appointments_endpoint, json={"appointments": [{}] * (MAX_APPOINTMENTS_PER_REQUEST + 1)})
+    assert r.status_code == HTTP_BAD_REQUEST
+    assert errors.INVALID_REQUEST_FORMAT == r.json.get("error_code")
+
+
 def test_add_too_many_appointment(api, client):
     # Give slots to the user
     api.watcher.gatekeeper.registered_users[user_id] = UserInfo(available_slots=200, subscription_expiry=0)
@@ -489,6 +548,15 @@ def test_get_random_appointment_registered_user(client, user_sk=user_sk):
     assert received_appointment.get("status") == "not_found"
 
 
+def test_get_rejection_response():
+    response, rcode = get_rejection_response(AppointmentAlreadyTriggered("already triggered"))
+    assert rcode == HTTP_BAD_REQUEST and response.get("error_code") == errors.APPOINTMENT_ALREADY_TRIGGERED
+
+    # Unexpected errors are not reported as any of the known rejections
+    response, rcode = get_rejection_response(ValueError("unexpected"))
+    assert rcode == HTTP_INTERNAL_SERVER_ERROR and "error_code" not in response
+
+
 def test_get_appointment_not_registered_user(client):
     # Not registered users have no associated appointments, so this should fail
     tmp_sk, tmp_pk = generate_keypair()
@@ -6,15 +6,27 @@ from uuid import uuid4
 
 from teos.appointments_dbm import AppointmentsDBM
 from teos.appointments_dbm import (
+    WATCHER_PREFIX,
+    RESPONDER_PREFIX,
     WATCHER_LAST_BLOCK_KEY,
     RESPONDER_LAST_BLOCK_KEY,
     LOCATOR_MAP_PREFIX,
     TRIGGERED_APPOINTMENTS_PREFIX,
+    RECORD_VERSION,
+    encode_appointment,
+    decode_appointment,
+    encode_tracker,
+    decode_tracker,
 )
 
-from common.constants import LOCATOR_LEN_BYTES
+from common.constants import LOCATOR_LEN_BYTES, LOCATOR_LEN_HEX
 
-from test.teos.unit.conftest import get_random_value_hex, generate_dummy_appointment
+from test.teos.unit.conftest import (
+    get_random_value_hex,
+    generate_dummy_appointment,
+    generate_dummy_tracker,
+    load_locator_map,
+)
 
 
 @pytest.fixture(scope="module")
@@ -27,6 +39,25 @@ def responder_trackers():
     return {get_random_value_hex(16): get_random_value_hex(32) for _ in range(10)}
 
 
+def get_random_user_id():
+    # User ids are compressed public keys (33-byte)
+    return "02" + get_random_value_hex(32)
+
+
+def get_binary_appointment_data():
+    appointment = generate_dummy_appointment()[0]
+    appointment.user_id = get_random_user_id()
+
+    return appointment.to_dict()
+
+
+def get_binary_tracker_data():
+    tracker = generate_dummy_tracker()
+    tracker.user_id = get_random_user_id()
+
+    return tracker.to_dict()
+
+
 def open_create_db(db_path):
 
     try:
@@ -96,86 +127,66 @@ def test_load_responder_trackers_empty(db_manager):
     assert len(db_manager.load_responder_trackers()) == 0
 
 
-def test_load_locator_map_empty(db_manager):
-    assert db_manager.load_locator_map(get_random_value_hex(LOCATOR_LEN_BYTES)) is None
-
-
 def test_create_append_locator_map(db_manager):
     uuid = uuid4().hex
     locator = get_random_value_hex(LOCATOR_LEN_BYTES)
     db_manager.create_append_locator_map(locator, uuid)
 
     # Check that the locator map has been properly stored
-    assert db_manager.load_locator_map(locator) == [uuid]
+    assert load_locator_map(db_manager, locator) == {uuid}
 
-    # If we try to add the same uuid again the list shouldn't change
+    # If we try to add the same uuid again the map shouldn't change
     db_manager.create_append_locator_map(locator, uuid)
-    assert db_manager.load_locator_map(locator) == [uuid]
+    assert load_locator_map(db_manager, locator) == {uuid}
 
     # Add another uuid to the same locator and check that it also works
     uuid2 = uuid4().hex
     db_manager.create_append_locator_map(locator, uuid2)
 
-    assert set(db_manager.load_locator_map(locator)) == set([uuid, uuid2])
+    assert load_locator_map(db_manager, locator) == {uuid, uuid2}
 
 
-def test_update_locator_map(db_manager):
-    # Let's create a couple of appointments with the same locator
-    locator = get_random_value_hex(32)
+def test_create_append_locator_map_unit_of_work(db_manager):
+    # Locator maps can be appended several times within the same unit of work
+    locator = get_random_value_hex(LOCATOR_LEN_BYTES)
     uuid1 = uuid4().hex
     uuid2 = uuid4().hex
-    db_manager.create_append_locator_map(locator, uuid1)
-    db_manager.create_append_locator_map(locator, uuid2)
 
-    locator_map = db_manager.load_locator_map(locator)
-    assert uuid1 in locator_map
+    with db_manager.unit_of_work():
+        db_manager.create_append_locator_map(locator, uuid1)
+        db_manager.create_append_locator_map(locator, uuid2)
 
-    locator_map.remove(uuid1)
-    db_manager.update_locator_map(locator, locator_map)
+        # The map is not in the database yet, but can already be loaded within the unit
+        assert db_manager.db.get(db_manager.get_locator_map_key(locator, uuid1)) is None
+        assert load_locator_map(db_manager, locator) == {uuid1, uuid2}
 
-    locator_map_after = db_manager.load_locator_map(locator)
-    assert uuid1 not in locator_map_after and uuid2 in locator_map_after and len(locator_map_after) == 1
+    assert load_locator_map(db_manager, locator) == {uuid1, uuid2}
 
+    # Entries created within a unit of work can be deleted within it too
+    other_locator = get_random_value_hex(LOCATOR_LEN_BYTES)
+    with db_manager.unit_of_work():
+        db_manager.create_append_locator_map(other_locator, uuid1)
+        db_manager.batch_delete_locator_map_entries({other_locator: [uuid1], locator: [uuid1, uuid2]})
 
-def test_update_locator_map_wong_data(db_manager):
-    # Let's try to update the locator map with a different list of uuids
-    locator = get_random_value_hex(32)
-    db_manager.create_append_locator_map(locator, uuid4().hex)
-    db_manager.create_append_locator_map(locator, uuid4().hex)
+    assert load_locator_map(db_manager, locator) == set()
+    assert load_locator_map(db_manager, other_locator) == set()
 
-    locator_map = db_manager.load_locator_map(locator)
-    wrong_map_update = [uuid4().hex]
-    db_manager.update_locator_map(locator, wrong_map_update)
-    locator_map_after = db_manager.load_locator_map(locator)
 
-    assert locator_map_after == locator_map
-
-
-def test_update_locator_map_empty(db_manager):
-    # We shouldn't be able to update a map with an empty list
-    locator = get_random_value_hex(32)
-    db_manager.create_append_locator_map(locator, uuid4().hex)
-    db_manager.create_append_locator_map(locator, uuid4().hex)
-
-    locator_map = db_manager.load_locator_map(locator)
-    db_manager.update_locator_map(locator, [])
-    locator_map_after = db_manager.load_locator_map(locator)
-
-    assert locator_map_after == locator_map
-
-
-def test_delete_locator_map(db_manager):
-    locator_maps = db_manager.load_appointments_db(prefix=LOCATOR_MAP_PREFIX)
-    assert len(locator_maps) != 0
+def test_batch_delete_locator_map_entries(db_manager):
+    locator = get_random_value_hex(LOCATOR_LEN_BYTES)
+    other_locator = get_random_value_hex(LOCATOR_LEN_BYTES)
+    uuids = [uuid4().hex for _ in range(3)]
+    other_uuid = uuid4().hex
 
-    for locator, uuids in locator_maps.items():
-        assert db_manager.delete_locator_map(locator) is True
+    for uuid in uuids:
+        db_manager.create_append_locator_map(locator, uuid)
+    db_manager.create_append_locator_map(other_locator, other_uuid)
 
-    locator_maps = db_manager.load_appointments_db(prefix=LOCATOR_MAP_PREFIX)
-    assert len(locator_maps) == 0
+    # Uuids are removed from their maps, and maps with nothing left are gone. Unknown uuids are ignored
+    db_manager.batch_delete_locator_map_entries({locator: uuids[:2] + [uuid4().hex], other_locator: [other_uuid]})
 
-    # Keys of wrong type should fail
-    assert db_manager.delete_locator_map(42) is False
+    assert load_locator_map(db_manager, locator) == {uuids[2]}
+    assert load_locator_map(db_manager, other_locator) == set()
 
 
 def test_store_watcher_appointment_wrong(db_manager, watcher_appointments):
@@ -208,6 +219,37 @@ def test_store_load_watcher_appointment(db_manager, watcher_appointments):
         assert appointment.to_dict() == db_watcher_appointments[uuid]
 
 
+def test_batch_store_watcher_appointments():
+    db_path = "batch_store_test_db"
+    db_manager = open_create_db(db_path)
+
+    appointments = {uuid4().hex: get_binary_appointment_data() for _ in range(10)}
+
+    # Two of the appointments share the locator, and one of the locators already has a map
+    shared_locator_uuids = list(appointments.keys())[:2]
+    appointments[shared_locator_uuids[1]]["locator"] = appointments[shared_locator_uuids[0]]["locator"]
+    existing_uuid = uuid4().hex
+    db_manager.create_append_locator_map(appointments[shared_locator_uuids[0]]["locator"], existing_uuid)
+
+    assert db_manager.batch_store_watcher_appointments(appointments) is True
+
+    for uuid, appointment in appointments.items():
+        assert db_manager.load_watcher_appointment(uuid) == appointment
+        assert uuid in load_locator_map(db_manager, appointment["locator"])
+
+    assert load_locator_map(db_manager, appointments[shared_locator_uuids[0]]["locator"]) == set(
+        [existing_uuid] + shared_locator_uuids
+    )
+
+    # Nothing is stored if any of the appointments is wrong
+    appointments = {uuid4().hex: get_binary_appointment_data(), 42: get_binary_appointment_data()}
+    assert db_manager.batch_store_watcher_appointments(appointments) is False
+    assert db_manager.load_watcher_appointment(list(appointments.keys())[0]) is None
+
+    db_manager.db.close()
+    shutil.rmtree(db_path)
+
+
 def test_store_load_triggered_appointment(db_manager):
     db_watcher_appointments = db_manager.load_watcher_appointments()
     db_watcher_appointments_with_triggered = db_manager.load_watcher_appointments(include_triggered=True)
@@ -424,3 +466,211 @@ def test_batch_delete_triggered_appointment_flag(db_manager):
     # Delete the rest
     db_manager.batch_delete_triggered_appointment_flag(second_half)
     assert not db_manager.load_all_triggered_flags()
+
+
+def test_is_triggered(db_manager):
+    uuid = uuid4().hex
+    assert db_manager.is_triggered(uuid) is False
+
+    db_manager.create_triggered_appointment_flag(uuid)
+    assert db_manager.is_triggered(uuid) is True
+
+    db_manager.delete_triggered_appointment_flag(uuid)
+    assert db_manager.is_triggered(uuid) is False
+
+
+def test_get_appointment_status(db_manager):
+    # Non-existing appointments are not found
+    assert db_manager.get_appointment_status(uuid4().hex) == ("not_found", None)
+
+    # Appointments held by the Watcher are being watched
+    uuid = uuid4().hex
+    appointment_data = get_binary_appointment_data()
+    db_manager.store_watcher_appointment(uuid, appointment_data)
+    assert db_manager.get_appointment_status(uuid) == ("being_watched", appointment_data)
+
+    # Once triggered, the tracker is returned instead
+    tracker_data = get_binary_tracker_data()
+    db_manager.store_responder_tracker(uuid, tracker_data)
+    db_manager.create_triggered_appointment_flag(uuid)
+    assert db_manager.get_appointment_status(uuid) == ("dispute_responded", tracker_data)
+
+    # A flag with no tracker behind it is not found
+    db_manager.delete_responder_tracker(uuid)
+    assert db_manager.get_appointment_status(uuid) == ("not_found", None)
+
+
+def test_batch_load_watcher_appointments(db_manager, watcher_appointments):
+    for uuid, appointment in watcher_appointments.items():
+        db_manager.store_watcher_appointment(uuid, appointment.to_dict())
+
+    # Unknown uuids are not returned
+    uuids = list(watcher_appointments.keys())
+    db_appointments = db_manager.batch_load_watcher_appointments(uuids + [uuid4().hex])
+
+    assert db_appointments.keys() == watcher_appointments.keys()
+    for uuid, appointment in watcher_appointments.items():
+        assert db_appointments[uuid] == appointment.to_dict()
+
+
+def test_encode_decode_appointment():
+    appointment_data = get_binary_appointment_data()
+    encoded_appointment = encode_appointment(appointment_data)
+
+    assert encoded_appointment[:1] == RECORD_VERSION
+    assert decode_appointment(encoded_appointment) == appointment_data
+
+    # The binary encoding is way smaller than the json one
+    assert len(encoded_appointment) < len(json.dumps(appointment_data)) / 2
+
+
+def test_encode_appointment_wrong():
+    # Data that cannot be represented in the binary format cannot be encoded
+    for field, value in [
+        ("locator", get_random_value_hex(15)),
+        ("locator", get_random_value_hex(16).upper()),
+        ("user_id", get_random_value_hex(16)),
+        ("encrypted_blob", get_random_value_hex(16)[:-1]),
+        ("encrypted_blob", 42),
+        ("to_self_delay", 2**32),
+        ("to_self_delay", "20"),
+        ("extra_field", "value"),
+    ]:
+        appointment_data = get_binary_appointment_data()
+        appointment_data[field] = value
+
+        with pytest.raises(ValueError):
+            encode_appointment(appointment_data)
+
+    # Same for data that is not even an appointment
+    with pytest.raises(ValueError):
+        encode_appointment(get_random_value_hex(32))
+
+
+def test_decode_appointment_wrong():
+    encoded_appointment = encode_appointment(get_binary_appointment_data())
+
+    with pytest.raises(ValueError):
+        decode_appointment(b"\x02" + encoded_appointment[1:])
+
+    with pytest.raises(ValueError):
+        decode_appointment(encoded_appointment[:20])
+
+
+def test_encode_decode_tracker():
+    tracker_data = get_binary_tracker_data()
+    encoded_tracker = encode_tracker(tracker_data)
+
+    assert encoded_tracker[:1] == RECORD_VERSION
+    assert decode_tracker(encoded_tracker) == tracker_data
+
+    # Wrong data cannot be encoded / decoded
+    tracker_data["penalty_txid"] = get_random_value_hex(31)
+    with pytest.raises(ValueError):
+        encode_tracker(tracker_data)
+
+    with pytest.raises(ValueError):
+        decode_tracker(encoded_tracker[:50])
+
+
+def test_store_load_binary_records(db_manager):
+    uuid = uuid4().hex
+    appointment_data = get_binary_appointment_data()
+    tracker_data = get_binary_tracker_data()
+
+    assert db_manager.store_watcher_appointment(uuid, appointment_data) is True
+    assert db_manager.store_responder_tracker(uuid, tracker_data) is True
+
+    # Data is stored using the binary format
+    assert db_manager.db.get((WATCHER_PREFIX + uuid).encode("utf-8")) == encode_appointment(appointment_data)
+    assert db_manager.db.get((RESPONDER_PREFIX + uuid).encode("utf-8")) == encode_tracker(tracker_data)
+
+    assert db_manager.load_watcher_appointment(uuid) == appointment_data
+    assert db_manager.batch_load_watcher_appointments([uuid]) == {uuid: appointment_data}
+    assert db_manager.load_watcher_appointments().get(uuid) == appointment_data
+    assert db_manager.load_responder_tracker(uuid) == tracker_data
+    assert db_manager.load_responder_trackers().get(uuid) == tracker_data
+
+
+def test_load_legacy_records(db_manager):
+    # Records stored as json (before the binary format was introduced) can still be loaded
+    uuid = uuid4().hex
+    appointment_data = get_binary_appointment_data()
+    tracker_data = get_binary_tracker_data()
+
+    db_manager.db.put((WATCHER_PREFIX + uuid).encode("utf-8"), json.dumps(appointment_data).encode("utf-8"))
+    db_manager.db.put((RESPONDER_PREFIX + uuid).encode("utf-8"), json.dumps(tracker_data).encode("utf-8"))
+
+    assert db_manager.load_watcher_appointment(uuid) == appointment_data
+    assert db_manager.batch_load_watcher_appointments([uuid]) == {uuid: appointment_data}
+    assert db_manager.load_responder_tracker(uuid) == tracker_data
+
+
+def test_migrate_records(db_manager):
+    legacy_appointments = {uuid4().hex: get_binary_appointment_data() for _ in range(5)}
+    legacy_trackers = {uuid4().hex: get_binary_tracker_data() for _ in range(5)}
+
+    for uuid, appointment_data in legacy_appointments.items():
+        db_manager.db.put((WATCHER_PREFIX + uuid).encode("utf-8"), json.dumps(appointment_data).encode("utf-8"))
+    for uuid, tracker_data in legacy_trackers.items():
+        db_manager.db.put((RESPONDER_PREFIX + uuid).encode("utf-8"), json.dumps(tracker_data).encode("utf-8"))
+
+    # Legacy locator maps are stored as a json list under the locator
+    legacy_locator = get_random_value_hex(LOCATOR_LEN_BYTES)
+    legacy_locator_map = [uuid4().hex for _ in range(3)]
+    db_manager.db.put((LOCATOR_MAP_PREFIX + legacy_locator).encode("utf-8"), json.dumps(legacy_locator_map).encode())
+
+    # Records that do not fit the binary format are left as they are
+    unfit_uuid = uuid4().hex
+    unfit_appointment = generate_dummy_appointment()[0].to_dict()
+    db_manager.store_watcher_appointment(unfit_uuid, unfit_appointment)
+
+    appointments = db_manager.load_watcher_appointments(include_triggered=True)
+    trackers = db_manager.load_responder_trackers()
+    migrated = db_manager.migrate_records()
+
+    assert migrated.get(WATCHER_PREFIX) >= len(legacy_appointments)
+    assert migrated.get(RESPONDER_PREFIX) >= len(legacy_trackers)
+    assert migrated.get(LOCATOR_MAP_PREFIX) >= 1
+    assert load_locator_map(db_manager, legacy_locator) == set(legacy_locator_map)
+    assert db_manager.db.get((LOCATOR_MAP_PREFIX + legacy_locator).encode("utf-8")) is None
+
+    for uuid in list(legacy_appointments.keys()) + list(legacy_trackers.keys()):
+        prefix = WATCHER_PREFIX if uuid in legacy_appointments else RESPONDER_PREFIX
+        assert db_manager.db.get((prefix + uuid).encode("utf-8"))[:1] == RECORD_VERSION
+
+    assert db_manager.db.get((WATCHER_PREFIX + unfit_uuid).encode("utf-8")) == json.dumps(unfit_appointment).encode()
+
+    # The data is the same after the migration, and there is nothing else to migrate
+    assert db_manager.load_watcher_appointments(include_triggered=True) == appointments
+    assert db_manager.load_responder_trackers() == trackers
+    assert db_manager.migrate_records() == {WATCHER_PREFIX: 0, RESPONDER_PREFIX: 0, LOCATOR_MAP_PREFIX: 0}
+
+
+def test_migrate_records_on_open():
+    db_path = "test_migrate_records_db"
+    db_manager = open_create_db(db_path)
+
+    legacy_uuid = uuid4().hex
+    legacy_appointment = get_binary_appointment_data()
+    legacy_locator_map = [legacy_uuid, uuid4().hex]
+    db_manager.db.put((WATCHER_PREFIX + legacy_uuid).encode("utf-8"), json.dumps(legacy_appointment).encode("utf-8"))
+    db_manager.db.put(
+        (LOCATOR_MAP_PREFIX + legacy_appointment["locator"]).encode("utf-8"), json.dumps(legacy_locator_map).encode()
+    )
+
+    # Legacy records are migrated once the db is opened, so there is nothing left to migrate
+    db_manager.db.close()
+    db_manager = open_create_db(db_path)
+    assert db_manager.migrate_records() == {WATCHER_PREFIX: 0, RESPONDER_PREFIX: 0, LOCATOR_MAP_PREFIX: 0}
+
+    assert db_manager.db.get((WATCHER_PREFIX + legacy_uuid).encode("utf-8"))[:1] == RECORD_VERSION
+    assert db_manager.load_watcher_appointment(legacy_uuid) == legacy_appointment
+    assert load_locator_map(db_manager, legacy_appointment["locator"]) == set(legacy_locator_map)
+
+    # So the legacy maps are gone once all their uuids are deleted
+    db_manager.batch_delete_locator_map_entries({legacy_appointment["locator"]: legacy_locator_map})
+    assert len(list(db_manager.db.iterator(prefix=LOCATOR_MAP_PREFIX.encode("utf-8")))) == 0
+
+    db_manager.db.close()
+    shutil.rmtree(db_path)
@@ -1,6 +1,16 @@
+import time
 import pytest
+from threading import Thread, Event
+
 from teos.watcher import InvalidTransactionFormat
-from test.teos.unit.conftest import get_random_value_hex, generate_block, generate_blocks, fork
+from teos.block_processor import BlockProcessor, BlockCache, ChainTip
+from test.teos.unit.conftest import (
+    get_random_value_hex,
+    generate_block,
+    generate_blocks,
+    fork,
+    bitcoind_connect_params,
+)
 
 
 hex_tx = (
@@ -36,11 +46,131 @@ def test_get_random_block(block_processor):
     assert block is None
 
 
+def test_get_block_cached(block_processor):
+    best_block_hash = block_processor.get_best_block_hash()
+    block_processor.get_block(best_block_hash)
+    metrics = block_processor.block_cache.get_metrics()
+
+    # Requesting the same block again is served from the cache
+    block = block_processor.get_block(best_block_hash)
+    assert block is block_processor.block_cache.blocks.get(best_block_hash)
+    assert block_processor.block_cache.get_metrics().get("hits") == metrics.get("hits") + 1
+
+    # Unless the cache is bypassed
+    assert block_processor.get_block(best_block_hash, use_cache=False) is not block
+
+    # Blocks that are not found are not cached
+    block_hash = get_random_value_hex(32)
+    assert block_processor.get_block(block_hash) is None
+    assert block_hash not in block_processor.block_cache.blocks
+
+
+def test_block_cache_lru():
+    block_cache = BlockCache(max_size=3)
+    blocks = {get_random_value_hex(32): {"tx": [get_random_value_hex(32)]} for _ in range(4)}
+    block_hashes = list(blocks)
+
+    for block_hash in block_hashes[:3]:
+        assert block_cache.get(block_hash, blocks.get) == blocks[block_hash]
+
+    # Using the first block makes the second one the least recently used, so it is evicted when the fourth is added
+    block_cache.get(block_hashes[0], blocks.get)
+    block_cache.get(block_hashes[3], blocks.get)
+
+    assert list(block_cache.blocks) == [block_hashes[2], block_hashes[0], block_hashes[3]]
+    assert set(block_cache.sizes) == set(block_cache.blocks)
+    assert block_cache.size == sum(block_cache.sizes.values()) > 0
+
+    metrics = block_cache.get_metrics()
+    assert metrics.get("hits") == 1 and metrics.get("misses") == 4
+    assert metrics.get("hit_rate") == 1 / 5
+    assert metrics.get("blocks") == 3 and metrics.get("size") == block_cache.size
+
+
+def test_block_cache_disabled():
+    block_cache = BlockCache(max_size=0)
+    block_hash = get_random_value_hex(32)
+
+    assert block_cache.get(block_hash, lambda _: {"tx": []}) == {"tx": []}
+    assert len(block_cache.blocks) == 0 and block_cache.size == 0
+
+    with pytest.raises(ValueError):
+        BlockCache(max_size=-1)
+
+
+def test_block_cache_concurrent_requests():
+    # Concurrent requests for the same block only fetch it once
+    block_cache = BlockCache()
+    block_hash = get_random_value_hex(32)
+    fetching = Event()
+    release = Event()
+    fetched = []
+
+    def fetch(requested_hash):
+        fetched.append(requested_hash)
+        fetching.set()
+        release.wait()
+        return {"hash": requested_hash, "tx": []}
+
+    results = []
+    first = Thread(target=lambda: results.append(block_cache.get(block_hash, fetch)))
+    first.start()
+    fetching.wait()
+
+    second = Thread(target=lambda: results.append(block_cache.get(block_hash, fetch)))
+    second.start()
+    release.set()
+    first.join()
+    second.join()
+
+    assert fetched == [block_hash]
+    assert len(results) == 2 and results[0] is results[1]
+    assert block_cache.get_metrics().get("hits") == 1 and block_cache.get_metrics().get("misses") == 1
+
+
 def test_get_block_count(block_processor):
     block_count = block_processor.get_block_count()
     assert isinstance(block_count, int) and block_count >= 0
 
 
+def test_chain_tip():
+    chain_tip = ChainTip(max_age=0.5)
+    block_hash = get_random_value_hex(32)
+
+    # The height is unknown until a tip is set
+    assert chain_tip.get_height() is None
+    assert chain_tip.refresh(block_hash) is False
+
+    chain_tip.update(block_hash, 100)
+    assert chain_tip.get_height() == 100
+
+    # Only the current tip can be refreshed
+    assert chain_tip.refresh(get_random_value_hex(32)) is False
+    assert chain_tip.refresh(block_hash) is True
+
+    # Once stale, the height is not reported anymore until the tip is refreshed again
+    time.sleep(0.6)
+    assert chain_tip.get_height() is None
+    chain_tip.refresh(block_hash)
+    assert chain_tip.get_height() == 100
+
+
+def test_get_tip_height(run_bitcoind, monkeypatch):
+    block_processor = BlockProcessor(bitcoind_connect_params)
+
+    # bitcoind is queried while the tip is unknown
+    assert block_processor.get_tip_height() == block_processor.get_block_count()
+
+    # But not once the tip is set
+    block_processor.chain_tip.update(get_random_value_hex(32), 100)
+    monkeypatch.setattr(block_processor, "get_block_count", lambda: None)
+    assert block_processor.get_tip_height() == 100
+
+    # Stale tips are not trusted
+    block_processor.chain_tip.updated_at -= block_processor.chain_tip.max_age + 1
+    assert block_processor.get_tip_height() is None
+
+
 def test_decode_raw_transaction(block_processor):
     # We cannot exhaustively test this (we rely on bitcoind for this) but we can try to decode a correct transaction
     assert block_processor.decode_raw_transaction(hex_tx) is not None
@@ -52,6 +182,32 @@ def test_decode_raw_transaction_invalid(block_processor):
         block_processor.decode_raw_transaction(hex_tx[::-1])
 
 
+def test_decode_raw_transactions(block_processor):
+    # Well formatted transactions are decoded, the rest are set to None
+    decoded_txs = block_processor.decode_raw_transactions([hex_tx, hex_tx[::-1], hex_tx])
+
+    assert len(decoded_txs) == 2
+    assert decoded_txs[hex_tx] == block_processor.decode_raw_transaction(hex_tx)
+    assert decoded_txs[hex_tx[::-1]] is None
+
+
+def test_decode_raw_transaction_bitcoind(run_bitcoind):
+    # Decoding can also be delegated to bitcoind
+    block_processor = BlockProcessor(bitcoind_connect_params, local_tx_decoding=False)
+    assert block_processor.decode_raw_transaction(hex_tx) is not None
+
+    with pytest.raises(InvalidTransactionFormat):
+        block_processor.decode_raw_transaction(hex_tx[::-1])
+
+
+def test_decode_raw_transaction_local_matches_bitcoind(run_bitcoind):
+    # Both decoders must agree on the txid
+    local_bp = BlockProcessor(bitcoind_connect_params, local_tx_decoding=True)
+    remote_bp = BlockProcessor(bitcoind_connect_params, local_tx_decoding=False)
+
+    assert local_bp.decode_raw_transaction(hex_tx).get("txid") == remote_bp.decode_raw_transaction(hex_tx).get("txid")
+
+
 def test_get_missed_blocks(block_processor):
     target_block = block_processor.get_best_block_hash()
 
@@ -72,6 +228,60 @@ def test_get_missed_blocks(block_processor):
     assert block_processor.get_missed_blocks(block_tip) == missed_blocks[1:]
 
 
+def test_get_block_hashes(block_processor):
+    best_block = block_processor.get_block(block_processor.get_best_block_hash())
+    height = best_block.get("height")
+
+    block_hashes = block_processor.get_block_hashes(range(height - 1, height + 2))
+    assert block_hashes[0] == best_block.get("previousblockhash")
+    assert block_hashes[1] == best_block.get("hash")
+
+    # Heights over the tip cannot be found
+    assert block_hashes[-1] is None
+
+
+def test_get_blocks(block_processor):
+    generate_blocks(5)
+    best_block = block_processor.get_block(block_processor.get_best_block_hash())
+    height = best_block.get("height")
+    block_hashes = block_processor.get_block_hashes(range(height - 4, height + 1))
+
+    # The blocks are returned in order, and the ones that cannot be found are None
+    blocks = block_processor.get_blocks(block_hashes + [get_random_value_hex(32)])
+    assert [block.get("hash") for block in blocks[:-1]] == block_hashes
+    assert blocks[-1] is None
+
+
+def test_get_previous_blocks(block_processor):
+    generate_blocks(5)
+    best_block_hash = block_processor.get_best_block_hash()
+
+    blocks = block_processor.get_previous_blocks(best_block_hash, 5)
+    assert len(blocks) == 5 and blocks[-1].get("hash") == best_block_hash
+    for parent, child in zip(blocks, blocks[1:]):
+        assert child.get("previousblockhash") == parent.get("hash")
+
+    # Less blocks are returned if genesis is reached
+    genesis_hash = block_processor.get_block_hashes([0])[0]
+    assert [block.get("hash") for block in block_processor.get_previous_blocks(genesis_hash, 5)] == [genesis_hash]
+
+    # Unknown blocks return an empty list
+    assert block_processor.get_previous_blocks(get_random_value_hex(32), 5) == []
+
+
+def test_get_previous_blocks_stale_block(block_processor):
+    # Blocks that are not in the best chain cannot be found by height, so the chain is walked back from them
+    generate_blocks(3)
+    stale_block_hash = block_processor.get_best_block_hash()
+    stale_block = block_processor.get_block(stale_block_hash)
+    fork(block_processor.get_block(stale_block.get("previousblockhash")).get("previousblockhash"))
+    generate_blocks(3)
+
+    blocks = block_processor.get_previous_blocks(stale_block_hash, 3)
+    assert blocks[-1].get("hash") == stale_block_hash and blocks[-2].get("hash") == stale_block.get("previousblockhash")
+    assert blocks[0].get("hash") == blocks[1].get("previousblockhash")
+
+
 def test_get_distance_to_tip(block_processor):
     target_distance = 5
 
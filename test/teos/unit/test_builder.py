@@ -1,11 +1,13 @@
 import pytest
 from uuid import uuid4
 from queue import Queue
+from threading import Thread, Lock
 
 from teos.builder import Builder
 from teos.watcher import Watcher
 from teos.tools import bitcoin_cli
 from teos.responder import Responder
+from teos.block_processor import BlockCache
 
 from test.teos.unit.conftest import (
     get_random_value_hex,
@@ -45,7 +47,8 @@ def test_build_appointments():
     # Check that the created appointments match the data
     for uuid, appointment in appointments.items():
         assert uuid in appointments_data.keys()
-        assert appointments_data[uuid].get("locator") == appointment.get("locator")
+        # Locators are binary in memory
+        assert appointments_data[uuid].get("locator") == appointment.get("locator").hex()
         assert appointments_data[uuid].get("user_id") == appointment.get("user_id")
         assert uuid in locator_uuid_map[appointment.get("locator")]
 
@@ -94,6 +97,38 @@ def test_populate_block_queue():
     assert len(blocks) == 0
 
 
+def test_prefetch_blocks():
+    blocks = [get_random_value_hex(32) for _ in range(20)]
+    block_processor = BlockProcessorStub()
+
+    # Blocks are yielded in order, and all of them are fetched (only once) meanwhile
+    assert list(Builder.prefetch_blocks(block_processor, blocks)) == blocks
+    assert sorted(block_processor.fetched) == sorted(blocks)
+
+
+def test_prefetch_blocks_no_room():
+    # Nothing is prefetched if the blocks would not fit in the cache (alongside the ones that are still in use)
+    blocks = [get_random_value_hex(32) for _ in range(10)]
+    block_processor = BlockProcessorStub(block_cache_size=3)
+
+    assert list(Builder.prefetch_blocks(block_processor, blocks, in_use=3)) == blocks
+    assert block_processor.fetched == []
+
+
+def test_populate_block_queue_prefetch():
+    blocks = [get_random_value_hex(32) for _ in range(20)]
+    block_processor = BlockProcessorStub()
+    log = []
+    component = ComponentStub("watcher", log, Lock(), block_processor)
+
+    Builder.populate_block_queue(component.block_queue, blocks, block_processor)
+    component.block_queue.join()
+
+    # Blocks are processed in order and every block is only fetched once
+    assert [block for _, block in log] == blocks
+    assert sorted(block_processor.fetched) == sorted(blocks)
+
+
 def test_update_states_empty_list(db_manager, gatekeeper, carrier, block_processor):
     w = Watcher(
         db_manager=db_manager,
@@ -164,3 +199,115 @@ def test_update_states_watcher_misses_more(db_manager, gatekeeper, carrier, bloc
 
     assert db_manager.load_last_block_hash_watcher() == blocks[-1]
     assert db_manager.load_last_block_hash_responder() == blocks[-1]
+
+
+class BlockProcessorStub:
+    """Serves blocks through a block cache, counting the blocks fetched (from bitcoind)."""
+
+    def __init__(self, block_cache_size=16, prefetch_workers=4):
+        self.block_cache = BlockCache(block_cache_size)
+        self.prefetch_workers = prefetch_workers
+        self.fetched = []
+        self.lock = Lock()
+
+    def fetch_block(self, block_hash):
+        with self.lock:
+            self.fetched.append(block_hash)
+        return {"hash": block_hash}
+
+    def get_block(self, block_hash):
+        return self.block_cache.get(block_hash, self.fetch_block)
+
+
+class ComponentStub:
+    """Consumes a block queue like the Watcher and the Responder do, logging when each block is processed."""
+
+    def __init__(self, name, log, lock, block_processor=None):
+        self.name = name
+        self.log = log
+        self.lock = lock
+        self.block_processor = block_processor
+        self.block_queue = Queue()
+        Thread(target=self.do_watch, daemon=True).start()
+
+    def do_watch(self):
+        while True:
+            block_hash = self.block_queue.get()
+            if self.block_processor:
+                self.block_processor.get_block(block_hash)
+            with self.lock:
+                self.log.append((self.name, block_hash))
+            self.block_queue.task_done()
+
+
+def run_update_states_stubs(missed_blocks_watcher, missed_blocks_responder, max_lead, block_processor=None):
+    log = []
+    lock = Lock()
+    watcher = ComponentStub("watcher", log, lock, block_processor)
+    watcher.responder = ComponentStub("responder", log, lock, block_processor)
+
+    Builder.update_states(watcher, missed_blocks_watcher, missed_blocks_responder, max_lead, block_processor)
+
+    return log
+
+
+@pytest.mark.parametrize("max_lead", [1, 3, 6])
+def test_update_states_pipelined(max_lead):
+    blocks = [get_random_value_hex(32) for _ in range(20)]
+    log = run_update_states_stubs(blocks, blocks[5:], max_lead)
+
+    watcher_blocks = [block for name, block in log if name == "watcher"]
+    responder_blocks = [block for name, block in log if name == "responder"]
+
+    # Both process every block once and in order
+    assert watcher_blocks == blocks
+    assert responder_blocks == blocks[5:]
+
+    # The Responder only gets a block once the Watcher is done with it, and the Watcher never gets further than max_lead
+    # blocks ahead
+    for i, entry in enumerate(log):
+        name, block = entry
+        watcher_height = watcher_blocks.index(block) if name == "watcher" else None
+        processed_by_responder = len([e for e in log[:i] if e[0] == "responder"])
+
+        if name == "responder":
+            assert ("watcher", block) in log[:i]
+        else:
+            assert watcher_height - (5 + processed_by_responder) < max_lead
+
+    if max_lead == 1:
+        # Strictly block by block once both are at the same height
+        assert log[5:] == [(name, block) for block in blocks[5:] for name in ["watcher", "responder"]]
+
+
+def test_update_states_pipelined_responder_misses_more():
+    blocks = [get_random_value_hex(32) for _ in range(10)]
+    log = run_update_states_stubs(blocks[3:], blocks, max_lead=3)
+
+    assert [block for name, block in log if name == "watcher"] == blocks[3:]
+    assert [block for name, block in log if name == "responder"] == blocks
+
+
+def test_update_states_pipelined_watcher_misses_more():
+    blocks = [get_random_value_hex(32) for _ in range(10)]
+    log = run_update_states_stubs(blocks, blocks[3:], max_lead=3)
+
+    assert [block for name, block in log if name == "watcher"] == blocks
+    assert [block for name, block in log if name == "responder"] == blocks[3:]
+
+    # The Responder only gets the blocks it missed once the Watcher is done with them
+    for i, (name, block) in enumerate(log):
+        if name == "responder":
+            assert ("watcher", block) in log[:i]
+
+
+def test_update_states_pipelined_prefetch():
+    blocks = [get_random_value_hex(32) for _ in range(30)]
+    block_processor = BlockProcessorStub()
+    log = run_update_states_stubs(blocks, blocks[5:], 6, block_processor)
+
+    assert [block for name, block in log if name == "watcher"] == blocks
+    assert [block for name, block in log if name == "responder"] == blocks[5:]
+
+    # Blocks are prefetched for both, but they are only fetched once (and never evicted before being processed)
+    assert sorted(block_processor.fetched) == sorted(blocks)
@@ -60,3 +60,48 @@ def test_get_non_existing_transaction(carrier):
     tx_info = carrier.get_transaction(get_random_value_hex(32))
 
     assert tx_info is None
+
+
+def test_get_transactions(carrier):
+    # bitcoind_mock does not support batches, so this also covers the fallback to single requests
+    unknown_txid = get_random_value_hex(32)
+    txs = carrier.get_transactions(sent_txs + [unknown_txid] + sent_txs)
+
+    assert set(txs.keys()) == set(sent_txs + [unknown_txid])
+    assert all(txs[txid] is not None for txid in sent_txs)
+    assert txs[unknown_txid] is None
+
+
+def test_get_transactions_batched(carrier, monkeypatch):
+    txids = [get_random_value_hex(32) for _ in range(5)]
+    batches = []
+
+    class BatchRPC:
+        def __getattr__(self, name):
+            return self
+
+        def get_request(self, *args):
+            return {"method": "getrawtransaction", "params": args, "id": None}
+
+        def batch(self, requests):
+            batches.append(requests)
+            # Responses may come in any order, the last txid of every batch is not found
+            responses = [
+                {"id": r["id"], "result": {"confirmations": r["params"][0]}, "error": None} for r in requests[:-1]
+            ]
+            responses.append({"id": requests[-1]["id"], "result": None, "error": {"code": -5, "message": ""}})
+
+            return responses[::-1]
+
+    monkeypatch.setattr("teos.tools.bitcoin_cli", lambda params: BatchRPC())
+    monkeypatch.setattr(carrier, "batch_size", 2)
+
+    txs = carrier.get_transactions(txids)
+
+    # 5 txids in chunks of 2 should take 3 batches
+    assert len(batches) == 3
+    for i, txid in enumerate(txids):
+        if i % 2 == 1 or i == len(txids) - 1:
+            assert txs[txid] is None
+        else:
+            assert txs[txid] == {"confirmations": txid}
@@ -4,8 +4,14 @@ from queue import Queue
 from threading import Thread, Event, Condition
 
 from teos.chain_monitor import ChainMonitor
+from teos.block_processor import BlockProcessor
 
-from test.teos.unit.conftest import get_random_value_hex, generate_block, bitcoind_feed_params
+from test.teos.unit.conftest import (
+    get_random_value_hex,
+    generate_block,
+    bitcoind_feed_params,
+    bitcoind_connect_params,
+)
 
 
 def test_init(run_bitcoind, block_processor):
@@ -62,6 +68,26 @@ def test_update_state(block_processor):
     assert chain_monitor.best_tip == another_block_hash and new_block_hash == chain_monitor.last_tips[-1]
 
 
+def test_update_chain_tip(run_bitcoind):
+    block_processor = BlockProcessor(bitcoind_connect_params)
+    chain_monitor = ChainMonitor(Queue(), Queue(), block_processor, bitcoind_feed_params)
+
+    # A new tip is fetched to get its height
+    best_block_hash = block_processor.get_best_block_hash()
+    chain_monitor.update_chain_tip(best_block_hash)
+    assert block_processor.chain_tip.block_hash == best_block_hash
+    assert block_processor.chain_tip.get_height() == block_processor.get_block(best_block_hash).get("height")
+
+    # The same tip is only refreshed
+    block_processor.chain_tip.updated_at = 0
+    chain_monitor.update_chain_tip(best_block_hash)
+    assert block_processor.chain_tip.get_height() == block_processor.get_block(best_block_hash).get("height")
+
+    # Unknown blocks are ignored
+    chain_monitor.update_chain_tip(get_random_value_hex(32))
+    assert block_processor.chain_tip.block_hash == best_block_hash
+
+
 def test_monitor_chain_polling(db_manager, block_processor):
     # Try polling with the Watcher
     watcher_queue = Queue()
@@ -88,6 +114,36 @@ def test_monitor_chain_polling(db_manager, block_processor):
     polling_thread.join()
 
 
+def test_monitor_chain_polling_old_tip(run_bitcoind, monkeypatch):
+    # A tip received via polling that is older than the one received via zmq does not move the chain tip back
+    block_processor = BlockProcessor(bitcoind_connect_params)
+    chain_monitor = ChainMonitor(Queue(), Queue(), block_processor, bitcoind_feed_params)
+    chain_monitor.polling_delta = 0.1
+
+    old_tip = block_processor.get_best_block_hash()
+    chain_monitor.best_tip = old_tip
+    chain_monitor.update_chain_tip(old_tip)
+
+    generate_block()
+    new_tip = block_processor.get_best_block_hash()
+    assert chain_monitor.update_state(new_tip) is True
+    chain_monitor.update_chain_tip(new_tip)
+    new_height = block_processor.chain_tip.get_height()
+
+    monkeypatch.setattr(block_processor, "get_best_block_hash", lambda: old_tip)
+    polling_thread = Thread(target=chain_monitor.monitor_chain_polling, daemon=True)
+    polling_thread.start()
+    time.sleep(0.5)
+
+    chain_monitor.terminate = True
+    polling_thread.join()
+
+    assert chain_monitor.best_tip == new_tip
+    assert block_processor.chain_tip.block_hash == new_tip
+    assert block_processor.chain_tip.get_height() == new_height
+    assert chain_monitor.watcher_queue.empty()
+
+
 def test_monitor_chain_zmq(db_manager, block_processor):
     responder_queue = Queue()
     chain_monitor = ChainMonitor(Queue(), responder_queue, block_processor, bitcoind_feed_params)
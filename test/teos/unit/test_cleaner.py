@@ -6,7 +6,7 @@ from teos.gatekeeper import UserInfo
 from teos.responder import TransactionTracker
 from common.appointment import Appointment
 
-from test.teos.unit.conftest import get_random_value_hex
+from test.teos.unit.conftest import get_random_value_hex, load_locator_map
 
 from common.constants import LOCATOR_LEN_BYTES, LOCATOR_LEN_HEX
 
@@ -25,8 +25,9 @@ def set_up_appointments(db_manager, total_appointments):
         locator = get_random_value_hex(LOCATOR_LEN_BYTES)
 
         appointment = Appointment(locator, None, None)
-        appointments[uuid] = {"locator": appointment.locator}
-        locator_uuid_map[locator] = [uuid]
+        # Locators are binary in memory
+        appointments[uuid] = {"locator": bytes.fromhex(locator)}
+        locator_uuid_map[bytes.fromhex(locator)] = [uuid]
 
         db_manager.store_watcher_appointment(uuid, appointment.to_dict())
         db_manager.create_append_locator_map(locator, uuid)
@@ -35,8 +36,8 @@ def set_up_appointments(db_manager, total_appointments):
         if i % 2:
             uuid = uuid4().hex
 
-            appointments[uuid] = {"locator": appointment.locator}
-            locator_uuid_map[locator].append(uuid)
+            appointments[uuid] = {"locator": bytes.fromhex(locator)}
+            locator_uuid_map[bytes.fromhex(locator)].append(uuid)
 
             db_manager.store_watcher_appointment(uuid, appointment.to_dict())
             db_manager.create_append_locator_map(locator, uuid)
@@ -99,31 +100,25 @@ def test_delete_appointment_from_db(db_manager):
         assert db_manager.load_watcher_appointment(uuid) is None
 
 
-def test_update_delete_db_locator_map(db_manager):
-    appointments, locator_uuid_map = set_up_appointments(db_manager, MAX_ITEMS)
-
-    for uuid, appointment in appointments.items():
-        locator = appointment.get("locator")
-        locator_map_before = db_manager.load_locator_map(locator)
-        Cleaner.update_delete_db_locator_map([uuid], locator, db_manager)
-        locator_map_after = db_manager.load_locator_map(locator)
-
-        if locator_map_after is None:
-            assert locator_map_before is not None
-
-        else:
-            assert uuid in locator_map_before and uuid not in locator_map_after
-
-
 def test_delete_expired_appointment(db_manager):
     for _ in range(ITERATIONS):
         appointments, locator_uuid_map = set_up_appointments(db_manager, MAX_ITEMS)
         expired_appointments = random.sample(list(appointments.keys()), k=ITEMS)
+        # The database locator maps are indexed by hex-encoded locators
+        locators = {uuid: appointments[uuid].get("locator").hex() for uuid in expired_appointments}
 
         Cleaner.delete_expired_appointments(expired_appointments, appointments, locator_uuid_map, db_manager)
 
         assert not set(expired_appointments).issubset(appointments.keys())
 
+        # The uuids are removed from the db locator maps too (and the maps are gone if there is nothing left)
+        for uuid, locator in locators.items():
+            locator_map = load_locator_map(db_manager, locator)
+            assert uuid not in locator_map
+
+            if not locator_map:
+                assert bytes.fromhex(locator) not in locator_uuid_map
+
 
 def test_delete_completed_appointments(db_manager):
     for _ in range(ITERATIONS):
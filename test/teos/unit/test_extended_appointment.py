@@ -43,7 +43,7 @@ def test_init_appointment(appointment_data):
 
 def test_get_summary(appointment_data):
     assert ExtendedAppointment.from_dict(appointment_data).get_summary() == {
-        "locator": appointment_data["locator"],
+        "locator": bytes.fromhex(appointment_data["locator"]),
         "user_id": appointment_data["user_id"],
     }
 
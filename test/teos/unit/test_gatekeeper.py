@@ -2,7 +2,7 @@ import pytest
 
 from teos.users_dbm import UsersDBM
 from teos.block_processor import BlockProcessor
-from teos.gatekeeper import AuthenticationFailure, NotEnoughSlots, UserInfo
+from teos.gatekeeper import Gatekeeper, AuthenticationFailure, NotEnoughSlots, UserInfo, EXPIRY_INDEX_DEPTH
 
 from common.cryptographer import Cryptographer
 from common.exceptions import InvalidParameter
@@ -57,6 +57,38 @@ def test_add_update_user(gatekeeper):
         ].subscription_expiry == gatekeeper.block_processor.get_block_count() + config.get("SUBSCRIPTION_DURATION")
 
 
+def test_add_update_user_expiry_index(gatekeeper, monkeypatch):
+    # Users are indexed by the height their appointments expire at, and moved within the index on renewals
+    user_id = "02" + get_random_value_hex(32)
+    gatekeeper.add_update_user(user_id)
+    expiry_height = gatekeeper.registered_users[user_id].subscription_expiry + gatekeeper.expiry_delta
+    assert user_id in gatekeeper.expiring_users[expiry_height]
+
+    uuid = get_random_value_hex(16)
+    gatekeeper.registered_users[user_id].appointments[uuid] = 1
+    assert uuid in gatekeeper.get_expired_appointments(expiry_height)
+
+    # Renewing the subscription moves the user to the new height (and drops the cached lookup for the old one)
+    block_height = gatekeeper.registered_users[user_id].subscription_expiry
+    monkeypatch.setattr(gatekeeper.block_processor, "get_block_count", lambda: block_height)
+    gatekeeper.add_update_user(user_id)
+
+    new_expiry_height = gatekeeper.registered_users[user_id].subscription_expiry + gatekeeper.expiry_delta
+    assert user_id not in gatekeeper.expiring_users.get(expiry_height, set())
+    assert uuid not in gatekeeper.get_expired_appointments(expiry_height)
+    assert uuid in gatekeeper.get_expired_appointments(new_expiry_height)
+
+    # A new Gatekeeper rebuilds the index from the db
+    new_gatekeeper = Gatekeeper(
+        gatekeeper.user_db,
+        gatekeeper.block_processor,
+        gatekeeper.subscription_slots,
+        gatekeeper.subscription_duration,
+        gatekeeper.expiry_delta,
+    )
+    assert user_id in new_gatekeeper.expiring_users[new_expiry_height]
+
+
 def test_add_update_user_wrong_id(gatekeeper):
     # Passing a wrong pk defaults to the errors in check_user_pk. We can try with one.
     wrong_id = get_random_value_hex(32)
@@ -164,6 +196,9 @@ def test_add_update_appointment(gatekeeper):
     remaining_slots = gatekeeper.add_update_appointment(user_id, appointment_uuid, appointment)
     assert remaining_slots == config.get("SUBSCRIPTION_SLOTS") - 1
 
+    # The changes are also reflected in the db
+    assert gatekeeper.user_db.load_user(user_id) == gatekeeper.registered_users[user_id].to_dict()
+
     # If the appointment needs more slots than there's free, it should fail
     gatekeeper.registered_users[user_id].available_slots = 1
     appointment_uuid = get_random_value_hex(16)
@@ -171,6 +206,38 @@ def test_add_update_appointment(gatekeeper):
         gatekeeper.add_update_appointment(user_id, appointment_uuid, appointment_x2_size)
 
 
+def test_add_update_appointments(gatekeeper):
+    # Appointments from different users can be added at once
+    user_ids = [Cryptographer.get_compressed_pk(generate_keypair()[1]) for _ in range(2)]
+    for user_id in user_ids:
+        gatekeeper.add_update_user(user_id)
+
+    appointment, _ = generate_dummy_appointment()
+    appointments = [(user_id, get_random_value_hex(16), appointment) for user_id in user_ids for _ in range(3)]
+    remaining_slots = gatekeeper.add_update_appointments(appointments)
+
+    # Every appointment gets the remaining slots of its user at the time it was added
+    assert remaining_slots == [config.get("SUBSCRIPTION_SLOTS") - i for _ in user_ids for i in range(1, 4)]
+
+    for user_id in user_ids:
+        assert gatekeeper.user_db.load_user(user_id) == gatekeeper.registered_users[user_id].to_dict()
+
+    # Appointments that do not fit are skipped, but the rest are still added
+    gatekeeper.registered_users[user_ids[0]].available_slots = 1
+    appointment_x2_size, _ = generate_dummy_appointment()
+    appointment_x2_size.encrypted_blob = "A" * (ENCRYPTED_BLOB_MAX_SIZE_HEX + 1)
+    appointments = [
+        (user_ids[0], get_random_value_hex(16), appointment_x2_size),
+        (user_ids[0], get_random_value_hex(16), appointment),
+        (user_ids[0], get_random_value_hex(16), appointment),
+    ]
+
+    assert gatekeeper.add_update_appointments(appointments) == [None, 0, None]
+    assert appointments[1][1] in gatekeeper.registered_users[user_ids[0]].appointments
+    assert appointments[0][1] not in gatekeeper.registered_users[user_ids[0]].appointments
+    assert gatekeeper.user_db.load_user(user_ids[0]) == gatekeeper.registered_users[user_ids[0]].to_dict()
+
+
 def test_get_expired_appointments(gatekeeper):
     # get_expired_appointments returns a list of appointment uuids expiring at a given block
 
@@ -184,6 +251,83 @@ def test_get_expired_appointments(gatekeeper):
         gatekeeper.registered_users[uuid] = UserInfo(100, i, user_appointments)
         appointment[i] = user_appointments
 
+    gatekeeper.rebuild_expiry_index()
+
     # Now let's check that reversed
     for i in range(100):
         assert gatekeeper.get_expired_appointments(i + gatekeeper.expiry_delta) == appointment[i]
+
+
+def test_get_expired_appointments_updated(gatekeeper, run_bitcoind):
+    # Appointments added after a height has been checked are found if it is checked again (e.g. by the Responder)
+    user_id = "02" + get_random_value_hex(32)
+    gatekeeper.add_update_user(user_id)
+    expiry_height = gatekeeper.registered_users[user_id].subscription_expiry + gatekeeper.expiry_delta
+
+    appointment, _ = generate_dummy_appointment()
+    uuid = get_random_value_hex(16)
+    assert uuid not in gatekeeper.get_expired_appointments(expiry_height)
+
+    gatekeeper.add_update_appointment(user_id, uuid, appointment)
+    assert uuid in gatekeeper.get_expired_appointments(expiry_height)
+
+
+def test_get_expired_appointments_prune(gatekeeper):
+    user_ids = ["02" + get_random_value_hex(32) for _ in range(3)]
+    for i, user_id in enumerate(user_ids):
+        gatekeeper.registered_users[user_id] = UserInfo(100, 1000 + i * EXPIRY_INDEX_DEPTH)
+    gatekeeper.rebuild_expiry_index()
+
+    # Heights that are deep enough are dropped from the index once a newer height is checked
+    gatekeeper.get_expired_appointments(1000 + gatekeeper.expiry_delta + EXPIRY_INDEX_DEPTH + 1)
+    assert user_ids[0] not in gatekeeper.expiring_users.get(1000 + gatekeeper.expiry_delta, set())
+    assert user_ids[1] in gatekeeper.expiring_users[1000 + EXPIRY_INDEX_DEPTH + gatekeeper.expiry_delta]
+    assert user_ids[2] in gatekeeper.expiring_users[1000 + 2 * EXPIRY_INDEX_DEPTH + gatekeeper.expiry_delta]
+
+
+def test_get_expired_appointments_lagging_responder(gatekeeper):
+    # While catching up the Responder checks the same heights as the Watcher, up to max_lead blocks later
+    gatekeeper.registered_users = {}
+    appointments = {}
+    for i in range(20):
+        user_id = "02" + get_random_value_hex(32)
+        appointments[2000 + i + gatekeeper.expiry_delta] = [get_random_value_hex(16)]
+        gatekeeper.registered_users[user_id] = UserInfo(
+            100, 2000 + i, {appointments[2000 + i + gatekeeper.expiry_delta][0]: 1}
+        )
+    gatekeeper.rebuild_expiry_index()
+
+    heights = sorted(appointments)
+    for height in heights[: gatekeeper.max_lead]:
+        assert gatekeeper.get_expired_appointments(height) == appointments[height]
+
+    for i, height in enumerate(heights[gatekeeper.max_lead :]):
+        assert gatekeeper.get_expired_appointments(height) == appointments[height]
+
+        # The lookup of the Watcher is still there when the Responder gets to the same height
+        assert heights[i] in gatekeeper.expired_appointments_cache
+        assert gatekeeper.get_expired_appointments(heights[i]) == appointments[heights[i]]
+
+    assert len(gatekeeper.expired_appointments_cache) == gatekeeper.max_lead + 1
+
+
+def test_get_expired_appointments_max_lead_over_index_depth(gatekeeper):
+    # Heights are not pruned from the index while a Responder lagging max_lead blocks behind can still check them
+    max_lead = EXPIRY_INDEX_DEPTH + 50
+    new_gatekeeper = Gatekeeper(
+        gatekeeper.user_db,
+        gatekeeper.block_processor,
+        gatekeeper.subscription_slots,
+        gatekeeper.subscription_duration,
+        gatekeeper.expiry_delta,
+        max_lead,
+    )
+
+    user_id = "02" + get_random_value_hex(32)
+    uuid = get_random_value_hex(16)
+    new_gatekeeper.registered_users = {user_id: UserInfo(100, 3000, {uuid: 1})}
+    new_gatekeeper.rebuild_expiry_index()
+
+    expiry_height = 3000 + new_gatekeeper.expiry_delta
+    new_gatekeeper.get_expired_appointments(expiry_height + max_lead)
+    assert new_gatekeeper.get_expired_appointments(expiry_height) == [uuid]
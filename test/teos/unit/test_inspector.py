@@ -192,6 +192,29 @@ def test_inspect(run_bitcoind):
     )
 
 
+def test_inspect_chain_tip(monkeypatch):
+    # bitcoind is not queried as long as the chain tip is fresh
+    block_processor = BlockProcessor(bitcoind_connect_params)
+    block_processor.chain_tip.update(get_random_value_hex(32), 100)
+    monkeypatch.setattr(block_processor, "get_block_count", lambda: None)
+
+    appointment_data = {
+        "locator": get_random_value_hex(LOCATOR_LEN_BYTES),
+        "to_self_delay": MIN_TO_SELF_DELAY,
+        "encrypted_blob": get_random_value_hex(64),
+    }
+    assert isinstance(Inspector(block_processor, MIN_TO_SELF_DELAY).inspect(appointment_data), ExtendedAppointment)
+
+    # Once stale, bitcoind is queried (and the appointment rejected if it cannot be reached)
+    block_processor.chain_tip.updated_at = 0
+    with pytest.raises(InspectionFailed):
+        try:
+            Inspector(block_processor, MIN_TO_SELF_DELAY).inspect(appointment_data)
+        except InspectionFailed as e:
+            assert e.erno == errors.UNKNOWN_JSON_RPC_EXCEPTION
+            raise e
+
+
 def test_inspect_wrong(run_bitcoind):
     # Wrong types (taking out empty dict, since that's a different error)
     wrong_types = WRONG_TYPES.pop(WRONG_TYPES.index({}))
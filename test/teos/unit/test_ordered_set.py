@@ -0,0 +1,63 @@
+import pytest
+
+from teos.utils.ordered_set import OrderedSet
+
+from test.teos.unit.conftest import get_random_value_hex
+
+
+def test_init():
+    assert len(OrderedSet()) == 0
+
+    items = [get_random_value_hex(32) for _ in range(10)]
+    assert list(OrderedSet(items)) == items
+
+    # Duplicates are only kept once, in the place they were first seen
+    assert list(OrderedSet(items + items[:5])) == items
+
+
+def test_add_keeps_insertion_order():
+    ordered_set = OrderedSet()
+    items = [get_random_value_hex(32) for _ in range(10)]
+
+    for item in items:
+        ordered_set.add(item)
+
+    # Adding an existing item does not move it
+    ordered_set.add(items[0])
+    assert list(ordered_set) == items
+
+    # Items removed and added again go to the end
+    ordered_set.remove(items[0])
+    ordered_set.add(items[0])
+    assert list(ordered_set) == items[1:] + items[:1]
+
+
+def test_update():
+    items = [get_random_value_hex(32) for _ in range(10)]
+    ordered_set = OrderedSet(items[:5])
+    ordered_set.update(items[3:])
+
+    assert list(ordered_set) == items
+
+
+def test_remove_discard():
+    items = [get_random_value_hex(32) for _ in range(10)]
+    ordered_set = OrderedSet(items)
+
+    ordered_set.remove(items[0])
+    ordered_set.discard(items[1])
+    assert items[0] not in ordered_set and items[1] not in ordered_set
+    assert list(ordered_set) == items[2:]
+
+    # Discarding a missing item is fine, but removing it is not
+    ordered_set.discard(items[0])
+    with pytest.raises(KeyError):
+        ordered_set.remove(items[0])
+
+
+def test_eq():
+    items = [get_random_value_hex(32) for _ in range(10)]
+
+    assert OrderedSet(items) == OrderedSet(items)
+    assert OrderedSet(items) != OrderedSet(reversed(items))
+    assert OrderedSet(items) != items
@@ -12,9 +12,10 @@ from teos.chain_monitor import ChainMonitor
 from teos.block_processor import BlockProcessor
 from teos.gatekeeper import Gatekeeper, UserInfo
 from teos.appointments_dbm import AppointmentsDBM
+from teos.utils.ordered_set import OrderedSet
 from teos.responder import Responder, TransactionTracker, CONFIRMATIONS_BEFORE_RETRY
 
-from common.constants import LOCATOR_LEN_HEX
+from common.constants import LOCATOR_LEN_HEX, IRREVOCABLY_RESOLVED
 from bitcoind_mock.transaction import create_dummy_transaction, create_tx_from_hex
 from test.teos.unit.conftest import (
     generate_block,
@@ -144,7 +145,7 @@ def test_init_responder(temp_db_manager, gatekeeper, carrier, block_processor):
     responder = Responder(temp_db_manager, gatekeeper, carrier, block_processor)
     assert isinstance(responder.trackers, dict) and len(responder.trackers) == 0
     assert isinstance(responder.tx_tracker_map, dict) and len(responder.tx_tracker_map) == 0
-    assert isinstance(responder.unconfirmed_txs, list) and len(responder.unconfirmed_txs) == 0
+    assert isinstance(responder.unconfirmed_txs, OrderedSet) and len(responder.unconfirmed_txs) == 0
     assert isinstance(responder.missed_confirmations, dict) and len(responder.missed_confirmations) == 0
     assert isinstance(responder.block_queue, Queue) and responder.block_queue.empty()
     assert isinstance(responder.db_manager, AppointmentsDBM)
@@ -306,7 +307,7 @@ def test_do_watch(temp_db_manager, gatekeeper, carrier, block_processor):
         responder.trackers[uuid] = tracker.get_summary()
         responder.tx_tracker_map[tracker.penalty_txid] = [uuid]
         responder.missed_confirmations[tracker.penalty_txid] = 0
-        responder.unconfirmed_txs.append(tracker.penalty_txid)
+        responder.unconfirmed_txs.add(tracker.penalty_txid)
         # Assuming the appointment only took a single slot
         responder.gatekeeper.registered_users[tracker.user_id].appointments[uuid] = 1
 
@@ -314,6 +315,9 @@ def test_do_watch(temp_db_manager, gatekeeper, carrier, block_processor):
         responder.db_manager.create_triggered_appointment_flag(uuid)
         responder.db_manager.store_responder_tracker(uuid, tracker.to_dict())
 
+    # Users are added straight to the Gatekeeper, so the expiry index needs to be rebuilt
+    responder.gatekeeper.rebuild_expiry_index()
+
     # Let's start to watch
     Thread(target=responder.do_watch, daemon=True).start()
 
@@ -361,9 +365,9 @@ def test_check_confirmations(db_manager, gatekeeper, carrier, block_processor):
     txs = [get_random_value_hex(32) for _ in range(20)]
 
     # The responder has a list of unconfirmed transaction, let make that some of them are the ones we've received
-    responder.unconfirmed_txs = [get_random_value_hex(32) for _ in range(10)]
+    responder.unconfirmed_txs = OrderedSet(get_random_value_hex(32) for _ in range(10))
     txs_subset = random.sample(txs, k=10)
-    responder.unconfirmed_txs.extend(txs_subset)
+    responder.unconfirmed_txs.update(txs_subset)
 
     # We also need to add them to the tx_tracker_map since they would be there in normal conditions
     responder.tx_tracker_map = {
@@ -373,12 +377,15 @@ def test_check_confirmations(db_manager, gatekeeper, carrier, block_processor):
     # Let's make sure that there are no txs with missed confirmations yet
     assert len(responder.missed_confirmations) == 0
 
-    responder.check_confirmations(txs)
+    height = block_processor.get_block_count()
+    responder.check_confirmations(txs, height)
 
     # After checking confirmations the txs in txs_subset should be confirmed (not part of unconfirmed_txs anymore)
-    # and the rest should have a missing confirmation
+    # and the rest should have a missing confirmation. The confirmation height of the former is also recorded.
     for tx in txs_subset:
         assert tx not in responder.unconfirmed_txs
+        assert responder.confirmation_heights[tx] == height
+        assert tx in responder.resolution_index[height + IRREVOCABLY_RESOLVED - 1]
 
     for tx in responder.unconfirmed_txs:
         assert responder.missed_confirmations[tx] == 1
@@ -426,7 +433,7 @@ def test_get_completed_trackers(db_manager, gatekeeper, carrier, block_processor
     trackers_unconfirmed = {}
     for _ in range(10):
         tracker = create_dummy_tracker(penalty_rawtx=create_dummy_transaction().hex())
-        responder.unconfirmed_txs.append(tracker.penalty_txid)
+        responder.unconfirmed_txs.add(tracker.penalty_txid)
         trackers_unconfirmed[uuid4().hex] = tracker
 
     all_trackers = {}
@@ -437,29 +444,153 @@ def test_get_completed_trackers(db_manager, gatekeeper, carrier, block_processor
     # Let's add all to the Responder
     for uuid, tracker in all_trackers.items():
         responder.trackers[uuid] = tracker.get_summary()
+        responder.tx_tracker_map[tracker.penalty_txid] = [uuid]
 
+    # The status of the first set of penalties is unknown to the Responder (e.g. if the trackers are loaded from the
+    # db), so they will be queried to bitcoind and indexed
     for uuid, tracker in trackers_ir_resolved.items():
         bitcoin_cli(bitcoind_connect_params).sendrawtransaction(tracker.penalty_rawtx)
+        responder.unindexed_txs.add(tracker.penalty_txid)
 
     generate_block_w_delay()
 
+    # The second set is confirmed while the Responder is watching
     for uuid, tracker in trackers_confirmed.items():
         bitcoin_cli(bitcoind_connect_params).sendrawtransaction(tracker.penalty_rawtx)
+        responder.unconfirmed_txs.add(tracker.penalty_txid)
+
+    generate_block_w_delay()
+    responder.check_confirmations(
+        [tracker.penalty_txid for tracker in trackers_confirmed.values()], block_processor.get_block_count()
+    )
 
     # ir_resolved have 100 confirmations and confirmed have 99
-    generate_blocks_w_delay(99)
+    generate_blocks_w_delay(98)
 
     # Let's check
-    completed_trackers = responder.get_completed_trackers()
-    ended_trackers_keys = list(trackers_ir_resolved.keys())
-    assert set(completed_trackers) == set(ended_trackers_keys)
+    completed_trackers = responder.get_completed_trackers(block_processor.get_block_count())
+    assert set(completed_trackers) == set(trackers_ir_resolved.keys())
+    assert len(responder.unindexed_txs) == 0
 
-    # Generating 1 additional blocks should also include confirmed
+    # Generating 1 additional blocks should complete the confirmed ones. Completed trackers are only reported once.
     generate_block_w_delay()
 
-    completed_trackers = responder.get_completed_trackers()
-    ended_trackers_keys.extend(list(trackers_confirmed.keys()))
-    assert set(completed_trackers) == set(ended_trackers_keys)
+    completed_trackers = responder.get_completed_trackers(block_processor.get_block_count())
+    assert set(completed_trackers) == set(trackers_confirmed.keys())
+
+    # The unconfirmed ones are never completed
+    assert not responder.resolution_index and not responder.confirmation_heights
+    assert set(tracker.penalty_txid for tracker in trackers_unconfirmed.values()).issubset(responder.unconfirmed_txs)
+
+
+def test_index_confirmations(db_manager, gatekeeper, carrier, block_processor):
+    responder = Responder(db_manager, gatekeeper, carrier, block_processor)
+
+    # Penalties that are not on chain are flagged as unconfirmed once indexed
+    penalty_txid = get_random_value_hex(32)
+    responder.unindexed_txs.add(penalty_txid)
+    responder.index_confirmations()
+
+    assert penalty_txid in responder.unconfirmed_txs
+    assert penalty_txid not in responder.confirmation_heights
+    assert len(responder.unindexed_txs) == 0
+
+    # While the ones on chain are indexed by their confirmation height
+    penalty_rawtx = create_dummy_transaction().hex()
+    penalty_txid = create_tx_from_hex(penalty_rawtx).tx_id.hex()
+    bitcoin_cli(bitcoind_connect_params).sendrawtransaction(penalty_rawtx)
+    generate_blocks_w_delay(2)
+
+    responder.unindexed_txs.add(penalty_txid)
+    responder.index_confirmations()
+    assert responder.confirmation_heights[penalty_txid] == block_processor.get_block_count() - 1
+
+
+def test_index_confirmations_tracker_added_meanwhile(db_manager, gatekeeper, carrier, block_processor, monkeypatch):
+    responder = Responder(db_manager, gatekeeper, carrier, block_processor)
+
+    queried_txid = get_random_value_hex(32)
+    responder.unindexed_txs.add(queried_txid)
+    # A confirmed transaction that was flagged as unconfirmed is not anymore once indexed
+    responder.unconfirmed_txs.add(queried_txid)
+
+    # A tracker for an already confirmed penalty is added (by the Watcher) while bitcoind is being queried
+    uuid = uuid4().hex
+    locator, dispute_txid, penalty_txid, penalty_rawtx, user_id = create_dummy_tracker_data(random_txid=True)
+
+    def get_transactions(txids):
+        responder.add_tracker(uuid, locator, dispute_txid, penalty_txid, penalty_rawtx, user_id, confirmations=1)
+        return {txid: {"confirmations": 1} for txid in txids}
+
+    monkeypatch.setattr(responder.carrier, "get_transactions", get_transactions)
+    responder.index_confirmations()
+
+    assert queried_txid in responder.confirmation_heights
+    assert queried_txid not in responder.unconfirmed_txs
+    assert queried_txid not in responder.unindexed_txs
+
+    # The penalty that was not part of the query is left to be indexed
+    assert penalty_txid in responder.unindexed_txs
+    assert penalty_txid not in responder.confirmation_heights
+
+
+def test_index_confirmations_tip_moved(db_manager, gatekeeper, carrier, block_processor, monkeypatch):
+    responder = Responder(db_manager, gatekeeper, carrier, block_processor)
+
+    penalty_rawtx = create_dummy_transaction().hex()
+    penalty_txid = create_tx_from_hex(penalty_rawtx).tx_id.hex()
+    bitcoin_cli(bitcoind_connect_params).sendrawtransaction(penalty_rawtx)
+    generate_blocks_w_delay(2)
+    confirmation_height = block_processor.get_block_count() - 1
+
+    # A block found while bitcoind is being queried would make the confirmation height off by one
+    get_transactions = responder.carrier.get_transactions
+
+    def get_transactions_new_block(txids):
+        txs = get_transactions(txids)
+        generate_blocks_w_delay(1)
+        return txs
+
+    monkeypatch.setattr(responder.carrier, "get_transactions", get_transactions_new_block)
+    responder.unindexed_txs.add(penalty_txid)
+    responder.index_confirmations()
+
+    # So the penalty is left to be indexed on the next call
+    assert penalty_txid in responder.unindexed_txs
+    assert penalty_txid not in responder.confirmation_heights
+
+    monkeypatch.setattr(responder.carrier, "get_transactions", get_transactions)
+    responder.index_confirmations()
+    assert responder.confirmation_heights[penalty_txid] == confirmation_height
+    assert penalty_txid not in responder.unindexed_txs
+
+
+def test_rollback_confirmations(db_manager, gatekeeper, carrier, block_processor):
+    responder = Responder(db_manager, gatekeeper, carrier, block_processor)
+    penalty_txids = [get_random_value_hex(32) for _ in range(10)]
+
+    for i, penalty_txid in enumerate(penalty_txids):
+        responder.add_confirmation(penalty_txid, 100 + i % 2)
+
+    # Rolling back the confirmations of some transactions drops them from the index, so they can be indexed again
+    dropped_txs = penalty_txids[:5] + [get_random_value_hex(32)]
+    responder.rollback_confirmations(dropped_txs)
+
+    for penalty_txid in penalty_txids[:5]:
+        assert penalty_txid not in responder.confirmation_heights
+        assert penalty_txid in responder.unindexed_txs
+
+    for penalty_txid in penalty_txids[5:]:
+        assert penalty_txid in responder.confirmation_heights
+        assert penalty_txid not in responder.unindexed_txs
+
+    assert set().union(*responder.resolution_index.values()) == set(penalty_txids[5:])
+
+    # Empty buckets are removed
+    for penalty_txid in penalty_txids[5:]:
+        responder.rollback_confirmations([penalty_txid])
+
+    assert not responder.resolution_index
 
 
 def test_get_expired_trackers(responder):
@@ -486,7 +617,7 @@ def test_get_expired_trackers(responder):
         dummy_tracker = create_dummy_tracker(penalty_rawtx=create_dummy_transaction().hex())
         dummy_tracker.user_id = user1_id
         expired_unconfirmed_trackers_15[uuid] = dummy_tracker
-        responder.unconfirmed_txs.append(dummy_tracker.penalty_txid)
+        responder.unconfirmed_txs.add(dummy_tracker.penalty_txid)
         # Assume the appointment only took a single slot
         responder.gatekeeper.registered_users[dummy_tracker.user_id].appointments[uuid] = 1
 
@@ -503,7 +634,7 @@ def test_get_expired_trackers(responder):
         dummy_tracker = create_dummy_tracker(penalty_rawtx=create_dummy_transaction().hex())
         dummy_tracker.user_id = user2_id
         expired_unconfirmed_trackers_16[uuid] = dummy_tracker
-        responder.unconfirmed_txs.append(dummy_tracker.penalty_txid)
+        responder.unconfirmed_txs.add(dummy_tracker.penalty_txid)
         # Assume the appointment only took a single slot
         responder.gatekeeper.registered_users[dummy_tracker.user_id].appointments[uuid] = 1
 
@@ -516,6 +647,9 @@ def test_get_expired_trackers(responder):
     for uuid, tracker in all_trackers.items():
         responder.trackers[uuid] = tracker.get_summary()
 
+    # Users are added straight to the Gatekeeper, so the expiry index needs to be rebuilt
+    responder.gatekeeper.rebuild_expiry_index()
+
     # Currently nothing should be expired
     assert responder.get_expired_trackers(current_block) == []
 
@@ -553,7 +687,7 @@ def test_rebroadcast(db_manager, gatekeeper, carrier, block_processor):
         responder.db_manager.store_responder_tracker(uuid, tracker.to_dict())
 
         responder.tx_tracker_map[penalty_txid] = [uuid]
-        responder.unconfirmed_txs.append(penalty_txid)
+        responder.unconfirmed_txs.add(penalty_txid)
 
         # Let's add some of the txs in the rebroadcast list
         if (i % 2) == 0:
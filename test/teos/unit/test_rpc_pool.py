@@ -0,0 +1,175 @@
+import pytest
+import http.client
+from time import time
+from contextlib import contextmanager
+from threading import Thread
+
+from teos.tools import bitcoin_cli
+from teos.utils.auth_proxy import JSONRPCException
+from teos.utils.rpc_pool import RPCConnectionPool, PooledServiceProxy, get_pool, get_service_url
+
+from test.teos.unit.conftest import bitcoind_connect_params, get_random_value_hex
+
+
+def test_init_pool_wrong_size():
+    with pytest.raises(ValueError):
+        RPCConnectionPool("localhost", 18443, max_size=0)
+
+
+def test_acquire_release():
+    pool = RPCConnectionPool("localhost", 18443, max_size=2)
+
+    # The first connection is always a miss
+    conn = pool.acquire()
+    assert pool.stats == {"hits": 0, "misses": 1, "discarded": 0, "idle": 0}
+
+    # Once returned, it can be reused
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert pool.stats == {"hits": 1, "misses": 1, "discarded": 0, "idle": 0}
+
+    # Discarded connections are not reused
+    pool.release(conn, discard=True)
+    assert pool.acquire() is not conn
+    assert pool.stats == {"hits": 1, "misses": 2, "discarded": 1, "idle": 0}
+
+
+def test_acquire_stale_connection():
+    pool = RPCConnectionPool("localhost", 18443, max_idle=10)
+
+    conn = pool.acquire()
+    pool.release(conn)
+
+    # Connections that have been idle for longer than max_idle are recycled
+    pool._idle[-1] = (conn, time() - 11)
+    assert pool.acquire() is not conn
+    assert pool.discarded == 1
+
+
+def test_acquire_bounded():
+    pool = RPCConnectionPool("localhost", 18443, max_size=1)
+    conn = pool.acquire()
+
+    # A second acquire should block until the first connection is returned
+    acquired = []
+    t = Thread(target=lambda: acquired.append(pool.acquire()), daemon=True)
+    t.start()
+    t.join(0.2)
+    assert not acquired
+
+    pool.release(conn)
+    t.join(1)
+    assert acquired == [conn]
+
+
+def test_get_pool():
+    # The same connection parameters must always map to the same pool
+    assert get_pool(bitcoind_connect_params) is get_pool(dict(bitcoind_connect_params))
+
+    other_params = dict(bitcoind_connect_params)
+    other_params["BTC_RPC_PORT"] += 1
+    assert get_pool(other_params) is not get_pool(bitcoind_connect_params)
+
+
+def test_bitcoin_cli(run_bitcoind):
+    proxy = bitcoin_cli(bitcoind_connect_params)
+    pool = get_pool(bitcoind_connect_params)
+    assert isinstance(proxy, PooledServiceProxy)
+
+    # Connections are returned to the pool after every call, so consecutive calls reuse them
+    proxy.getbestblockhash()
+    hits = pool.hits
+    proxy.getblockcount()
+    assert pool.hits == hits + 1
+
+
+def test_bitcoin_cli_rpc_error_keeps_connection(run_bitcoind):
+    pool = get_pool(bitcoind_connect_params)
+    discarded = pool.discarded
+
+    # Application errors do not invalidate the connection
+    with pytest.raises(JSONRPCException):
+        bitcoin_cli(bitcoind_connect_params).getblock(get_random_value_hex(32))
+
+    assert pool.discarded == discarded
+
+
+def test_bitcoin_cli_connection_error():
+    params = dict(bitcoind_connect_params)
+    params["BTC_RPC_PORT"] = 1
+    pool = get_pool(params)
+
+    with pytest.raises(ConnectionRefusedError):
+        PooledServiceProxy(get_service_url(params), pool).getblockcount()
+
+    # The failed connection is not kept around
+    assert pool.stats.get("idle") == 0 and pool.discarded >= 1
+
+
+@pytest.mark.parametrize("code", [-342, -343, -344])
+def test_connection_transport_error(code):
+    pool = RPCConnectionPool("localhost", 1)
+
+    # Errors raised by the client itself (timeouts, bad replies, ...) may leave a pending response behind
+    with pytest.raises(JSONRPCException):
+        with pool.connection():
+            raise JSONRPCException({"code": code, "message": "transport error"})
+
+    assert pool.discarded == 1 and pool.stats.get("idle") == 0
+
+    # Whereas bitcoind errors leave the connection ready to be reused
+    with pytest.raises(JSONRPCException):
+        with pool.connection():
+            raise JSONRPCException({"code": -5, "message": "Block not found"})
+
+    assert pool.discarded == 1 and pool.stats.get("idle") == 1
+
+
+class DroppedConnection:
+    timeout = 30
+
+    def request(self, *args, **kwargs):
+        raise http.client.RemoteDisconnected("Remote end closed connection without response")
+
+    def close(self):
+        pass
+
+
+class DroppedConnectionPool:
+    def __init__(self):
+        self.borrowed = 0
+
+    @contextmanager
+    def connection(self):
+        self.borrowed += 1
+        yield DroppedConnection()
+
+
+def test_pooled_service_proxy_retries_read_only():
+    url = get_service_url(bitcoind_connect_params)
+
+    # Read-only calls are retried on a fresh connection if the connection is dropped
+    pool = DroppedConnectionPool()
+    with pytest.raises(http.client.RemoteDisconnected):
+        PooledServiceProxy(url, pool).getblockcount()
+    assert pool.borrowed == 2
+
+    # But calls that may have been processed already by bitcoind are not
+    pool = DroppedConnectionPool()
+    with pytest.raises(http.client.RemoteDisconnected):
+        PooledServiceProxy(url, pool).sendrawtransaction(get_random_value_hex(32))
+    assert pool.borrowed == 1
+
+    # Batches are only retried if all their calls are read-only
+    proxy = PooledServiceProxy(url, DroppedConnectionPool())
+    requests = [proxy.getblockhash.get_request(0), proxy.getblockcount.get_request()]
+
+    pool = DroppedConnectionPool()
+    with pytest.raises(http.client.RemoteDisconnected):
+        PooledServiceProxy(url, pool).batch(requests)
+    assert pool.borrowed == 2
+
+    pool = DroppedConnectionPool()
+    with pytest.raises(http.client.RemoteDisconnected):
+        PooledServiceProxy(url, pool).batch(requests + [proxy.sendrawtransaction.get_request("00")])
+    assert pool.borrowed == 1
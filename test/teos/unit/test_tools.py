@@ -1,6 +1,6 @@
 import pytest
 
-from teos.tools import in_correct_network, get_default_rpc_port
+from teos.tools import in_correct_network, get_default_rpc_port, get_default_rpc_pool_size, INTERNAL_RPC_THREADS
 from test.teos.unit.conftest import bitcoind_connect_params
 
 from common.constants import MAINNET_RPC_PORT, TESTNET_RPC_PORT, REGTEST_RPC_PORT
@@ -26,3 +26,9 @@ def test_get_default_rpc_port_wrong():
     for v in values:
         with pytest.raises(ValueError):
             get_default_rpc_port(v)
+
+
+def test_get_default_rpc_pool_size():
+    # There is a connection for every thread that may query bitcoind at the same time
+    assert get_default_rpc_pool_size(8, 4) == 8 + 4 + INTERNAL_RPC_THREADS
+    assert get_default_rpc_pool_size(8, 0) == 8 + 1 + INTERNAL_RPC_THREADS
@@ -0,0 +1,155 @@
+import pytest
+from decimal import Decimal
+
+from teos.utils.tx_parser import decode_raw_transaction
+
+# Block 170 transaction (the first bitcoin transaction between two parties)
+legacy_tx = (
+    "0100000001c997a5e56e104102fa209c6a852dd90660a20b2d9c352423edce25857fcd3704000000004847304402"
+    "204e45e16932b8af514961a1d3a1a25fdf3f4f7732e9d624c6c61548ab5fb8cd410220181522ec8eca07de4860a4"
+    "acdd12909d831cc56cbbac4622082221a8768d1d0901ffffffff0200ca9a3b00000000434104ae1a62fe09c5f51b"
+    "13905f07f06b99a2f7159b2225f374cd378d71302fa28414e7aab37397f554a7df5f142c21c1b7303b8a0626f1ba"
+    "ded5c72a704f7e6cd84cac00286bee0000000043410411db93e1dcdb8a016b49840f8c53bc1eb68a382e97b1482e"
+    "cad7b148a6909a5cb2e0eaddfb84ccf9744464f82e160bfa9b8b64f9d4c03f999b8643f656b412a3ac00000000"
+)
+legacy_txid = "f4184fc596403b9d638783cf57adfe4c75c605f6356fbc91338530e9831e9e16"
+
+# BIP143 native P2WPKH example (one legacy and one segwit input)
+segwit_tx = (
+    "01000000000102fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f00000000494830"
+    "450221008b9d1dc26ba6a9cb62127b02742fa9d754cd3bebf337f7a55d114c8e5cdd30be022040529b194ba3f928"
+    "1a99f2b1c0a19c0489bc22ede944ccf4ecbab4cc618ef3ed01eeffffffef51e1b804cc89d182d279655c3aa89e81"
+    "5b1b309fe287d9b2b55d57b90ec68a0100000000ffffffff02202cb206000000001976a9148280b37df378db99f6"
+    "6f85c95a783a76ac7a6d5988ac9093510d000000001976a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988"
+    "ac000247304402203609e17b84f6a7d30c80bfa610b5b4542f32a8a0d5447a12fb1366d7f01cc44a0220573a954c"
+    "4518331561406f90300e8f3358f51928d43c212a8caed02de67eebee0121025476c2e83188368da1ff3e292e7aca"
+    "fcdb3566bb0ad253f62fc70f07aeee635711000000"
+)
+segwit_txid = "e8151a2af31c368a35053ddd4bdb285a8595c769a3ad83e0fa02314a602d4609"
+segwit_wtxid = "c36c38370907df2324d9ce9d149d191192f338b37665a82e78e76a12c909b762"
+
+# BIP143 P2SH-P2WPKH example (nested segwit input, two outputs). The expected values are the ones decoderawtransaction
+# reports for it
+nested_segwit_tx = (
+    "01000000000101db6b1b20aa0fd7b23880be2ecbd4a98130974cf4748fb66092ac4d3ceb1a5477010000001716001479091972186c449e"
+    "b1ded22b78e40d009bdf0089feffffff02b8b4eb0b000000001976a914a457b684d7f0d539a46a45bbc043f35b59d0d96388ac0008af2f"
+    "000000001976a914fd270b1ee6abcaea97fea7ad0402e8bd8ad6d77c88ac02473044022047ac8e878352d3ebbde1c94ce3a10d057c2417"
+    "5747116f8288e5d794d12d482f0220217f36a485cae903c713331d877c1f64677e3622ad4010726870540656fe9dcb012103ad1d8e8921"
+    "2f0b92c74d23bb710c00662ad1470198ac48c43f7d6f93a2a2687392040000"
+)
+nested_segwit_txid = "ef48d9d0f595052e0f8cdcf825f7a5e50b6a388a81f206f3f4846e5ecd7a0c23"
+nested_segwit_wtxid = "680f483b2bf6c5dcbf111e69e885ba248a41a5e92070cfb0afec3cfc49a9fabb"
+
+# Genesis block coinbase transaction
+coinbase_tx = (
+    "01000000010000000000000000000000000000000000000000000000000000000000000000ffffffff4d04ffff001d0104455468652054"
+    "696d65732030332f4a616e2f32303039204368616e63656c6c6f72206f6e206272696e6b206f66207365636f6e64206261696c6f757420"
+    "666f722062616e6b73ffffffff0100f2052a01000000434104678afdb0fe5548271967f1a67130b7105cd6a828e03909a67962e0ea1f61"
+    "deb649f6bc3f4cef38c4f35504e51ec112de5c384df7ba0b8d578a4c702b6bf11d5fac00000000"
+)
+coinbase_txid = "4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b"
+
+
+def test_decode_raw_transaction_legacy():
+    tx = decode_raw_transaction(legacy_tx)
+
+    assert tx.get("txid") == tx.get("hash") == legacy_txid
+    assert tx.get("version") == 1 and tx.get("locktime") == 0
+    assert tx.get("size") == tx.get("vsize") == len(legacy_tx) // 2
+
+    assert len(tx.get("vin")) == 1
+    assert tx.get("vin")[0].get("txid") == "0437cd7f8525ceed2324359c2d0ba26006d92d856a9c20fa0241106ee5a597c9"
+    assert tx.get("vin")[0].get("vout") == 0
+    assert "txinwitness" not in tx.get("vin")[0]
+
+    assert [tx_out.get("value") for tx_out in tx.get("vout")] == [Decimal(10), Decimal(40)]
+
+
+def test_decode_raw_transaction_segwit():
+    tx = decode_raw_transaction(segwit_tx)
+
+    # The txid does not commit to the witness, but the hash (wtxid) does
+    assert tx.get("txid") == segwit_txid
+    assert tx.get("hash") == segwit_wtxid
+    assert tx.get("size") == len(segwit_tx) // 2
+    assert tx.get("vsize") < tx.get("size")
+    assert tx.get("locktime") == 17
+
+    # Only the second input has witness data
+    assert tx.get("vin")[0].get("txinwitness") == []
+    assert len(tx.get("vin")[1].get("txinwitness")) == 2
+    assert len(tx.get("vout")) == 2
+
+
+def test_decode_raw_transaction_nested_segwit():
+    tx = decode_raw_transaction(nested_segwit_tx)
+
+    assert tx.get("txid") == nested_segwit_txid
+    assert tx.get("hash") == nested_segwit_wtxid
+    assert tx.get("size") == 251 and tx.get("vsize") == 170 and tx.get("weight") == 677
+    assert tx.get("version") == 1 and tx.get("locktime") == 1170
+
+    assert tx.get("vin")[0].get("scriptSig").get("hex") == "16001479091972186c449eb1ded22b78e40d009bdf0089"
+    assert tx.get("vin")[0].get("sequence") == 4294967294
+    assert len(tx.get("vin")[0].get("txinwitness")) == 2
+
+    assert [tx_out.get("value") for tx_out in tx.get("vout")] == [Decimal("1.999966"), Decimal(8)]
+    assert [tx_out.get("n") for tx_out in tx.get("vout")] == [0, 1]
+
+
+def test_decode_raw_transaction_coinbase():
+    tx = decode_raw_transaction(coinbase_tx)
+
+    assert tx.get("txid") == tx.get("hash") == coinbase_txid
+    assert tx.get("size") == tx.get("vsize") == 204 and tx.get("weight") == 816
+    assert tx.get("vin")[0].get("txid") == "00" * 32 and tx.get("vin")[0].get("vout") == 0xFFFFFFFF
+    assert [tx_out.get("value") for tx_out in tx.get("vout")] == [Decimal(50)]
+
+
+def test_decode_raw_transaction_invalid():
+    invalid_txs = [
+        # Not a str
+        bytes.fromhex(legacy_tx),
+        None,
+        # Not hex
+        legacy_tx[:-1] + "z",
+        "a",
+        # Truncated
+        legacy_tx[:-2],
+        legacy_tx[:8],
+        # Trailing data
+        legacy_tx + "00",
+        # Reversed
+        legacy_tx[::-1],
+        # Unknown segwit flag
+        segwit_tx[:10] + "02" + segwit_tx[12:],
+    ]
+
+    for raw_tx in invalid_txs:
+        with pytest.raises(ValueError):
+            decode_raw_transaction(raw_tx)
+
+
+def test_decode_raw_transaction_no_inputs():
+    # A well-formed transaction with no inputs (and no outputs): version | empty vin | empty vout | locktime
+    with pytest.raises(ValueError, match="no inputs"):
+        decode_raw_transaction("01000000" + "00" + "00" + "00000000")
+
+
+def test_decode_raw_transaction_superfluous_witness():
+    # A segwit serialization with no witness data at all is rejected (same as bitcoind)
+    no_witness_tx = legacy_tx[:8] + "0001" + legacy_tx[8:-8] + "00" + legacy_tx[-8:]
+
+    with pytest.raises(ValueError, match="Superfluous witness record"):
+        decode_raw_transaction(no_witness_tx)
+
+    # The same transaction is fine using the legacy serialization
+    assert decode_raw_transaction(legacy_tx).get("txid") == legacy_txid
+
+
+def test_decode_raw_transaction_non_canonical_size():
+    # Encoding the input count (1) using 3 bytes is not allowed
+    non_canonical_tx = legacy_tx[:8] + "fd0100" + legacy_tx[10:]
+
+    with pytest.raises(ValueError, match="Non-canonical"):
+        decode_raw_transaction(non_canonical_tx)
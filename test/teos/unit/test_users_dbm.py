@@ -1,3 +1,6 @@
+import json
+import shutil
+
 from teos.users_dbm import UsersDBM
 from teos.gatekeeper import UserInfo
 
@@ -80,3 +83,144 @@ def test_load_all_users(user_db_manager):
     assert set(all_users.keys()) == set(stored_users.keys())
     for k, v in all_users.items():
         assert stored_users[k] == v
+
+
+def test_store_user_header(user_db_manager):
+    user_id = "02" + get_random_value_hex(32)
+    user_info = UserInfo(available_slots=42, subscription_expiry=100, appointments={get_random_value_hex(16): 1})
+    user_db_manager.store_user(user_id, user_info.to_dict())
+
+    # Updating the header leaves the appointments untouched
+    header = {"available_slots": 21, "subscription_expiry": 200, "appointments": {}}
+    assert user_db_manager.store_user_header(user_id, header) is True
+
+    user_data = user_db_manager.load_user(user_id)
+    assert user_data.get("available_slots") == 21 and user_data.get("subscription_expiry") == 200
+    assert user_data.get("appointments") == user_info.appointments
+
+    # Wrong pks or data fail
+    assert user_db_manager.store_user_header("04" + get_random_value_hex(32), header) is False
+    assert user_db_manager.store_user_header(user_id, 42) is False
+
+
+def test_store_user_appointment(user_db_manager):
+    user_id = "02" + get_random_value_hex(32)
+    user_info = UserInfo(available_slots=42, subscription_expiry=100)
+    user_db_manager.store_user(user_id, user_info.to_dict())
+
+    # Add some appointments one by one
+    for _ in range(5):
+        uuid = get_random_value_hex(16)
+        user_info.appointments[uuid] = 2
+        user_info.available_slots -= 2
+        assert user_db_manager.store_user_appointment(user_id, user_info.to_dict(), uuid) is True
+
+    assert user_db_manager.load_user(user_id) == user_info.to_dict()
+
+    # Updates overwrite the slot count
+    user_info.appointments[uuid] = 1
+    user_info.available_slots += 1
+    assert user_db_manager.store_user_appointment(user_id, user_info.to_dict(), uuid) is True
+    assert user_db_manager.load_user(user_id) == user_info.to_dict()
+
+    # Appointments not found in the user data cannot be stored
+    assert user_db_manager.store_user_appointment(user_id, user_info.to_dict(), get_random_value_hex(16)) is False
+    assert user_db_manager.store_user_appointment(user_id, user_info.to_dict(), 42) is False
+
+
+def test_store_user_appointments(user_db_manager):
+    user_id = "02" + get_random_value_hex(32)
+    user_info = UserInfo(available_slots=42, subscription_expiry=100)
+    user_db_manager.store_user(user_id, user_info.to_dict())
+
+    # Add some appointments at once
+    uuids = [get_random_value_hex(16) for _ in range(5)]
+    for uuid in uuids:
+        user_info.appointments[uuid] = 2
+        user_info.available_slots -= 2
+
+    assert user_db_manager.store_user_appointments(user_id, user_info.to_dict(), uuids) is True
+    assert user_db_manager.load_user(user_id) == user_info.to_dict()
+
+    # Nothing is stored if any of the appointments is not found in the user data
+    user_info.available_slots -= 1
+    assert user_db_manager.store_user_appointments(user_id, user_info.to_dict(), [get_random_value_hex(16)]) is False
+    assert user_db_manager.store_user_appointments(user_id, user_info.to_dict(), uuids + [42]) is False
+    assert user_db_manager.load_user(user_id).get("available_slots") == user_info.available_slots + 1
+
+
+def test_delete_user_appointments(user_db_manager):
+    user_id = "02" + get_random_value_hex(32)
+    appointments = {get_random_value_hex(16): 1 for _ in range(10)}
+    user_info = UserInfo(available_slots=42, subscription_expiry=100, appointments=dict(appointments))
+    user_db_manager.store_user(user_id, user_info.to_dict())
+
+    # Delete half of the appointments
+    uuids = list(appointments)[:5]
+    for uuid in uuids:
+        user_info.available_slots += user_info.appointments.pop(uuid)
+
+    assert user_db_manager.delete_user_appointments(user_id, user_info.to_dict(), uuids) is True
+    assert user_db_manager.load_user(user_id) == user_info.to_dict()
+
+    # Wrong pks fail
+    assert user_db_manager.delete_user_appointments(42, user_info.to_dict(), uuids) is False
+
+
+def test_delete_user_unit_of_work(user_db_manager):
+    # Appointments stored within a unit of work are deleted alongside the user within the same unit
+    user_id = "02" + get_random_value_hex(32)
+    uuid = get_random_value_hex(16)
+    user_info = UserInfo(available_slots=41, subscription_expiry=100, appointments={uuid: 1})
+
+    with user_db_manager.unit_of_work():
+        assert user_db_manager.store_user(user_id, user_info.to_dict()) is True
+        assert user_db_manager.delete_user(user_id) is True
+
+    assert user_db_manager.load_user(user_id) is None
+    assert list(user_db_manager.db.iterator(prefix=user_id.encode("utf-8"))) == []
+
+
+def test_store_user_replaces_appointments(user_db_manager):
+    # Storing a full user record drops appointments that are not part of it anymore
+    user_id = "02" + get_random_value_hex(32)
+    user_info = UserInfo(available_slots=42, subscription_expiry=100, appointments={get_random_value_hex(16): 1})
+    user_db_manager.store_user(user_id, user_info.to_dict())
+
+    user_info.appointments = {get_random_value_hex(16): 3}
+    user_db_manager.store_user(user_id, user_info.to_dict())
+    assert user_db_manager.load_user(user_id) == user_info.to_dict()
+
+    # Deleting the user also deletes their appointments
+    user_db_manager.delete_user(user_id)
+    assert user_db_manager.load_user(user_id) is None
+    assert not list(user_db_manager.db.iterator(prefix=user_id.encode("utf-8")))
+
+
+def test_migrate_users():
+    db_path = "test_migrate_user_db"
+    user_db_manager = UsersDBM(db_path)
+
+    # Store some users using the legacy layout (appointments are part of the user record)
+    legacy_users = {}
+    for _ in range(10):
+        user_id = "02" + get_random_value_hex(32)
+        appointments = {get_random_value_hex(16): 1 for _ in range(5)}
+        legacy_users[user_id] = UserInfo(available_slots=42, subscription_expiry=100, appointments=appointments)
+        user_db_manager.db.put(user_id.encode("utf-8"), json.dumps(legacy_users[user_id].to_dict()).encode("utf-8"))
+
+    # Legacy users can be read
+    assert user_db_manager.load_all_users() == {k: v.to_dict() for k, v in legacy_users.items()}
+
+    # And they are migrated once the db is opened
+    user_db_manager.db.close()
+    user_db_manager = UsersDBM(db_path)
+    assert user_db_manager.migrate_users() == 0
+    assert user_db_manager.load_all_users() == {k: v.to_dict() for k, v in legacy_users.items()}
+
+    for user_id, user_info in legacy_users.items():
+        assert "appointments" not in json.loads(user_db_manager.db.get(user_id.encode("utf-8")))
+        assert user_db_manager.load_user(user_id) == user_info.to_dict()
+
+    user_db_manager.db.close()
+    shutil.rmtree(db_path)
@@ -1,4 +1,5 @@
 import pytest
+import plyvel
 from uuid import uuid4
 from shutil import rmtree
 from copy import deepcopy
@@ -21,10 +22,12 @@ from teos.watcher import (
     EncryptionError,
     InvalidTransactionFormat,
     AppointmentAlreadyTriggered,
+    MIN_PARALLEL_DECRYPTIONS,
+    create_decryption_pool,
 )
 
-from common.tools import compute_locator
-from common.cryptographer import Cryptographer
+from common.tools import compute_locator, compute_binary_locator
+from common.cryptographer import Cryptographer, hash_160
 
 from test.teos.unit.conftest import (
     generate_blocks_w_delay,
@@ -35,6 +38,7 @@ from test.teos.unit.conftest import (
     get_config,
     bitcoind_feed_params,
     bitcoind_connect_params,
+    load_locator_map,
     create_dummy_transaction,
 )
 
@@ -91,7 +95,7 @@ def txids():
 
 @pytest.fixture(scope="module")
 def locator_uuid_map(txids):
-    return {compute_locator(txid): uuid4().hex for txid in txids}
+    return {compute_binary_locator(txid): uuid4().hex for txid in txids}
 
 
 def create_appointments(n):
@@ -104,7 +108,7 @@ def create_appointments(n):
         uuid = uuid4().hex
 
         appointments[uuid] = appointment
-        locator_uuid_map[appointment.locator] = [uuid]
+        locator_uuid_map[bytes.fromhex(appointment.locator)] = [uuid]
         dispute_txs.append(dispute_tx)
 
     return appointments, locator_uuid_map, dispute_txs
@@ -138,17 +142,37 @@ def test_locator_cache_init(block_processor):
 
 
 def test_get_txid():
-    # Not much to test here, this is shadowing dict.get
-    locator = get_random_value_hex(16)
     txid = get_random_value_hex(32)
+    locator = compute_binary_locator(txid)
 
     locator_cache = LocatorCache(config.get("LOCATOR_CACHE_SIZE"))
-    locator_cache.cache[locator] = txid
+    locator_cache.update(get_random_value_hex(32), {locator: txid})
 
-    assert locator_cache.get_txid(locator) == txid
+    # Data can be found no matter how old the block holding it is (as long as it is in the cache)
+    for _ in range(locator_cache.cache_size - 1):
+        locator_cache.update(
+            get_random_value_hex(32), {bytes.fromhex(get_random_value_hex(16)): get_random_value_hex(32)}
+        )
+        assert locator_cache.get_txid(locator) == txid
 
     # A random locator should fail
-    assert locator_cache.get_txid(get_random_value_hex(16)) is None
+    assert locator_cache.get_txid(bytes.fromhex(get_random_value_hex(16))) is None
+
+
+def test_get_txid_same_locator():
+    # If the same locator is in more than one block, the data from the most recent one is returned
+    locator = bytes.fromhex(get_random_value_hex(16))
+    old_txid = locator.hex() + get_random_value_hex(16)
+    new_txid = locator.hex() + get_random_value_hex(16)
+
+    locator_cache = LocatorCache(config.get("LOCATOR_CACHE_SIZE"))
+    locator_cache.update(get_random_value_hex(32), {locator: old_txid})
+    locator_cache.update(get_random_value_hex(32), {locator: new_txid})
+    assert locator_cache.get_txid(locator) == new_txid
+
+    # Dropping the oldest block does not affect the data of the rest
+    locator_cache.remove_oldest_block()
+    assert locator_cache.get_txid(locator) == new_txid
 
 
 def test_update_cache():
@@ -157,18 +181,18 @@ def test_update_cache():
 
     block_hash = get_random_value_hex(32)
     txs = [get_random_value_hex(32) for _ in range(10)]
-    locator_txid_map = {compute_locator(txid): txid for txid in txs}
+    locator_txid_map = {compute_binary_locator(txid): txid for txid in txs}
 
     # Cache is empty
     assert block_hash not in locator_cache.blocks
     for locator in locator_txid_map.keys():
-        assert locator not in locator_cache.cache
+        assert locator_cache.get_txid(locator) is None
 
     # The data has been added to the cache
     locator_cache.update(block_hash, locator_txid_map)
     assert block_hash in locator_cache.blocks
-    for locator in locator_txid_map.keys():
-        assert locator in locator_cache.cache
+    for locator, txid in locator_txid_map.items():
+        assert locator_cache.get_txid(locator) == txid
 
 
 def test_update_cache_full():
@@ -179,7 +203,7 @@ def test_update_cache_full():
     for i in range(locator_cache.cache_size):
         block_hash = get_random_value_hex(32)
         txs = [get_random_value_hex(32) for _ in range(10)]
-        locator_txid_map = {compute_locator(txid): txid for txid in txs}
+        locator_txid_map = {compute_binary_locator(txid): txid for txid in txs}
         locator_cache.update(block_hash, locator_txid_map)
 
         if i == 0:
@@ -192,24 +216,24 @@ def test_update_cache_full():
     # The cache is now full.
     assert first_block_hash in locator_cache.blocks
     for locator in first_locator_txid_map.keys():
-        assert locator in locator_cache.cache
+        assert locator_cache.get_txid(locator) is not None
 
     # Add one more
     block_hash = get_random_value_hex(32)
     txs = [get_random_value_hex(32) for _ in range(10)]
-    locator_txid_map = {compute_locator(txid): txid for txid in txs}
+    locator_txid_map = {compute_binary_locator(txid): txid for txid in txs}
     locator_cache.update(block_hash, locator_txid_map)
 
     # The first block is not there anymore, but the rest are there
     assert first_block_hash not in locator_cache.blocks
     for locator in first_locator_txid_map.keys():
-        assert locator not in locator_cache.cache
+        assert locator_cache.get_txid(locator) is None
 
     for block_hash in block_hashes:
         assert block_hash in locator_cache.blocks
 
     for locator in big_map.keys():
-        assert locator in locator_cache.cache
+        assert locator_cache.get_txid(locator) is not None
 
 
 def test_locator_cache_is_full(block_processor):
@@ -217,10 +241,10 @@ def test_locator_cache_is_full(block_processor):
     locator_cache = LocatorCache(config.get("LOCATOR_CACHE_SIZE"))
 
     for _ in range(locator_cache.cache_size):
-        locator_cache.blocks[uuid4().hex] = 0
+        locator_cache.blocks[uuid4().hex] = {}
         assert not locator_cache.is_full()
 
-    locator_cache.blocks[uuid4().hex] = 0
+    locator_cache.blocks[uuid4().hex] = {}
     assert locator_cache.is_full()
 
 
@@ -231,9 +255,7 @@ def test_locator_remove_oldest_block(block_processor):
     # Add some blocks to the cache
     for _ in range(locator_cache.cache_size):
         txid = get_random_value_hex(32)
-        locator = txid[:16]
-        locator_cache.blocks[get_random_value_hex(32)] = {locator: txid}
-        locator_cache.cache[locator] = txid
+        locator_cache.update(get_random_value_hex(32), {compute_binary_locator(txid): txid})
 
     blocks_in_cache = locator_cache.blocks
     oldest_block_hash = list(blocks_in_cache.keys())[0]
@@ -244,13 +266,13 @@ def test_locator_remove_oldest_block(block_processor):
     # Oldest block data is not in the cache
     assert oldest_block_hash not in locator_cache.blocks
     for locator in oldest_block_data:
-        assert locator not in locator_cache.cache
+        assert locator_cache.get_txid(locator) is None
 
     # The rest of data is in the cache
     assert set(rest_of_blocks).issubset(locator_cache.blocks)
     for block_hash in rest_of_blocks:
         for locator in locator_cache.blocks[block_hash]:
-            assert locator in locator_cache.cache
+            assert locator_cache.get_txid(locator) is not None
 
 
 def test_fix_cache(block_processor):
@@ -272,8 +294,8 @@ def test_fix_cache(block_processor):
 
     # The last two blocks are not in the cache nor are the any of its locators
     assert current_tip not in locator_cache.blocks and current_tip_parent not in locator_cache.blocks
-    for locator in current_tip_parent_locators + current_tip_locators:
-        assert locator not in locator_cache.cache
+    for locator in list(current_tip_parent_locators) + list(current_tip_locators):
+        assert locator_cache.get_txid(locator) is None
 
     # The fake tip is the new tip, and two additional blocks are at the bottom
     assert fake_tip in locator_cache.blocks and list(locator_cache.blocks.keys())[-1] == fake_tip
@@ -290,7 +312,7 @@ def test_fix_cache(block_processor):
     for block_hash, locators in old_cache_blocks.items():
         assert block_hash not in locator_cache.blocks
         for locator in locators:
-            assert locator not in locator_cache.cache
+            assert locator_cache.get_txid(locator) is None
 
     # The data in the new cache corresponds to the last ``cache_size`` blocks.
     block_count = block_processor.get_block_count()
@@ -298,7 +320,77 @@ def test_fix_cache(block_processor):
         block_hash = bitcoin_cli(bitcoind_connect_params).getblockhash(i - 1)
         assert block_hash in locator_cache.blocks
         for locator in locator_cache.blocks[block_hash]:
-            assert locator in locator_cache.cache
+            assert locator_cache.get_txid(locator) is not None
+
+
+class ChainStub:
+    """A minimal block source that keeps track of the requested blocks."""
+
+    def __init__(self):
+        self.blocks = {}
+        self.requested = []
+
+    def add_blocks(self, prev_block_hash, n):
+        block_hashes = []
+        for _ in range(n):
+            block_hash = get_random_value_hex(32)
+            txs = [get_random_value_hex(32) for _ in range(5)]
+            self.blocks[block_hash] = {"hash": block_hash, "previousblockhash": prev_block_hash, "tx": txs}
+            block_hashes.append(block_hash)
+            prev_block_hash = block_hash
+
+        return block_hashes
+
+    def get_block(self, block_hash):
+        self.requested.append(block_hash)
+        return self.blocks.get(block_hash)
+
+    def fill_cache(self, locator_cache, block_hashes):
+        for block_hash in block_hashes:
+            txs = self.blocks[block_hash]["tx"]
+            locator_cache.update(block_hash, {compute_binary_locator(txid): txid for txid in txs})
+
+
+def test_fix_cache_shallow_reorg():
+    # Only the reorged out blocks are dropped, and only the new ones are fetched
+    chain = ChainStub()
+    locator_cache = LocatorCache(config.get("LOCATOR_CACHE_SIZE"))
+    old_chain = chain.add_blocks(None, 2 * locator_cache.cache_size)
+    chain.fill_cache(locator_cache, old_chain)
+
+    # Replace the last block by two new ones
+    new_chain = chain.add_blocks(old_chain[-2], 2)
+    chain.requested = []
+    locator_cache.fix(new_chain[-1], chain)
+
+    assert chain.requested == list(reversed(new_chain))
+    assert list(locator_cache.blocks) == old_chain[-locator_cache.cache_size + 1 : -1] + new_chain
+
+    for txid in chain.blocks[old_chain[-1]]["tx"]:
+        assert locator_cache.get_txid(compute_binary_locator(txid)) is None
+    for block_hash in locator_cache.blocks:
+        for txid in chain.blocks[block_hash]["tx"]:
+            assert locator_cache.get_txid(compute_binary_locator(txid)) == txid
+
+    # The oldest block data is gone
+    for txid in chain.blocks[old_chain[-locator_cache.cache_size]]["tx"]:
+        assert locator_cache.get_txid(compute_binary_locator(txid)) is None
+
+
+def test_fix_cache_deep_reorg():
+    # If the fork point is deeper than the cache, all the data is replaced
+    chain = ChainStub()
+    locator_cache = LocatorCache(config.get("LOCATOR_CACHE_SIZE"))
+    old_chain = chain.add_blocks(None, 2 * locator_cache.cache_size)
+    chain.fill_cache(locator_cache, old_chain)
+
+    new_chain = chain.add_blocks(old_chain[1], 2 * locator_cache.cache_size)
+    chain.requested = []
+    locator_cache.fix(new_chain[-1], chain)
+
+    assert len(chain.requested) == locator_cache.cache_size
+    assert list(locator_cache.blocks) == new_chain[-locator_cache.cache_size :]
+    assert len(locator_cache.cache) == 5 * locator_cache.cache_size
 
 
 def test_watcher_init(watcher):
@@ -363,7 +455,7 @@ def test_add_appointment(watcher):
     )
     # The slot count should not have been reduced and only one copy is kept.
     assert response.get("available_slots") == available_slots - 1
-    assert len(watcher.locator_uuid_map[appointment.locator]) == 1
+    assert len(watcher.locator_uuid_map[bytes.fromhex(appointment.locator)]) == 1
 
     # If two appointments with the same locator come from different users, they are kept.
     another_user_sk, another_user_pk = generate_keypair()
@@ -379,7 +471,74 @@ def test_add_appointment(watcher):
         Cryptographer.recover_pk(appointment.serialize(), response.get("signature"))
     )
     assert response.get("available_slots") == available_slots - 1
-    assert len(watcher.locator_uuid_map[appointment.locator]) == 2
+    assert len(watcher.locator_uuid_map[bytes.fromhex(appointment.locator)]) == 2
+
+
+def test_add_appointments(watcher):
+    # Simulate the users are registered (one of them without free slots)
+    user_sk, user_pk = generate_keypair()
+    available_slots = 100
+    user_id = Cryptographer.get_compressed_pk(user_pk)
+    watcher.gatekeeper.registered_users[user_id] = UserInfo(available_slots=available_slots, subscription_expiry=10)
+
+    no_slots_user_sk, no_slots_user_pk = generate_keypair()
+    no_slots_user_id = Cryptographer.get_compressed_pk(no_slots_user_pk)
+    watcher.gatekeeper.registered_users[no_slots_user_id] = UserInfo(available_slots=0, subscription_expiry=10)
+
+    appointments = [generate_dummy_appointment()[0] for _ in range(5)]
+    batch = [(appointment, Cryptographer.sign(appointment.serialize(), user_sk)) for appointment in appointments]
+
+    # Add an appointment from a non-registered user and one from the user without slots in between
+    non_registered_appointment = generate_dummy_appointment()[0]
+    no_slots_appointment = generate_dummy_appointment()[0]
+    non_registered_sk, _ = generate_keypair()
+    batch.insert(
+        1, (non_registered_appointment, Cryptographer.sign(non_registered_appointment.serialize(), non_registered_sk))
+    )
+    batch.insert(3, (no_slots_appointment, Cryptographer.sign(no_slots_appointment.serialize(), no_slots_user_sk)))
+
+    responses = watcher.add_appointments(batch)
+
+    assert isinstance(responses[1], AuthenticationFailure)
+    assert isinstance(responses[3], NotEnoughSlots)
+
+    accepted_responses = [r for i, r in enumerate(responses) if i not in [1, 3]]
+    for i, (appointment, response) in enumerate(zip(appointments, accepted_responses)):
+        assert response.get("locator") == appointment.locator
+        assert Cryptographer.get_compressed_pk(watcher.signing_key.public_key) == Cryptographer.get_compressed_pk(
+            Cryptographer.recover_pk(appointment.serialize(), response.get("signature"))
+        )
+        assert response.get("available_slots") == available_slots - (i + 1)
+
+        # The appointments are kept in memory and in the database
+        uuid = hash_160("{}{}".format(appointment.locator, user_id))
+        assert watcher.appointments[uuid] == appointment.get_summary()
+        assert watcher.db_manager.load_watcher_appointment(uuid) == appointment.to_dict()
+        assert uuid in load_locator_map(watcher.db_manager, appointment.locator)
+
+    assert watcher.gatekeeper.user_db.load_user(user_id) == watcher.gatekeeper.registered_users[user_id].to_dict()
+
+
+def test_add_appointments_store_failure(watcher, monkeypatch):
+    user_sk, user_pk = generate_keypair()
+    user_id = Cryptographer.get_compressed_pk(user_pk)
+    watcher.gatekeeper.registered_users[user_id] = UserInfo(available_slots=10, subscription_expiry=10)
+
+    appointments = [generate_dummy_appointment()[0] for _ in range(3)]
+    batch = [(appointment, Cryptographer.sign(appointment.serialize(), user_sk)) for appointment in appointments]
+
+    def batch_store_watcher_appointments(appointments):
+        raise plyvel.IOError()
+
+    # Appointments are only added to memory once they are in the database
+    monkeypatch.setattr(watcher.db_manager, "batch_store_watcher_appointments", batch_store_watcher_appointments)
+    with pytest.raises(plyvel.IOError):
+        watcher.add_appointments(batch)
+
+    for appointment in appointments:
+        uuid = hash_160("{}{}".format(appointment.locator, user_id))
+        assert uuid not in watcher.appointments
+        assert bytes.fromhex(appointment.locator) not in watcher.locator_uuid_map
 
 
 def test_add_appointment_in_cache(watcher):
@@ -390,7 +549,7 @@ def test_add_appointment_in_cache(watcher):
 
     appointment, dispute_tx = generate_dummy_appointment()
     dispute_txid = watcher.block_processor.decode_raw_transaction(dispute_tx).get("txid")
-    watcher.locator_cache.cache[appointment.locator] = dispute_txid
+    watcher.locator_cache.update(get_random_value_hex(32), {bytes.fromhex(appointment.locator): dispute_txid})
 
     # Try to add the appointment
     response = watcher.add_appointment(appointment, Cryptographer.sign(appointment.serialize(), user_sk))
@@ -402,7 +561,7 @@ def test_add_appointment_in_cache(watcher):
         and Cryptographer.get_compressed_pk(watcher.signing_key.public_key)
         == Cryptographer.get_compressed_pk(Cryptographer.recover_pk(appointment.serialize(), response.get("signature")))
     )
-    assert not watcher.locator_uuid_map.get(appointment.locator)
+    assert not watcher.locator_uuid_map.get(bytes.fromhex(appointment.locator))
 
     # It went to the Responder straightaway
     assert appointment.locator in [tracker.get("locator") for tracker in watcher.responder.trackers.values()]
@@ -412,6 +571,27 @@ def test_add_appointment_in_cache(watcher):
         watcher.add_appointment(appointment, Cryptographer.sign(appointment.serialize(), user_sk))
 
 
+def test_add_appointments_in_cache_duplicated(run_bitcoind, watcher):
+    # A batch containing the same triggered appointment twice only hands it to the Responder once
+    user_sk, user_pk = generate_keypair()
+    user_id = Cryptographer.get_compressed_pk(user_pk)
+    watcher.gatekeeper.registered_users[user_id] = UserInfo(available_slots=2, subscription_expiry=10)
+
+    appointment, dispute_tx = generate_dummy_appointment()
+    dispute_txid = watcher.block_processor.decode_raw_transaction(dispute_tx).get("txid")
+    watcher.locator_cache.update(get_random_value_hex(32), {bytes.fromhex(appointment.locator): dispute_txid})
+
+    signature = Cryptographer.sign(appointment.serialize(), user_sk)
+    responses = watcher.add_appointments([(appointment, signature), (appointment, signature)])
+
+    assert isinstance(responses[0], dict) and responses[0].get("locator") == appointment.locator
+    assert isinstance(responses[1], AppointmentAlreadyTriggered)
+
+    uuid = hash_160("{}{}".format(appointment.locator, user_id))
+    penalty_txid = watcher.responder.trackers[uuid].get("penalty_txid")
+    assert watcher.responder.tx_tracker_map[penalty_txid].count(uuid) == 1
+
+
 def test_add_appointment_in_cache_invalid_blob(watcher):
     # Generate an appointment with an invalid transaction and add the dispute txid to the cache
     user_sk, user_pk = generate_keypair()
@@ -435,7 +615,7 @@ def test_add_appointment_in_cache_invalid_blob(watcher):
     }
 
     appointment = ExtendedAppointment.from_dict(appointment_data)
-    watcher.locator_cache.cache[appointment.locator] = dispute_tx.tx_id.hex()
+    watcher.locator_cache.update(get_random_value_hex(32), {bytes.fromhex(appointment.locator): dispute_tx.tx_id.hex()})
 
     # Try to add the appointment
     response = watcher.add_appointment(appointment, Cryptographer.sign(appointment.serialize(), user_sk))
@@ -448,7 +628,7 @@ def test_add_appointment_in_cache_invalid_blob(watcher):
         == Cryptographer.get_compressed_pk(Cryptographer.recover_pk(appointment.serialize(), response.get("signature")))
     )
 
-    assert not watcher.locator_uuid_map.get(appointment.locator)
+    assert not watcher.locator_uuid_map.get(bytes.fromhex(appointment.locator))
     assert appointment.locator not in [tracker.get("locator") for tracker in watcher.responder.trackers.values()]
 
 
@@ -461,7 +641,7 @@ def test_add_appointment_in_cache_invalid_transaction(watcher):
     appointment, dispute_tx = generate_dummy_appointment()
     appointment.encrypted_blob = appointment.encrypted_blob[::-1]
     dispute_txid = watcher.block_processor.decode_raw_transaction(dispute_tx).get("txid")
-    watcher.locator_cache.cache[appointment.locator] = dispute_txid
+    watcher.locator_cache.update(get_random_value_hex(32), {bytes.fromhex(appointment.locator): dispute_txid})
 
     # Try to add the appointment
     response = watcher.add_appointment(appointment, Cryptographer.sign(appointment.serialize(), user_sk))
@@ -474,7 +654,7 @@ def test_add_appointment_in_cache_invalid_transaction(watcher):
         == Cryptographer.get_compressed_pk(Cryptographer.recover_pk(appointment.serialize(), response.get("signature")))
     )
 
-    assert not watcher.locator_uuid_map.get(appointment.locator)
+    assert not watcher.locator_uuid_map.get(bytes.fromhex(appointment.locator))
     assert appointment.locator not in [tracker.get("locator") for tracker in watcher.responder.trackers.values()]
 
 
@@ -524,12 +704,15 @@ def test_do_watch(watcher, temp_db_manager):
 
     # Add the appointments
     for uuid, appointment in appointments.items():
-        watcher.appointments[uuid] = {"locator": appointment.locator, "user_id": user_id}
+        watcher.appointments[uuid] = {"locator": bytes.fromhex(appointment.locator), "user_id": user_id}
         # Assume the appointment only takes one slot
         watcher.gatekeeper.registered_users[user_id].appointments[uuid] = 1
         watcher.db_manager.store_watcher_appointment(uuid, appointment.to_dict())
         watcher.db_manager.create_append_locator_map(appointment.locator, uuid)
 
+    # The user is added straight to the Gatekeeper, so the expiry index needs to be rebuilt
+    watcher.gatekeeper.rebuild_expiry_index()
+
     do_watch_thread = Thread(target=watcher.do_watch, daemon=True)
     do_watch_thread.start()
 
@@ -571,10 +754,10 @@ def test_do_watch_cache_update(watcher):
 
         # The locators of the oldest block are gone but the rest remain
         for locator in oldest_block_data:
-            assert locator not in watcher.locator_cache.cache
+            assert watcher.locator_cache.get_txid(locator) is None
         for block_hash in rest_of_blocks:
             for locator in watcher.locator_cache.blocks[block_hash]:
-                assert locator in watcher.locator_cache.cache
+                assert watcher.locator_cache.get_txid(locator) is not None
 
         # The size of the cache is the same
         assert len(watcher.locator_cache.blocks) == watcher.locator_cache.cache_size
@@ -582,7 +765,7 @@ def test_do_watch_cache_update(watcher):
 
 def test_get_breaches(watcher, txids, locator_uuid_map):
     watcher.locator_uuid_map = locator_uuid_map
-    locators_txid_map = {compute_locator(txid): txid for txid in txids}
+    locators_txid_map = {compute_binary_locator(txid): txid for txid in txids}
     potential_breaches = watcher.get_breaches(locators_txid_map)
 
     # All the txids must breach
@@ -593,7 +776,7 @@ def test_get_breaches_random_data(watcher, locator_uuid_map):
     # The likelihood of finding a potential breach with random data should be negligible
     watcher.locator_uuid_map = locator_uuid_map
     txids = [get_random_value_hex(32) for _ in range(TEST_SET_SIZE)]
-    locators_txid_map = {compute_locator(txid): txid for txid in txids}
+    locators_txid_map = {compute_binary_locator(txid): txid for txid in txids}
 
     potential_breaches = watcher.get_breaches(locators_txid_map)
 
@@ -601,6 +784,17 @@ def test_get_breaches_random_data(watcher, locator_uuid_map):
     assert len(potential_breaches) == 0
 
 
+def test_get_breaches_some_match(watcher, txids, locator_uuid_map):
+    # Only the block locators that are in the locator map are returned, no matter how many appointments there are
+    watcher.locator_uuid_map = locator_uuid_map
+    block_txids = txids[:10] + [get_random_value_hex(32) for _ in range(TEST_SET_SIZE)]
+    locators_txid_map = {compute_binary_locator(txid): txid for txid in block_txids}
+
+    potential_breaches = watcher.get_breaches(locators_txid_map)
+
+    assert potential_breaches == {compute_binary_locator(txid): txid for txid in txids[:10]}
+
+
 def test_check_breach(watcher):
     # A breach will be flagged as valid only if the encrypted blob can be properly decrypted and the resulting data
     # matches a transaction format.
@@ -656,11 +850,11 @@ def test_filter_valid_breaches(watcher):
     uuid = uuid4().hex
 
     appointments = {uuid: dummy_appointment}
-    locator_uuid_map = {dummy_appointment.locator: [uuid]}
-    breaches = {dummy_appointment.locator: dispute_txid}
+    locator_uuid_map = {bytes.fromhex(dummy_appointment.locator): [uuid]}
+    breaches = {bytes.fromhex(dummy_appointment.locator): dispute_txid}
 
     for uuid, appointment in appointments.items():
-        watcher.appointments[uuid] = {"locator": appointment.locator, "user_id": appointment.user_id}
+        watcher.appointments[uuid] = {"locator": bytes.fromhex(appointment.locator), "user_id": appointment.user_id}
         watcher.db_manager.store_watcher_appointment(uuid, dummy_appointment.to_dict())
         watcher.db_manager.create_append_locator_map(dummy_appointment.locator, uuid)
 
@@ -680,15 +874,15 @@ def test_filter_breaches_random_data(watcher):
     for i in range(TEST_SET_SIZE):
         dummy_appointment, _ = generate_dummy_appointment()
         uuid = uuid4().hex
-        appointments[uuid] = {"locator": dummy_appointment.locator, "user_id": dummy_appointment.user_id}
+        appointments[uuid] = {"locator": bytes.fromhex(dummy_appointment.locator), "user_id": dummy_appointment.user_id}
         watcher.db_manager.store_watcher_appointment(uuid, dummy_appointment.to_dict())
         watcher.db_manager.create_append_locator_map(dummy_appointment.locator, uuid)
 
-        locator_uuid_map[dummy_appointment.locator] = [uuid]
+        locator_uuid_map[bytes.fromhex(dummy_appointment.locator)] = [uuid]
 
         if i % 2:
             dispute_txid = get_random_value_hex(32)
-            breaches[dummy_appointment.locator] = dispute_txid
+            breaches[bytes.fromhex(dummy_appointment.locator)] = dispute_txid
 
     watcher.locator_uuid_map = locator_uuid_map
     watcher.appointments = appointments
@@ -697,3 +891,112 @@ def test_filter_breaches_random_data(watcher):
 
     # We have "triggered" TEST_SET_SIZE/2 breaches, all of them invalid.
     assert len(valid_breaches) == 0 and len(invalid_breaches) == TEST_SET_SIZE / 2
+
+
+def test_decrypt_breaches():
+    appointment, _ = generate_dummy_appointment()
+    dispute_txid = create_dummy_transaction().tx_id.hex()
+    penalty_rawtx = create_dummy_transaction(dispute_txid).hex()
+    appointment.encrypted_blob = Cryptographer.encrypt(penalty_rawtx, dispute_txid)
+
+    invalid_appointment, _ = generate_dummy_appointment()
+
+    # Duplicated blobs are only decrypted once, and blobs that cannot be decrypted are set to None
+    triggered_appointments = [
+        (appointment, dispute_txid),
+        (appointment, dispute_txid),
+        (invalid_appointment, dispute_txid),
+        (None, dispute_txid),
+    ]
+    decrypted_blobs = Watcher.decrypt_breaches(triggered_appointments)
+
+    assert decrypted_blobs == {
+        (appointment.encrypted_blob, dispute_txid): penalty_rawtx,
+        (invalid_appointment.encrypted_blob, dispute_txid): None,
+    }
+
+
+def test_decrypt_breaches_same_blob_different_dispute_txids():
+    # The same blob may be triggered by different transactions. It is decrypted with every one of them, so failing to
+    # decrypt it with one key does not invalidate the appointments that can be decrypted with the other
+    appointment, _ = generate_dummy_appointment()
+    dispute_txid = create_dummy_transaction().tx_id.hex()
+    other_dispute_txid = create_dummy_transaction().tx_id.hex()
+    penalty_rawtx = create_dummy_transaction(dispute_txid).hex()
+    appointment.encrypted_blob = Cryptographer.encrypt(penalty_rawtx, dispute_txid)
+
+    for triggered_appointments in [
+        [(appointment, other_dispute_txid), (appointment, dispute_txid)],
+        [(appointment, dispute_txid), (appointment, other_dispute_txid)],
+    ]:
+        assert Watcher.decrypt_breaches(triggered_appointments) == {
+            (appointment.encrypted_blob, dispute_txid): penalty_rawtx,
+            (appointment.encrypted_blob, other_dispute_txid): None,
+        }
+
+
+def test_decrypt_breaches_odd_length_blob():
+    # The Inspector does not check the blob length, so odd-length blobs may get here. They cannot be decrypted
+    appointment, _ = generate_dummy_appointment()
+    appointment.encrypted_blob = appointment.encrypted_blob[:-1]
+
+    dispute_txid = get_random_value_hex(32)
+    decrypted_blobs = Watcher.decrypt_breaches([(appointment, dispute_txid)])
+
+    assert decrypted_blobs == {(appointment.encrypted_blob, dispute_txid): None}
+
+
+@pytest.mark.parametrize("worker_type", ["thread", "process"])
+def test_decrypt_breaches_pool(worker_type):
+    # Decrypting using a pool must produce the same result as decrypting serially
+    triggered_appointments = []
+    for i in range(MIN_PARALLEL_DECRYPTIONS):
+        appointment, _ = generate_dummy_appointment()
+        dispute_txid = create_dummy_transaction().tx_id.hex()
+
+        # Make some of the blobs valid, some duplicated and some undecryptable
+        if i % 2 == 0:
+            appointment.encrypted_blob = Cryptographer.encrypt(
+                create_dummy_transaction(dispute_txid).hex(), dispute_txid
+            )
+        if i % 3 == 0:
+            triggered_appointments.append((appointment, dispute_txid))
+
+        triggered_appointments.append((appointment, dispute_txid))
+
+    decryption_pool = create_decryption_pool(2, worker_type)
+
+    try:
+        decrypted_blobs = Watcher.decrypt_breaches(triggered_appointments, decryption_pool)
+    finally:
+        decryption_pool.shutdown()
+
+    assert decrypted_blobs == Watcher.decrypt_breaches(triggered_appointments)
+    assert list(decrypted_blobs.keys()) == list(Watcher.decrypt_breaches(triggered_appointments).keys())
+    assert len(decrypted_blobs) == MIN_PARALLEL_DECRYPTIONS
+    assert len([penalty for penalty in decrypted_blobs.values() if penalty is None]) == MIN_PARALLEL_DECRYPTIONS // 2
+
+
+def test_create_decryption_pool():
+    assert create_decryption_pool(0) is None
+
+    with pytest.raises(ValueError):
+        create_decryption_pool(-1)
+
+    with pytest.raises(ValueError):
+        create_decryption_pool(1, "fork")
+
+
+def test_filter_breaches_missing_appointment(watcher):
+    dummy_appointment, _ = generate_dummy_appointment()
+    uuid = uuid4().hex
+
+    # An appointment that is in memory but not in the db is considered invalid
+    watcher.appointments = {uuid: dummy_appointment.get_summary()}
+    watcher.locator_uuid_map = {bytes.fromhex(dummy_appointment.locator): [uuid]}
+
+    valid_breaches, invalid_breaches = watcher.filter_breaches(
+        {bytes.fromhex(dummy_appointment.locator): get_random_value_hex(32)}
+    )
+
+    assert valid_breaches == {} and invalid_breaches == [uuid]
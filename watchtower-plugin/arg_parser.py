@@ -110,7 +110,7 @@ def parse_add_appointment_arguments(kwargs):
         raise InvalidParameter("commitment_txid has invalid format")
 
     # Checking the basic stuff for the penalty transaction for now
-    if type(penalty_tx) is not str or re.search(r"^[0-9A-Fa-f]+$", penalty_tx) is None:
+    if type(penalty_tx) is not str or re.search(r"^[0-9A-Fa-f]+$", penalty_tx) is None or len(penalty_tx) % 2:
         raise InvalidParameter("penalty_tx has invalid format")
 
     return commitment_txid, penalty_tx
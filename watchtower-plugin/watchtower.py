@@ -323,10 +323,12 @@ def on_commitment_revocation(plugin, **kwargs):
 
     try:
         commitment_txid, penalty_tx = arg_parser.parse_add_appointment_arguments(kwargs)
+        # Both arguments have already been checked by the arg_parser, so the raw bytes can be encrypted straightaway
+        encrypted_blob = Cryptographer.encrypt_bytes(bytes.fromhex(penalty_tx), bytes.fromhex(commitment_txid))
         appointment = Appointment(
             locator=compute_locator(commitment_txid),
             to_self_delay=20,  # does not matter for now, any value 20-2^32-1 would do
-            encrypted_blob=Cryptographer.encrypt(penalty_tx, commitment_txid),
+            encrypted_blob=encrypted_blob.hex(),
         )
         signature = Cryptographer.sign(appointment.serialize(), plugin.wt_client.sk)
 